@@ -82,12 +82,55 @@ import sys
 import os
 import traceback
 import ssl
+import socket
+import threading
+import httplib
+import xmlrpclib
+import json
+import hashlib
+import hmac
+import random
+import struct
+import math
+import mmap
+import re
+import bisect
+import heapq
+import itertools
+import zlib
+import errno
+import signal
+import select
+import Queue
+import collections
+from array import array
+import multiprocessing
+import _multiprocessing
+from multiprocessing.pool import ThreadPool
+from multiprocessing.reduction import send_handle, recv_handle
+from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+from SocketServer import ThreadingMixIn
 from ctypes import cdll, byref, create_string_buffer
+from ctypes import Structure, POINTER, c_int, c_long
 from pprint import pprint, pformat
 from jsonrpclib import Server
 from jsonrpclib import ProtocolError
+from jsonrpclib.jsonrpc import TransportMixIn
 from subprocess import call
 
+# Used by the vectorized threshold engine (--engine vector)
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# Used to encrypt SNMPv3 authPriv informs natively.  Without it, authPriv
+# informs fall back to the snmptrap command.
+try:
+    from Crypto.Cipher import AES, DES
+except ImportError:
+    AES = DES = None
+
 #############################################################################
 # BEGIN CONFIGURATION
 #
@@ -96,11 +139,26 @@ from subprocess import call
 #   This must be configured to match the switch being monitored.
 #   See 'show management api http-commands' on your switch.
 #
+#   On the switch itself, PROTOCOL may be 'unix' to reach eAPI over its
+#   local Unix domain socket, EAPI_SOCKET, with no TLS and no USERNAME or
+#   PASSWORD.  Enable it with 'protocol unix-socket' under
+#   'management api http-commands'.
+#
 PROTOCOL = 'https'
 USERNAME = 'eapiuser'
 PASSWORD = 'admin'
 HOSTNAME = 'localhost'
 PORT = 443
+EAPI_SOCKET = '/var/run/command-api.sock'
+
+#
+# INVENTORY:
+#   Optional file listing the switches to monitor, one per line, as
+#   'hostname[:port]'.  Blank lines and '#' comments are ignored.  Every
+#   switch uses the PROTOCOL/USERNAME/PASSWORD above.  May be overridden with
+#   --inventory.  When unset, only HOSTNAME is monitored.
+#
+INVENTORY = None
 
 #
 # SNMP_SETTINGS:
@@ -109,7 +167,9 @@ PORT = 443
 #     version: 2c|3
 #     seclevel: noAuthNoPriv|authNoPriv|authPriv
 #     authprotocol: MD5|SHA
-#     privprotocol: DES|SHA
+#     privprotocol: DES|AES
+#
+#   traphost may include a port as 'host:port' (default port 162).
 
 SNMP_SETTINGS = {'traphost': 'localhost',
                  'version': '3',
@@ -136,7 +196,66 @@ SNMP = False   #pylint: disable=C0103
 USE_CUMULATIVE_AVERAGE = False
 TOLERANCE = 3
 REBASE_POLL_LIMIT = 3
+BASELINE = 'fixed'
+BASELINES = ('fixed', 'cumulative', 'ewma', 'rolling')
+BASELINE_MODEL = None
+EWMA_ALPHA = 0.1
+BASELINE_WINDOW = 60
+SIGMAS = 0
+SIGMA_FLOOR = 0.5
+SIGMA_MIN_READINGS = 10
+ENGINE = 'reactor'
+PER_LANE = False
+WORKERS = 16
+PROCESSES = 1
+WORKER_RESTART_DELAY = 1
+WORKER_RESTART_MAX_DELAY = 60
+EAPI_TIMEOUT = 10
+EAPI_CONNECTIONS = 2
+SNMP_EXEC = False
+SNMP_TIMEOUT = 1
+SNMP_RETRIES = 3
+SNMP_QUEUE_SIZE = 1000
+SNMP_NOTIFIER = None
+DISPATCH_WORKERS = 2
+DISPATCH_QUEUE_SIZE = 10000
+DISPATCH_OVERFLOW = 'drop-oldest'
+DISPATCHER = None
+SINKS = None
+COALESCE_THRESHOLD = 8
+COALESCE_GROUP = 'linecard'
+COALESCER = None
+REMOTE_SYSLOG = None
+REMOTE_SYSLOG_BUFFER = 10000
+REMOTE_SYSLOG_SINK = None
+RATE_LIMIT = 0
+RATE_LIMIT_BURST = 20
+HISTORY_DIR = None
+HISTORY_SIZE = 65536
+HISTORY_PORTS = 1024
+HISTORY_WINDOW = 3600
+RECORD_DIR = None
+REPLAY_CHANGE = 3.0
+CHECKPOINT_FILE = '/mnt/flash/dom-baselines.json'
+CHECKPOINT_INTERVAL = 300
+MAX_POLL_INTERVAL = 300
+STATIC_REFRESH = 0
+POLL_JITTER = 0.0
+STREAM_CHUNK_SIZE = 16384
+METRICS_PORT = None
+METRICS_ADDRESS = ''
+PROFILE_DIR = None
+PROFILE_SECONDS = 30
+PROFILE_INTERVAL = 0.01
 STATUS = {}
+PROGRAM = os.path.basename(sys.argv[0])
+
+# Counters exported by a MetricsExporter, updated with increment()
+COUNTERS_LOCK = threading.Lock()
+# { <error type> : <eAPI requests failed> }
+EAPI_ERRORS = collections.Counter()
+# { <level> : <notifications handed to the sinks> }
+NOTIFICATIONS_SENT = collections.Counter()
 
 class EapiException(Exception):
     """ An EapiException can be raised when there is a communication issue with
@@ -147,16 +266,46 @@ class EapiException(Exception):
 
     pass
 
-def _time_string():
+def _time_string(ts=None):
     '''Format time string'''
 
-    ts = time.time()
+    if ts is None:
+        ts = time.time()
     return datetime.datetime.fromtimestamp(ts).strftime('%Y-%m-%d %H:%M:%S')
 
+# clock_gettime() clock ID from <time.h>
+CLOCK_MONOTONIC = 1
+
+class _Timespec(Structure):
+    _fields_ = [('tv_sec', c_long), ('tv_nsec', c_long)]
+
+# clock_gettime() is in librt before glibc 2.17
+_CLOCK_GETTIME = None
+for _library in ('libc.so.6', 'librt.so.1'):
+    try:
+        _CLOCK_GETTIME = cdll.LoadLibrary(_library).clock_gettime
+        _CLOCK_GETTIME.argtypes = [c_int, POINTER(_Timespec)]
+        break
+    except (OSError, AttributeError):
+        pass
+
+def monotonic():
+    '''Return seconds on a clock that neither jumps nor goes backwards when
+    the wall clock is set (NTP, 'clock set'), for timing and scheduling.
+    Python 2 has no time.monotonic(); falls back to time.time() where
+    clock_gettime() cannot be loaded.
+    '''
+
+    if _CLOCK_GETTIME is None:
+        return time.time()
+    timespec = _Timespec()
+    _CLOCK_GETTIME(CLOCK_MONOTONIC, byref(timespec))
+    return timespec.tv_sec + timespec.tv_nsec * 1e-9
+
 def set_proc_name(newname):
     '''Set the process name seen by the OS in ps, for example
     '''
-    log("Entering {0}.".format(sys._getframe().f_code.co_name), level='DEBUG')
+    trace()
 
     # This works on EOS but not on OSX.  Wrapped in try for testability.
     try:
@@ -189,6 +338,45 @@ def parse_cmd_line():
                         '(Default: False)'
                        )
 
+    parser.add_argument('--baseline',
+                        type=str,
+                        choices=BASELINES,
+                        default=BASELINE,
+                        help='baseline readings are compared with: the first '
+                        'reading, the cumulative average, an exponentially '
+                        'weighted moving average, or the mean of a rolling '
+                        'window (default={0})'.format(BASELINE)
+                       )
+
+    parser.add_argument('--ewma-alpha',
+                        type=float,
+                        default=EWMA_ALPHA,
+                        help='weight of each reading in the ewma baseline '
+                        '(default={0})'.format(EWMA_ALPHA)
+                       )
+
+    parser.add_argument('--baseline-window',
+                        type=int,
+                        default=BASELINE_WINDOW,
+                        help='readings in the rolling baseline '
+                        '(default={0})'.format(BASELINE_WINDOW)
+                       )
+
+    parser.add_argument('--sigmas',
+                        type=float,
+                        default=0,
+                        help='with --baseline ewma or rolling, also report '
+                        'readings this many standard deviations from the '
+                        'baseline (default: tolerance only)'
+                       )
+
+    parser.add_argument('--sigma-floor',
+                        type=float,
+                        default=0.5,
+                        help='smallest variation (in dBm) reported with '
+                        '--sigmas (default=0.5)'
+                       )
+
     parser.add_argument('-r', '--rebase-poll-limit',
                         type=int,
                         default=3,
@@ -196,6 +384,15 @@ def parse_cmd_line():
                         'messages, before resetting the base (default=3)'
                        )
 
+    parser.add_argument('-e', '--engine',
+                        type=str,
+                        choices=['reactor', 'vector'],
+                        default=ENGINE,
+                        help='evaluate each interface in turn (reactor) or '
+                        'all interfaces of a switch at once with NumPy '
+                        '(vector) (default={0})'.format(ENGINE)
+                       )
+
     parser.add_argument('-t', '--tolerance',
                         type=float,
                         default=3,
@@ -209,6 +406,116 @@ def parse_cmd_line():
                         help='polling interval(default=10)'
                        )
 
+    parser.add_argument('--jitter',
+                        type=float,
+                        default=POLL_JITTER,
+                        help='spread the polls of the switches over this '
+                        'fraction of the poll interval (default={0})'.format(
+                            POLL_JITTER)
+                       )
+
+    parser.add_argument('-i', '--inventory',
+                        type=str,
+                        default=INVENTORY,
+                        help='file listing the switches to poll, one '
+                        'hostname[:port] per line (default: HOSTNAME)'
+                       )
+
+    parser.add_argument('-w', '--workers',
+                        type=int,
+                        default=WORKERS,
+                        help='number of switches polled concurrently '
+                        '(default={0})'.format(WORKERS)
+                       )
+
+    parser.add_argument('--processes',
+                        type=int,
+                        default=PROCESSES,
+                        help='worker processes the inventory is split '
+                        'across, each polling its share of the switches '
+                        '(default={0}: poll from this process)'.format(
+                            PROCESSES)
+                       )
+
+    parser.add_argument('--timeout',
+                        type=int,
+                        default=EAPI_TIMEOUT,
+                        help='eAPI connection timeout in seconds '
+                        '(default={0})'.format(EAPI_TIMEOUT)
+                       )
+
+    parser.add_argument('--eapi-connections',
+                        type=int,
+                        default=EAPI_CONNECTIONS,
+                        help='keep-alive eAPI connections per switch '
+                        '(default={0})'.format(EAPI_CONNECTIONS)
+                       )
+
+    parser.add_argument('--verify-cert',
+                        action='store_true',
+                        default=False,
+                        help='Verify the switch eAPI HTTPS certificate')
+
+    parser.add_argument('--transport',
+                        type=str,
+                        choices=['https', 'http', 'unix'],
+                        help='how eAPI is reached: unix for the local '
+                        'switch\'s --eapi-socket, without TLS or credentials '
+                        '(default: PROTOCOL)'
+                       )
+
+    parser.add_argument('--eapi-socket',
+                        type=str,
+                        default=EAPI_SOCKET,
+                        help='eAPI Unix domain socket used with --transport '
+                        'unix (default={0})'.format(EAPI_SOCKET)
+                       )
+
+    parser.add_argument('-b', '--batched',
+                        action='store_true',
+                        default=False,
+                        help='Get interface status, transceiver and version '
+                        'info in a single eAPI request per poll')
+
+    parser.add_argument('--stream',
+                        action='store_true',
+                        default=False,
+                        help='Decode the eAPI response as it arrives, '
+                        'checking each interface as soon as its transceiver '
+                        'info is read and keeping only the fields checked '
+                        '(implies --batched)')
+
+    parser.add_argument('-a', '--adaptive',
+                        action='store_true',
+                        default=False,
+                        help='Poll each interface at its own rate: every '
+                        'poll-interval while coming up or drifting, backing '
+                        'off to max-poll-interval when stable or without '
+                        'an optic')
+
+    parser.add_argument('--max-poll-interval',
+                        type=int,
+                        default=MAX_POLL_INTERVAL,
+                        help='longest interval between polls of an interface '
+                        'with --adaptive (default={0})'.format(MAX_POLL_INTERVAL)
+                       )
+
+    parser.add_argument('--static-refresh',
+                        type=int,
+                        default=STATIC_REFRESH,
+                        help='seconds between reads of the interface list '
+                        'and version, polling only the link status and '
+                        'transceivers in between (default={0}: every '
+                        'poll)'.format(
+                            STATIC_REFRESH)
+                       )
+
+    parser.add_argument('--per-lane',
+                        action='store_true',
+                        default=PER_LANE,
+                        help='Keep a baseline and check the power levels of '
+                        'each lane of multi-lane optics (QSFP28/QSFP-DD)')
+
     parser.add_argument('-d', '--debug',
                         action='store_true',
                         default=False,
@@ -224,6 +531,205 @@ def parse_cmd_line():
                         default=False,
                         help='Send SNMP traps/notices')
 
+    parser.add_argument('--dispatch-workers',
+                        type=int,
+                        default=DISPATCH_WORKERS,
+                        help='threads delivering syslog/SNMP notifications in'
+                        ' the background, 0 to deliver them inline '
+                        '(default={0})'.format(DISPATCH_WORKERS)
+                       )
+
+    parser.add_argument('--dispatch-queue-size',
+                        type=int,
+                        default=DISPATCH_QUEUE_SIZE,
+                        help='notifications queued for delivery before the '
+                        'overflow policy applies (default={0})'.
+                        format(DISPATCH_QUEUE_SIZE)
+                       )
+
+    parser.add_argument('--dispatch-overflow',
+                        type=str,
+                        choices=['drop-oldest', 'block'],
+                        default=DISPATCH_OVERFLOW,
+                        help='what to do when the notification queue is full '
+                        '(default={0})'.format(DISPATCH_OVERFLOW)
+                       )
+
+    parser.add_argument('--coalesce-threshold',
+                        type=int,
+                        default=COALESCE_THRESHOLD,
+                        help='power changes on one switch or line card in a '
+                        'poll that are sent as a single summary, 0 to '
+                        'disable (default={0})'.format(COALESCE_THRESHOLD)
+                       )
+
+    parser.add_argument('--coalesce-group',
+                        type=str,
+                        choices=['switch', 'linecard'],
+                        default=COALESCE_GROUP,
+                        help='summarize power changes per switch or per line '
+                        'card (default={0})'.format(COALESCE_GROUP)
+                       )
+
+    parser.add_argument('--rate-limit',
+                        type=float,
+                        default=RATE_LIMIT,
+                        help='notifications per second sent to each of '
+                        'syslog and SNMP, 0 for no limit (default={0})'.
+                        format(RATE_LIMIT)
+                       )
+
+    parser.add_argument('--rate-limit-burst',
+                        type=int,
+                        default=RATE_LIMIT_BURST,
+                        help='notifications sent at once before the rate '
+                        'limit applies (default={0})'.format(RATE_LIMIT_BURST)
+                       )
+
+    parser.add_argument('--snmptrap',
+                        action='store_true',
+                        default=False,
+                        help='Send SNMP traps/notices by running the snmptrap'
+                        ' command instead of natively')
+
+    parser.add_argument('--remote-syslog',
+                        type=str,
+                        default=REMOTE_SYSLOG,
+                        metavar='[udp|tcp|tls://]HOST[:PORT]',
+                        help='Also send notifications to this syslog '
+                        'collector as RFC 5424 messages (default port 514, '
+                        '6514 for tls)')
+
+    parser.add_argument('--remote-syslog-buffer',
+                        type=int,
+                        default=REMOTE_SYSLOG_BUFFER,
+                        help='notifications buffered for the remote syslog '
+                        'collector before the oldest are dropped '
+                        '(default={0})'.format(REMOTE_SYSLOG_BUFFER)
+                       )
+
+    parser.add_argument('--remote-syslog-ca',
+                        type=str,
+                        default=None,
+                        help='CA certificates file to verify a tls remote '
+                        'syslog collector with (default: not verified)')
+
+    parser.add_argument('--history',
+                        type=str,
+                        default=HISTORY_DIR,
+                        help='directory of per-switch files recording every '
+                        'transceiver reading (default: no history)'
+                       )
+
+    parser.add_argument('--history-size',
+                        type=int,
+                        default=HISTORY_SIZE,
+                        help='readings kept per switch, the oldest being '
+                        'overwritten (default={0})'.format(HISTORY_SIZE)
+                       )
+
+    parser.add_argument('--history-query',
+                        type=str,
+                        metavar='[SWITCH:]INTERFACE',
+                        help='print the recorded readings of an interface '
+                        'and exit'
+                       )
+
+    parser.add_argument('--history-window',
+                        type=int,
+                        default=HISTORY_WINDOW,
+                        help='seconds of readings summarized by '
+                        '--history-query (default={0})'.format(HISTORY_WINDOW)
+                       )
+
+    parser.add_argument('--record',
+                        type=str,
+                        metavar='DIR',
+                        default=RECORD_DIR,
+                        help='directory the results of every poll are '
+                        'appended to, one file per switch, for --replay '
+                        '(default: not recorded)'
+                       )
+
+    parser.add_argument('--replay',
+                        type=str,
+                        nargs='+',
+                        metavar='FILE',
+                        help='replay polls recorded with --record through '
+                        'the checks for each combination of --sweep settings, '
+                        'report the alerts and time to detect of each and exit'
+                       )
+
+    parser.add_argument('--sweep',
+                        type=str,
+                        action='append',
+                        default=[],
+                        metavar='SETTING=VALUE[,VALUE...]',
+                        help='values of a setting to replay with: {0} '
+                        '(default: the value given on the command line)'
+                        .format(', '.join(sorted(REPLAY_SETTINGS)))
+                       )
+
+    parser.add_argument('--replay-change',
+                        type=float,
+                        default=REPLAY_CHANGE,
+                        help='variation (in dBm) from the reading after the '
+                        'link came up that time to detect is measured from '
+                        '(default={0})'.format(REPLAY_CHANGE)
+                       )
+
+    parser.add_argument('--checkpoint',
+                        type=str,
+                        default=CHECKPOINT_FILE if os.path.isdir(
+                            os.path.dirname(CHECKPOINT_FILE)) else None,
+                        help='file the baselines are saved to and restored '
+                        'from on startup (default={0} when present)'.
+                        format(CHECKPOINT_FILE)
+                       )
+
+    parser.add_argument('--no-checkpoint',
+                        action='store_const',
+                        const=None,
+                        dest='checkpoint',
+                        help='Do not save or restore baselines')
+
+    parser.add_argument('--checkpoint-interval',
+                        type=int,
+                        default=CHECKPOINT_INTERVAL,
+                        help='minimum seconds between writes of the '
+                        'checkpoint (default={0})'.format(CHECKPOINT_INTERVAL)
+                       )
+
+    parser.add_argument('--metrics-port',
+                        type=int,
+                        default=METRICS_PORT,
+                        help='serve the latest readings and health metrics '
+                        'for Prometheus on this port (default: disabled)'
+                       )
+
+    parser.add_argument('--metrics-address',
+                        type=str,
+                        default=METRICS_ADDRESS,
+                        help='address the metrics are served on '
+                        '(default: all)'
+                       )
+
+    parser.add_argument('--profile',
+                        type=str,
+                        default=PROFILE_DIR,
+                        help='directory a profile of all threads is written '
+                        'to, in the folded format of flame graphs, on '
+                        'SIGUSR1 (default: SIGUSR1 only logs the stage '
+                        'timings)'
+                       )
+
+    parser.add_argument('--profile-seconds',
+                        type=int,
+                        default=PROFILE_SECONDS,
+                        help='length of a profile '
+                        '(default={0})'.format(PROFILE_SECONDS)
+                       )
+
     # Hidden options used for testing
     # Values:
     #   parse_only   Only parse the command line.
@@ -251,14 +757,113 @@ def parse_cmd_line():
 
     global SNMP
     SNMP = my_args.snmp
+    global SNMP_EXEC
+    SNMP_EXEC = my_args.snmptrap
+
+    global PROTOCOL
+    if my_args.transport:
+        PROTOCOL = my_args.transport
+    if PROTOCOL == 'unix' and my_args.inventory:
+        parser.error('transport unix only reaches the local switch, not an '
+                     'inventory.')
 
     if my_args.rebase_poll_limit < 1:
         parser.error('poll-interval must be greater than one.')
+    if my_args.cumulative_average:
+        if my_args.baseline not in ('fixed', 'cumulative'):
+            parser.error('cumulative-average conflicts with --baseline {0}.'.
+                         format(my_args.baseline))
+        my_args.baseline = 'cumulative'
+    if not 0 < my_args.ewma_alpha <= 1:
+        parser.error('ewma-alpha must be greater than zero and at most 1.')
+    if my_args.baseline_window < 2:
+        parser.error('baseline-window must be at least 2.')
+    if my_args.sigmas < 0:
+        parser.error('sigmas must not be negative.')
+    if my_args.sigmas and my_args.baseline not in ('ewma', 'rolling'):
+        parser.error('sigmas requires --baseline ewma or rolling.')
+    if my_args.sigma_floor < 0:
+        parser.error('sigma-floor must not be negative.')
     if my_args.poll_interval < 0:
         parser.error('poll-interval must be greater than zero.')
+    if not 0 <= my_args.jitter < 1:
+        parser.error('jitter must be at least 0 and less than 1.')
+    if my_args.engine == 'vector' and numpy is None:
+        parser.error('the vector engine requires NumPy.')
+    if my_args.workers < 1:
+        parser.error('workers must be greater than zero.')
+    if my_args.processes < 1:
+        parser.error('processes must be greater than zero.')
+    if my_args.processes > 1 and not my_args.inventory:
+        parser.error('processes requires --inventory.')
+    if my_args.timeout < 1:
+        parser.error('timeout must be greater than zero.')
+    if my_args.eapi_connections < 1:
+        parser.error('eapi-connections must be greater than zero.')
+    if my_args.dispatch_workers < 0:
+        parser.error('dispatch-workers must not be negative.')
+    if my_args.dispatch_queue_size < 1:
+        parser.error('dispatch-queue-size must be greater than zero.')
+    if my_args.coalesce_threshold < 0:
+        parser.error('coalesce-threshold must not be negative.')
+    if my_args.rate_limit < 0:
+        parser.error('rate-limit must not be negative.')
+    if my_args.rate_limit_burst < 1:
+        parser.error('rate-limit-burst must be greater than zero.')
+    if my_args.history_size < 1:
+        parser.error('history-size must be greater than zero.')
+    if my_args.adaptive and my_args.max_poll_interval < my_args.poll_interval:
+        parser.error('max-poll-interval must not be less than poll-interval.')
+    if my_args.remote_syslog:
+        try:
+            parse_syslog_url(my_args.remote_syslog)
+        except ValueError, err:
+            parser.error('remote-syslog must be [udp|tcp|tls://]HOST[:PORT]'
+                         ': {0}.'.format(err))
+    if my_args.remote_syslog_buffer < 1:
+        parser.error('remote-syslog-buffer must be greater than zero.')
+    if my_args.remote_syslog_ca and not (my_args.remote_syslog or
+                                         '').startswith('tls://'):
+        parser.error('remote-syslog-ca requires a tls:// remote-syslog.')
+    if my_args.static_refresh < 0:
+        parser.error('static-refresh must not be negative.')
+    if my_args.checkpoint_interval < 0:
+        parser.error('checkpoint-interval must not be negative.')
+    if my_args.history_query and not my_args.history:
+        parser.error('history-query requires --history.')
+    if my_args.sweep and not my_args.replay:
+        parser.error('sweep requires --replay.')
+    if my_args.replay_change <= 0:
+        parser.error('replay-change must be greater than zero.')
+    sweep = []
+    for setting in my_args.sweep:
+        name, _, values = setting.partition('=')
+        if name not in REPLAY_SETTINGS or not values:
+            parser.error('sweep must be SETTING=VALUE[,VALUE...], SETTING '
+                         'one of {0}.'.format(', '.join(
+                             sorted(REPLAY_SETTINGS))))
+        try:
+            values = [REPLAY_SETTINGS[name](value)
+                      for value in values.split(',')]
+        except ValueError, err:
+            parser.error('sweep {0}: {1}'.format(name, err))
+        sweep.append((name, values))
+    my_args.sweep = sweep
+    if my_args.profile_seconds < 1:
+        parser.error('profile-seconds must be greater than zero.')
+    if my_args.metrics_port is not None and \
+       not 0 < my_args.metrics_port < 65536:
+        parser.error('metrics-port must be between 1 and 65535.')
 
     global USE_CUMULATIVE_AVERAGE
-    USE_CUMULATIVE_AVERAGE = my_args.cumulative_average
+    USE_CUMULATIVE_AVERAGE = my_args.baseline == 'cumulative'
+    global BASELINE_MODEL
+    BASELINE_MODEL = baseline_model(my_args.baseline, alpha=my_args.ewma_alpha,
+                                    window=my_args.baseline_window)
+    global SIGMAS
+    SIGMAS = my_args.sigmas
+    global SIGMA_FLOOR
+    SIGMA_FLOOR = my_args.sigma_floor
     global TOLERANCE
     TOLERANCE = my_args.tolerance
     global REBASE_POLL_LIMIT
@@ -266,506 +871,5860 @@ def parse_cmd_line():
 
     return my_args
 
-def log(msg, level='INFO', error=False):
+# Syslog priority of each log level
+LOG_PRIORITIES = dict((level, getattr(syslog, 'LOG_' + level)) for level in
+                      ['EMERG', 'ALERT', 'CRIT', 'ERR', 'WARNING', 'NOTICE',
+                       'INFO', 'DEBUG'])
+
+def log(msg, *args, **kwargs):
     """Logging facility setup.
     args:
         msg (str): The message to log.
+        args: Values to format msg with, only if the message is logged.
         level (str): The priority level for the message. (Default: INFO)
                     See :mod:`syslog` for more options.
         error (bool): Flag if this is an error condition.
     """
 
+    level = kwargs.get('level', 'INFO')
+    error = kwargs.get('error', False)
+    if level == 'DEBUG' and not DEBUG and not error:
+        # Don't send DEBUG messages unless --debug was also set.
+        return
+
+    if args:
+        msg = msg.format(*args)
+
     if error:
         level = "ERR"
-        print "ERROR: {0} ({1}) {2}".format(os.path.basename(sys.argv[0]),
-                                            level, msg)
+        print "ERROR: {0} ({1}) {2}".format(PROGRAM, level, msg)
 
     if DEBUG:
         # Print to console
-        print "{0} ({1}) {2}".format(os.path.basename(sys.argv[0]), level, msg)
-    else:
-        if level == 'DEBUG':
-            # Don't send DEBUG messages unless --debug was also set.
-            return
+        print "{0} ({1}) {2}".format(PROGRAM, level, msg)
+
+    syslog.syslog(LOG_PRIORITIES[level], msg)
+
+def trace(*context):
+    """Log entry to the calling function, with debug on only.
+    args:
+        context: Values naming what the function is working on.
+    """
 
-    priority = ''.join(["syslog.LOG_", level])
-    syslog.syslog(eval(priority), msg)
+    if not DEBUG:
+        return
+    name = sys._getframe(1).f_code.co_name
+    if context:
+        name = '{0} for {1}'.format(name, ', '.join([str(value) for value
+                                                      in context]))
+    log("Entering {0}.", name, level='DEBUG')
 
-def notify(msg, level='INFO', error=False, uptime=0, out=sys.stdout):
+def notify(msg, level='INFO', error=False, uptime=0, out=sys.stdout,
+           fields=None):
     """Manage notifications
     args:
         msg (str): The message to log.
         level (str): The priority level for the message. (Default: INFO)
                     See :mod:`syslog` for more options.
         error (bool): Flag if this is an error condition.
+        uptime (int): The device's uptime for SNMP traps.
+        fields (dict): Structured details of the event, e.g. interface.
     """
-    if SYSLOG:
-        log(msg, level, error)
 
-    if SNMP:
-        send_trap(SNMP_SETTINGS, msg, uptime=uptime, test=False)
+    notification = Notification(msg, level=level, error=error, uptime=uptime,
+                                fields=fields)
+    if COALESCER is None or not COALESCER.collect(notification):
+        dispatch(notification)
 
     if out != sys.stdout:
         out.write(msg)
 
-def send_trap(snmp_settings, message, uptime=0, test=False):
-    """Send an Arista enterprise-specific SNMP trap containing message.
+def dispatch(notification):
+    '''Deliver a notification to the sinks, through the dispatch queue when
+    one is running.
+    '''
 
-    Args:
-        snmp_settings (dict): SNMP v2c or v3 settings.
-        message (string): The message to include in the trap
-        uptime (string): The device's uptime for the SNMP trap.
-        test (bool): Sent a sample trap message? (Default: False)
+    increment(NOTIFICATIONS_SENT, notification.level)
+    if DISPATCHER is not None:
+        DISPATCHER.put(notification)
+    else:
+        start = monotonic()
+        for sink in SINKS if SINKS is not None else default_sinks():
+            sink.send(notification)
+        TIMINGS.record('notify', monotonic() - start)
 
-    Example:
+def increment(counter, key):
+    '''Increment one of the counters exported by :class:`MetricsExporter`.
+    '''
 
-        trap_content = "Device {0} {1}, interface {2}: {3}"\
-            " increasing at > {4} per {5} seconds. Found {6}/{7} packets {8}".\
-        format(hostname,
-               device['modelName'],
-               interface,
-               counter,
-               changes[interface][counter]['threshold'],
-               interval,
-               changes[interface][counter]['found'],
-               changes[interface][counter]['total'],
-               changes[interface][counter]['direction'])
+    with COUNTERS_LOCK:
+        counter[key] += 1
 
-        # system uptime
-        send_trap(SETTINGS, trap_content, uptime=device['bootupTimestamp'])
-    """
-    log("Entering {0}.".format(sys._getframe().f_code.co_name), level='DEBUG')
+class Histogram(object):
+    '''Fixed-size histogram of durations: the count in each of a fixed set
+    of buckets doubling from 100 us to 52 s, with the total and the largest.
+    '''
 
-    log("Sending SNMPTRAP to {0}: {1}".format(snmp_settings['traphost'],
-                                              message))
+    # Upper bounds of the buckets, in seconds; a last bucket holds the rest
+    BOUNDS = tuple([0.0001 * 2 ** power for power in range(20)])
 
-    # NOTE: snmptrap caveat: Generates an error when run as unprivileged user.
-    #    Failed to create the persistent directory for
-    #    /var/net-snmp/snmpapp.conf
-    #    http://sourceforge.net/p/net-snmp/bugs/1706/
-    #
+    def __init__(self):
+        self.buckets = array('L', [0] * (len(self.BOUNDS) + 1))
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
 
-    # Build the arguments to snmptrap
-    trap_args = ['snmptrap']
-    trap_args.append('-v')
-    trap_args.append(snmp_settings['version'])
+    def add(self, seconds):
+        self.buckets[bisect.bisect_left(self.BOUNDS, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+        self.max = max(self.max, seconds)
 
-    if snmp_settings['version'] == '2c':
-        trap_args.append('-c')
-        trap_args.append(snmp_settings['community'])
+    def quantile(self, fraction):
+        '''Return the upper bound of the bucket holding the given fraction
+        of the durations (the largest duration for the last bucket).
+        '''
 
-    elif snmp_settings['version'] == '3':
-        # Send v3 snmp-inform rathern than a trap
-        trap_args.append('-Ci')
+        rank = fraction * self.count
+        total = 0
+        for bound, count in zip(self.BOUNDS, self.buckets):
+            total += count
+            if total >= rank:
+                return min(bound, self.max)
+        return self.max
 
-        trap_args.append('-l')
-        trap_args.append(snmp_settings['seclevel'])
-        trap_args.append('-u')
-        trap_args.append(snmp_settings['secname'])
+class StageTimings(object):
+    '''A :class:`Histogram` of the time spent in each stage of a poll cycle.
+    '''
 
-        if snmp_settings['seclevel'] in ['authNoPriv', 'authPriv']:
-            trap_args.append('-a')
-            trap_args.append(snmp_settings['authprotocol'])
-            trap_args.append('-A')
-            trap_args.append(snmp_settings['authpassword'])
+    # fetch: eAPI request until the response is read (until its headers
+    #   with --stream)
+    # decode: decoding the JSON response (and, with --stream, checking the
+    #   interfaces as they are decoded)
+    # evaluate: checking the interfaces against their baselines
+    # notify: delivering a notification to the sinks
+    # poll: a whole poll of a switch
+    # sleep_drift: how late the poll loop woke up for a poll tick
+    STAGES = ('fetch', 'decode', 'evaluate', 'notify', 'poll', 'sleep_drift')
 
-        if snmp_settings['seclevel'] == 'authPriv':
-            trap_args.append('-x')
-            trap_args.append(snmp_settings['privprotocol'])
-            trap_args.append('-X')
-            trap_args.append(snmp_settings['privpassword'])
-    else:
-        log("Unknown snmp version '{0}' specified in the config file.".
-            format(snmp_settings['version']))
-    trap_args.append(snmp_settings['traphost'])
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.histograms = dict((stage, Histogram()) for stage in self.STAGES)
 
-    #.iso.org.dod.internet.private. .arista
-    # enterprises.30065
-    enterprise_oid = '.1.3.6.1.4.1.30065'
-    # enterpriseSpecific = 6
-    generic_trapnum = '6'
-    trap_oid = '.'.join([enterprise_oid, generic_trapnum])
+    def record(self, stage, seconds):
+        with self.lock:
+            self.histograms[stage].add(seconds)
 
-    trap_args.append(str(uptime))
-    trap_args.append(enterprise_oid)
-    trap_args.append(trap_oid)
-    trap_args.append('s')
+    def snapshot(self):
+        '''Return [(stage, copy of its Histogram), ...].
+        '''
 
-    if test == "trap":
-        message = "TRANSCEIVER_RX_POWER_CHANGE, Ethernet2 (XKE000000000) RX "\
-                  "power level has changed by -2.6348 dBm from baseline "\
-                  "-5.4035 dBm (2015-12-15 11:33:11)  to -8.0382 dBm "\
-                  "(2015-12-15 11:33:33)"
-        log("Sending SNMPTRAP to {0} with arguments: {1}".
-            format(snmp_settings['traphost'], trap_args), level='DEBUG')
+        snapshot = []
+        with self.lock:
+            for stage in self.STAGES:
+                histogram = Histogram()
+                histogram.buckets = array('L', self.histograms[stage].buckets)
+                histogram.count = self.histograms[stage].count
+                histogram.sum = self.histograms[stage].sum
+                histogram.max = self.histograms[stage].max
+                snapshot.append((stage, histogram))
+        return snapshot
 
-    trap_args.append(message)
+    def summary(self):
+        '''Return one line per stage: count, mean, p50, p99 and max in ms.
+        '''
 
-    if test == "trap":
-        print "snmptrap_args:"
-        pprint(trap_args)
+        lines = []
+        for stage, histogram in self.snapshot():
+            if not histogram.count:
+                continue
+            lines.append('{0}: {1} in {2:.1f} ms mean, p50 <= {3:.1f} ms, '
+                         'p99 <= {4:.1f} ms, max {5:.1f} ms'.format(
+                             stage, histogram.count,
+                             histogram.sum / histogram.count * 1000,
+                             histogram.quantile(0.5) * 1000,
+                             histogram.quantile(0.99) * 1000,
+                             histogram.max * 1000))
+        return lines
 
-    call(trap_args)
+# Stage timings of every poll
+TIMINGS = StageTimings()
 
-def get_interfaces(switch):
-    """Get all of the interfaces on a switch.
-    Get summary info on all of the interfaces in a switch and return a
-        dictionary keyed on interface name.  NOTE: the interfaceIDs are
-        missing the space between the interface type and the number.
-    args:
-        switch (object): A :class:`jsonrpclib` Server object
-    returns:
-        dict: Dictionary, keyed on interface name (without space), of interface
-            summary information."
-    Example:
-        {u'Ethernet1': {u'autoNegotigateActive': False,
-                        u'bandwidth': 10000000000,
-                        u'description': u'',
-                        u'duplex': u'duplexFull',
-                        u'interfaceType': u'EbraTestPhyPort',
-                        u'linkStatus': u'connected',
-                        u'vlanInformation': {u'interfaceForwardingModel': u'bridged',
-                                             u'interfaceMode': u'bridged',
-                                             u'vlanId': 1}},
-        u'Ethernet2': {u'autoNegotigateActive': False,
-                       u'bandwidth': 10000000000,
-                       u'description': u'',
-                       u'duplex': u'duplexFull',
-                       u'interfaceType': u'EbraTestPhyPort',
-                       u'linkStatus': u'connected',
-                       u'vlanInformation': {u'interfaceForwardingModel': u'bridged',
-                                            u'interfaceMode': u'bridged',
-                                            u'vlanId': 1}}
+# The fetch of each eAPI request is recorded by the transport, which then
+# notes when decoding started here so run_commands can record the decode.
+STAGE_CLOCK = threading.local()
+
+class SamplingProfiler(object):
+    '''Sample the stack of every thread at an interval and write the
+    sampled stacks in the folded format of flamegraph.pl and speedscope:
+
+        <thread>;<outermost function>;...;<innermost function> <samples>
+
+    Unlike cProfile, it sees the worker threads the polls run in, and its
+    cost does not depend on how many functions are called.
+    '''
+
+    def __init__(self, directory, seconds=PROFILE_SECONDS,
+                 interval=PROFILE_INTERVAL):
+        self.directory = directory
+        self.seconds = seconds
+        self.interval = interval
+        self.thread = None
+        self.lock = threading.Lock()
+
+    def start(self):
+        '''Start a profile in the background.  Return False if one is
+        already running.
+        '''
+
+        with self.lock:
+            if self.thread is not None and self.thread.is_alive():
+                return False
+            self.thread = threading.Thread(target=self._run, name='profiler')
+            self.thread.daemon = True
+            self.thread.start()
+            return True
+
+    def _run(self):
+        filename = os.path.join(self.directory, 'dom-{0}-{1}.folded'.format(
+            os.getpid(), time.strftime('%Y%m%d-%H%M%S')))
+        stacks = self.sample(self.seconds)
+        with open(filename, 'w') as profile:
+            for stack, samples in sorted(stacks.items()):
+                profile.write('{0} {1}\n'.format(stack, samples))
+        log("Profile of {0} seconds written to {1}", self.seconds, filename)
+
+    def sample(self, seconds):
+        '''Return { <folded stack> : <samples> } over seconds.
+        '''
+
+        stacks = collections.Counter()
+        me = threading.current_thread().ident
+        deadline = time.time() + seconds
+        while time.time() < deadline:
+            names = dict((thread.ident, thread.name)
+                         for thread in threading.enumerate())
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                functions = []
+                while frame is not None:
+                    code = frame.f_code
+                    functions.append('{0} ({1}:{2})'.format(
+                        code.co_name, os.path.basename(code.co_filename),
+                        code.co_firstlineno))
+                    frame = frame.f_back
+                functions.append(names.get(ident, str(ident)))
+                stacks[';'.join(reversed(functions))] += 1
+            time.sleep(self.interval)
+        return stacks
+
+def on_usr1(profiler=None):
+    '''Return a SIGUSR1 handler logging the stage timings, and starting a
+    profile if there is a profiler.
+    '''
+
+    def handler(signum, frame):
+        for line in TIMINGS.summary():
+            log("Stage timing: {0}", line)
+        if profiler is not None and not profiler.start():
+            log("A profile is already being taken", level='WARNING')
+    return handler
+
+class Notification(object):
+    '''An event to deliver to the notification sinks.
+    '''
+
+    def __init__(self, msg, level='INFO', error=False, uptime=0, fields=None):
+        self.msg = msg
+        self.level = level
+        self.error = error
+        self.uptime = uptime
+        self.fields = fields or {}
+        self.created = time.time()
+
+    def __repr__(self):
+        return 'Notification({0!r})'.format(self.msg)
+
+class SyslogSink(object):
+    '''Deliver notifications with :func:`log`.
+    '''
+
+    name = 'syslog'
+
+    def send(self, notification):
+        log(notification.msg, level=notification.level,
+            error=notification.error)
+
+class SnmpSink(object):
+    '''Deliver notifications as SNMP traps/informs.
+
+    Notifications are only queued for the notifier's one sender thread: it
+    is not safe to send from several dispatch workers at once, and a trap
+    host that does not answer would hold up the other sinks.
+    '''
+
+    name = 'snmp'
+
+    def send(self, notification):
+        if SNMP_NOTIFIER is None:
+            send_trap(SNMP_SETTINGS, notification.msg,
+                      uptime=notification.uptime, test=False)
+        else:
+            SNMP_NOTIFIER.notify(notification.msg, uptime=notification.uptime)
+
+def default_sinks(rate=0, burst=RATE_LIMIT_BURST):
+    '''Return the sinks enabled on the command line.
+    args:
+        rate (float): Notifications per second allowed to each sink, 0 for
+                      no limit.
+        burst (int): Notifications each sink may send at once.
+    '''
+
+    sinks = []
+    if SYSLOG:
+        sinks.append(SyslogSink())
+    if SNMP:
+        sinks.append(SnmpSink())
+    if REMOTE_SYSLOG_SINK is not None:
+        sinks.append(REMOTE_SYSLOG_SINK)
+    if rate:
+        sinks = [RateLimitedSink(sink, rate, burst) for sink in sinks]
+    return sinks
+
+class TokenBucket(object):
+    '''Allow rate events per second on average, in bursts of up to burst.
+    '''
+
+    def __init__(self, rate, burst):
+        self.rate = float(rate)
+        self.burst = float(burst)
+        self.tokens = self.burst
+        self.updated = time.time()
+        self.lock = threading.Lock()
+
+    def take(self):
+        '''Take a token if one is available.
+        returns:
+            bool: True if the event is allowed.
+        '''
+
+        with self.lock:
+            now = time.time()
+            self.tokens = min(self.burst,
+                              self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens < 1:
+                return False
+            self.tokens -= 1
+            return True
+
+class RateLimitedSink(object):
+    '''Wrap a sink with a token bucket.  Notifications over the limit are
+    dropped and reported once the sink may send again.
+    '''
+
+    def __init__(self, sink, rate, burst):
+        self.sink = sink
+        self.name = sink.name
+        self.bucket = TokenBucket(rate, burst)
+        self.suppressed = 0
+        self.total_suppressed = 0
+
+    def send(self, notification):
+        if not self.bucket.take():
+            self.suppressed += 1
+            self.total_suppressed += 1
+            return
+
+        if self.suppressed:
+            log("{0}: rate limit suppressed {1} notification(s)".
+                format(self.name, self.suppressed), level='WARNING')
+            self.suppressed = 0
+        self.sink.send(notification)
+
+def parse_syslog_url(url):
+    '''Split a remote syslog destination, [udp|tcp|tls://]host[:port].
+    returns:
+        tuple: (protocol, host, port), the port defaulting to 514, or 6514
+            for tls.
+    raises:
+        ValueError: The protocol, host or port is not valid.
+    '''
+
+    protocol, _, address = url.rpartition('://')
+    protocol = protocol or 'udp'
+    if protocol not in RemoteSyslogSink.PORTS:
+        raise ValueError("Unknown protocol '{0}'".format(protocol))
+    port = RemoteSyslogSink.PORTS[protocol]
+    if address.startswith('['):
+        # [IPv6 address]:port
+        host, _, rest = address[1:].partition(']')
+        if rest:
+            port = rest.lstrip(':')
+    elif address.count(':') == 1:
+        host, port = address.split(':')
+    else:
+        host = address
+    if not host:
+        raise ValueError("No host in '{0}'".format(url))
+    return protocol, host, int(port)
+
+def _sd_name(name, length):
+    '''Return name as a syslog header field or SD-PARAM name: printable
+    ASCII without spaces, '=', ']' or '"', at most length long.
+    '''
+
+    name = re.sub(r'[^\x21-\x7e]|[=\]"]', '_', str(name))[:length]
+    return name or '-'
+
+class RemoteSyslogSink(object):
+    '''Deliver notifications to a remote syslog collector, framed as RFC
+    5424 messages with the notification's fields as structured data.
+
+    send() only appends the notification to a bounded buffer, dropping the
+    oldest when it is full, so the poll loop never waits on the network, nor
+    on formatting.  A background thread formats and writes what is buffered
+    in batches over one persistent non-blocking socket: a datagram per
+    message over UDP, octet-counted (RFC 6587) over TCP and TLS (RFC 5425).
+    A lost connection is retried after a delay doubling up to
+    RECONNECT_MAX_DELAY, buffering meanwhile, and the message being written
+    when it was lost is sent again.
+    '''
+
+    name = 'remote-syslog'
+
+    PORTS = {'udp': 514, 'tcp': 514, 'tls': 6514}
+    # Structured data ID: Arista's private enterprise number, as in
+    # ENTERPRISE_OID
+    SD_ID = 'dom@30065'
+    # Facility of the messages: user-level, as the local syslog
+    FACILITY = syslog.LOG_USER
+    # Most messages formatted and written at once
+    BATCH_SIZE = 256
+    # Seconds to connect, or for the socket to take more of a batch
+    TIMEOUT = 5
+    RECONNECT_DELAY = 1
+    RECONNECT_MAX_DELAY = 60
+
+    def __init__(self, url, buffer_size=REMOTE_SYSLOG_BUFFER, ca_certs=None,
+                 hostname=None):
+        '''args:
+            url (str): [udp|tcp|tls://]host[:port] of the collector.
+            buffer_size (int): Notifications buffered while they cannot be
+                sent.
+            ca_certs (str): File of the CA certificates to verify a tls
+                collector with. (Default: not verified)
+            hostname (str): HOSTNAME of the messages. (Default: this host's)
+        '''
+
+        self.protocol, self.host, self.port = parse_syslog_url(url)
+        self.buffer_size = buffer_size
+        self.ca_certs = ca_certs
+        self.hostname = _sd_name(hostname or socket.gethostname(), 255)
+        self.app_name = _sd_name(PROGRAM, 48)
+        self.procid = str(os.getpid())
+
+        self.buffer = collections.deque()
+        self.lock = threading.Lock()
+        self.ready = threading.Condition(self.lock)
+        self.thread = None
+        self.running = False
+        self.sock = None
+        self.delay = 0
+        # Monotonic time of the next connection attempt
+        self.retry_at = 0
+
+        # Counters
+        self.sent = 0
+        self.dropped = 0
+        self.failed = 0
+        self.connects = 0
+
+    def format(self, notification):
+        '''Return a notification as an RFC 5424 syslog message.
+        '''
+
+        severity = LOG_PRIORITIES['ERR' if notification.error
+                                  else notification.level]
+        created = datetime.datetime.utcfromtimestamp(notification.created)
+        msg = notification.msg
+        if isinstance(msg, unicode):
+            msg = msg.encode('utf-8')
+        # The event, as TRANSCEIVER_RX_POWER_CHANGE
+        msgid = re.match(r'[A-Z][A-Z0-9_]{0,31}\b', msg)
+        return '<{0}>1 {1}Z {2} {3} {4} {5} {6} {7}'.format(
+            self.FACILITY | severity, created.isoformat(), self.hostname,
+            self.app_name, self.procid, msgid.group(0) if msgid else '-',
+            self.structured_data(notification.fields), msg)
+
+    def structured_data(self, fields):
+        '''Return the structured data element of notification fields, or
+        '-' without any.
+        '''
+
+        params = []
+        for name, value in sorted(fields.items()):
+            if value is None:
+                continue
+            if isinstance(value, (list, tuple)):
+                value = u','.join([unicode(item) for item in value])
+            value = unicode(value).encode('utf-8')
+            params.append(' {0}="{1}"'.format(
+                _sd_name(name, 32), re.sub(r'(["\\\]])', r'\\\1', value)))
+        if not params:
+            return '-'
+        return '[{0}{1}]'.format(self.SD_ID, ''.join(params))
+
+    def send(self, notification):
+        with self.lock:
+            if len(self.buffer) >= self.buffer_size:
+                self.buffer.popleft()
+                self.dropped += 1
+            self.buffer.append(notification)
+            self.ready.notify()
+
+    def start(self):
+        '''Start the thread writing to the collector.
+        '''
+
+        self.running = True
+        self.thread = threading.Thread(target=self._run, name='remote-syslog')
+        self.thread.daemon = True
+        self.thread.start()
+        return self
+
+    def stop(self, timeout=TIMEOUT):
+        '''Write what is buffered for up to timeout seconds, then close the
+        connection.
+        '''
+
+        with self.lock:
+            self.running = False
+            self.ready.notify()
+        if self.thread is not None:
+            self.thread.join(timeout)
+            self.thread = None
+        self._close()
+
+    def stats(self):
+        '''Return the counters: depth of the buffer, and messages sent,
+        dropped and failed, and connections made.
+        '''
+
+        with self.lock:
+            return {'depth': len(self.buffer), 'sent': self.sent,
+                    'dropped': self.dropped, 'failed': self.failed,
+                    'connects': self.connects}
+
+    def _run(self):
+        while True:
+            with self.lock:
+                while self.running and (not self.buffer or
+                                        monotonic() < self.retry_at):
+                    if self.buffer:
+                        self.ready.wait(self.retry_at - monotonic())
+                    else:
+                        self.ready.wait()
+                if not self.buffer or monotonic() < self.retry_at:
+                    # Stopped, with nothing left that can be written
+                    return
+                batch = [self.buffer.popleft() for _ in
+                         range(min(len(self.buffer), self.BATCH_SIZE))]
+
+            messages = [self.format(notification) for notification in batch]
+            if self.protocol != 'udp':
+                messages = ['{0} {1}'.format(len(message), message)
+                            for message in messages]
+            unsent = batch[self._write(messages):]
+            with self.lock:
+                self.sent += len(batch) - len(unsent)
+                # Back ahead of what was buffered meanwhile, within the bound
+                room = max(0, self.buffer_size - len(self.buffer))
+                self.dropped += max(0, len(unsent) - room)
+                self.buffer.extendleft(reversed(unsent[:room]))
+
+    def _write(self, batch):
+        '''Write a batch of framed messages, connecting first if need be.
+        returns:
+            int: The messages sent before the first not sent whole.
+        '''
+
+        index = written = 0
+        try:
+            sock = self._connect()
+            if self.protocol == 'udp':
+                for index, message in enumerate(batch):
+                    try:
+                        self._send(sock, message)
+                    except socket.error, err:
+                        if err.errno not in (errno.ECONNREFUSED,
+                                             errno.EMSGSIZE):
+                            raise
+                        # Not listening (yet), or too long for a datagram
+                        with self.lock:
+                            self.failed += 1
+                return len(batch)
+
+            data = ''.join(batch)
+            while written < len(data):
+                written += self._send(sock, data[written:])
+            return len(batch)
+        except (EnvironmentError, ssl.CertificateError), err:
+            self.delay = min(self.delay * 2 or self.RECONNECT_DELAY,
+                             self.RECONNECT_MAX_DELAY)
+            self.retry_at = monotonic() + self.delay
+            log("Remote syslog {0}://{1}:{2}: {3}, retrying in {4} "
+                "seconds".format(self.protocol, self.host, self.port, err,
+                                 self.delay), level='WARNING')
+            self._close()
+            if self.protocol == 'udp':
+                return index
+            for index, message in enumerate(batch):
+                written -= len(message)
+                if written < 0:
+                    return index
+            return len(batch)
+
+    def _wait(self, sock, readable=False):
+        '''Wait until the socket can be written to, or read from.
+        raises:
+            socket.timeout: Not within TIMEOUT seconds.
+        '''
+
+        if readable:
+            ready = select.select([sock], [], [], self.TIMEOUT)[0]
+        else:
+            ready = select.select([], [sock], [], self.TIMEOUT)[1]
+        if not ready:
+            raise socket.timeout('timed out')
+
+    def _send(self, sock, data):
+        '''Send what the socket takes of data, waiting for it to take some.
+        returns:
+            int: The bytes sent.
+        '''
+
+        while True:
+            try:
+                return sock.send(data)
+            except ssl.SSLWantReadError:
+                self._wait(sock, readable=True)
+            except ssl.SSLWantWriteError:
+                self._wait(sock)
+            except socket.error, err:
+                if err.errno not in (errno.EAGAIN, errno.EWOULDBLOCK):
+                    raise
+                self._wait(sock)
+
+    def _connect(self):
+        '''Return the socket to the collector, connecting it if need be.
+        '''
+
+        if self.sock is not None:
+            return self.sock
+
+        socktype = socket.SOCK_DGRAM if self.protocol == 'udp' \
+                   else socket.SOCK_STREAM
+        family, socktype, proto, _, address = socket.getaddrinfo(
+            self.host, self.port, 0, socktype)[0]
+        sock = socket.socket(family, socktype, proto)
+        try:
+            sock.setblocking(0)
+            error = sock.connect_ex(address)
+            if error in (errno.EINPROGRESS, errno.EWOULDBLOCK):
+                self._wait(sock)
+                error = sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+            if error:
+                raise socket.error(error, os.strerror(error))
+
+            if self.protocol == 'tls':
+                context = ssl.SSLContext(ssl.PROTOCOL_SSLv23)
+                if self.ca_certs:
+                    context.verify_mode = ssl.CERT_REQUIRED
+                    context.check_hostname = True
+                    context.load_verify_locations(self.ca_certs)
+                sock = context.wrap_socket(sock, server_hostname=self.host,
+                                           do_handshake_on_connect=False)
+                while True:
+                    try:
+                        sock.do_handshake()
+                        break
+                    except ssl.SSLWantReadError:
+                        self._wait(sock, readable=True)
+                    except ssl.SSLWantWriteError:
+                        self._wait(sock)
+        except:
+            sock.close()
+            raise
+
+        self.sock = sock
+        self.delay = 0
+        with self.lock:
+            self.connects += 1
+        log("Remote syslog connected to {0}://{1}:{2}".format(
+            self.protocol, self.host, self.port), level='DEBUG')
+        return sock
+
+    def _close(self):
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+
+def _linecard(interface):
+    '''Return the line card of a modular interface name ('Ethernet3/1' is
+    on line card '3'), or None for a fixed-configuration port.
+    '''
+
+    if '/' not in interface:
+        return None
+    return interface[len('Ethernet'):].split('/', 1)[0]
+
+class NotificationCoalescer(object):
+    '''Batch the power-change notifications raised while polling a switch.
+
+    Between :meth:`begin` and :meth:`end` the notifications raised by the
+    calling thread are held.  At :meth:`end`, groups (per switch, or per line
+    card) with at least threshold events are replaced by one summary
+    notification; smaller groups are passed on unchanged.
+    '''
+
+    def __init__(self, threshold=COALESCE_THRESHOLD, group=COALESCE_GROUP):
+        if group not in ['switch', 'linecard']:
+            raise ValueError("Unknown coalesce group '{0}'".format(group))
+        self.threshold = threshold
+        self.group = group
+        self.local = threading.local()
+        self.coalesced = 0
+
+    def begin(self):
+        '''Start holding this thread's notifications.
+        '''
+
+        self.local.pending = []
+
+    def collect(self, notification):
+        '''Hold a power-change notification if this thread is collecting.
+        returns:
+            bool: True if the notification was held.
+        '''
+
+        pending = getattr(self.local, 'pending', None)
+        if pending is None or 'direction' not in notification.fields:
+            return False
+        pending.append(notification)
+        return True
+
+    def end(self):
+        '''Stop holding notifications.
+        returns:
+            list: The notifications to deliver, in the order raised.
+        '''
+
+        pending = getattr(self.local, 'pending', None) or []
+        self.local.pending = None
+        return self.summarize(pending)
+
+    def _key(self, notification):
+        fields = notification.fields
+        if self.group == 'linecard':
+            return (fields.get('hostname'),
+                    _linecard(fields.get('interface', '')))
+        return (fields.get('hostname'), None)
+
+    def summarize(self, notifications):
+        '''Replace large groups of notifications with summaries.
+        '''
+
+        groups = collections.OrderedDict()
+        for notification in notifications:
+            groups.setdefault(self._key(notification), []).append(notification)
+
+        result = []
+        for (hostname, linecard), group in groups.items():
+            if not self.threshold or len(group) < self.threshold:
+                result.extend(group)
+                continue
+
+            self.coalesced += len(group)
+            interfaces = []
+            counts = {'rx': 0, 'tx': 0}
+            worst = group[0].fields
+            for notification in group:
+                fields = notification.fields
+                counts[fields['direction']] += 1
+                if fields['interface'] not in interfaces:
+                    interfaces.append(fields['interface'])
+                if abs(fields['delta']) > abs(worst['delta']):
+                    worst = fields
+
+            where = ' '.join([name for name in
+                              [hostname, 'linecard {0}'.format(linecard)
+                               if linecard is not None else None] if name])
+            result.append(Notification(
+                'TRANSCEIVER_POWER_CHANGE_SUMMARY, {0}{1} RX and {2} TX power '
+                'level changes on {3} interfaces ({4}), largest {5} dBm on '
+                '{6} {7}'.format(where + ': ' if where else '',
+                                 counts['rx'], counts['tx'], len(interfaces),
+                                 ', '.join(interfaces), worst['delta'],
+                                 worst['interface'],
+                                 worst['direction'].upper()),
+                level='WARNING',
+                uptime=group[0].uptime,
+                fields={'hostname': hostname,
+                        'linecard': linecard,
+                        'interfaces': interfaces,
+                        'rx_changes': counts['rx'],
+                        'tx_changes': counts['tx'],
+                        'delta': worst['delta']}))
+        return result
+
+class NotificationDispatcher(object):
+    '''Deliver notifications to the sinks from background worker threads.
+
+    The poll loop only appends to a bounded queue.  When the queue is full,
+    the 'drop-oldest' overflow policy discards the oldest queued notification
+    and 'block' makes the caller wait for room.
+    '''
+
+    def __init__(self, sinks, workers=DISPATCH_WORKERS,
+                 queue_size=DISPATCH_QUEUE_SIZE, overflow=DISPATCH_OVERFLOW):
+        if overflow not in ['drop-oldest', 'block']:
+            raise ValueError("Unknown overflow policy '{0}'".format(overflow))
+
+        self.sinks = sinks
+        self.workers = workers
+        self.queue_size = queue_size
+        self.overflow = overflow
+
+        self.queue = collections.deque()
+        self.lock = threading.Lock()
+        self.not_empty = threading.Condition(self.lock)
+        self.not_full = threading.Condition(self.lock)
+        self.threads = []
+        self.running = False
+
+        # Counters
+        self.queued = 0
+        self.delivered = 0
+        self.dropped = 0
+        self.failed = 0
+        self.max_depth = 0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+
+    def put(self, notification):
+        '''Queue a notification for delivery.
+        '''
+
+        with self.lock:
+            while len(self.queue) >= self.queue_size:
+                if self.overflow == 'block' and self.running:
+                    self.not_full.wait()
+                else:
+                    self.queue.popleft()
+                    self.dropped += 1
+            self.queue.append(notification)
+            self.queued += 1
+            self.max_depth = max(self.max_depth, len(self.queue))
+            self.not_empty.notify()
+
+    def _run(self):
+        while True:
+            with self.lock:
+                while not self.queue and self.running:
+                    self.not_empty.wait()
+                if not self.queue:
+                    return
+                notification = self.queue.popleft()
+                self.not_full.notify()
+
+            start = monotonic()
+            for sink in self.sinks:
+                try:
+                    sink.send(notification)
+                except Exception, err:
+                    with self.lock:
+                        self.failed += 1
+                    log("Failed to send notification to {0}: {1}".
+                        format(sink.name, err), error=True)
+            TIMINGS.record('notify', monotonic() - start)
+
+            latency = time.time() - notification.created
+            with self.lock:
+                self.delivered += 1
+                self.total_latency += latency
+                self.max_latency = max(self.max_latency, latency)
+
+    def start(self):
+        '''Start the worker threads.
+        '''
+
+        self.running = True
+        for number in range(self.workers):
+            thread = threading.Thread(target=self._run,
+                                      name='dispatch-{0}'.format(number))
+            thread.daemon = True
+            thread.start()
+            self.threads.append(thread)
+
+    def stop(self):
+        '''Deliver anything still queued, then stop the worker threads.
+        '''
+
+        with self.lock:
+            self.running = False
+            self.not_empty.notify_all()
+            self.not_full.notify_all()
+        for thread in self.threads:
+            thread.join()
+        self.threads = []
+
+    def stats(self):
+        '''Return the dispatch counters.
+        returns:
+            dict: depth, max_depth, queued, delivered, dropped, failed and
+                average/max latency (seconds from notify() to delivery).
+        '''
+
+        with self.lock:
+            return {'depth': len(self.queue),
+                    'max_depth': self.max_depth,
+                    'queued': self.queued,
+                    'delivered': self.delivered,
+                    'dropped': self.dropped,
+                    'failed': self.failed,
+                    'avg_latency': self.total_latency / self.delivered
+                                   if self.delivered else 0.0,
+                    'max_latency': self.max_latency}
+
+#.iso.org.dod.internet.private. .arista
+# enterprises.30065
+ENTERPRISE_OID = '.1.3.6.1.4.1.30065'
+# enterpriseSpecific = 6
+TRAP_OID = '.'.join([ENTERPRISE_OID, '6'])
+
+TEST_TRAP_MESSAGE = "TRANSCEIVER_RX_POWER_CHANGE, Ethernet2 (XKE000000000) RX "\
+                    "power level has changed by -2.6348 dBm from baseline "\
+                    "-5.4035 dBm (2015-12-15 11:33:11)  to -8.0382 dBm "\
+                    "(2015-12-15 11:33:33)"
+
+def send_trap(snmp_settings, message, uptime=0, test=False):
+    """Send an Arista enterprise-specific SNMP trap containing message.
+
+    Args:
+        snmp_settings (dict): SNMP v2c or v3 settings.
+        message (string): The message to include in the trap
+        uptime (string): The device's uptime for the SNMP trap.
+        test (bool): Sent a sample trap message? (Default: False)
+
+    Example:
+
+        trap_content = "Device {0} {1}, interface {2}: {3}"\
+            " increasing at > {4} per {5} seconds. Found {6}/{7} packets {8}".\
+        format(hostname,
+               device['modelName'],
+               interface,
+               counter,
+               changes[interface][counter]['threshold'],
+               interval,
+               changes[interface][counter]['found'],
+               changes[interface][counter]['total'],
+               changes[interface][counter]['direction'])
+
+        # system uptime
+        send_trap(SETTINGS, trap_content, uptime=device['bootupTimestamp'])
+    """
+    trace()
+
+    log("Sending SNMPTRAP to {0}: {1}".format(snmp_settings['traphost'],
+                                              message))
+
+    # NOTE: snmptrap caveat: Generates an error when run as unprivileged user.
+    #    Failed to create the persistent directory for
+    #    /var/net-snmp/snmpapp.conf
+    #    http://sourceforge.net/p/net-snmp/bugs/1706/
+    #
+
+    # Build the arguments to snmptrap
+    trap_args = ['snmptrap']
+    trap_args.append('-v')
+    trap_args.append(snmp_settings['version'])
+
+    if snmp_settings['version'] == '2c':
+        trap_args.append('-c')
+        trap_args.append(snmp_settings['community'])
+
+    elif snmp_settings['version'] == '3':
+        # Send v3 snmp-inform rathern than a trap
+        trap_args.append('-Ci')
+
+        trap_args.append('-l')
+        trap_args.append(snmp_settings['seclevel'])
+        trap_args.append('-u')
+        trap_args.append(snmp_settings['secname'])
+
+        if snmp_settings['seclevel'] in ['authNoPriv', 'authPriv']:
+            trap_args.append('-a')
+            trap_args.append(snmp_settings['authprotocol'])
+            trap_args.append('-A')
+            trap_args.append(snmp_settings['authpassword'])
+
+        if snmp_settings['seclevel'] == 'authPriv':
+            trap_args.append('-x')
+            trap_args.append(snmp_settings['privprotocol'])
+            trap_args.append('-X')
+            trap_args.append(snmp_settings['privpassword'])
+    else:
+        log("Unknown snmp version '{0}' specified in the config file.".
+            format(snmp_settings['version']))
+    trap_args.append(snmp_settings['traphost'])
+
+    trap_args.append(str(uptime))
+    trap_args.append(ENTERPRISE_OID)
+    trap_args.append(TRAP_OID)
+    trap_args.append('s')
+
+    if test == "trap":
+        message = TEST_TRAP_MESSAGE
+        log("Sending SNMPTRAP to {0} with arguments: {1}".
+            format(snmp_settings['traphost'], trap_args), level='DEBUG')
+
+    trap_args.append(message)
+
+    if test == "trap":
+        print "snmptrap_args:"
+        pprint(trap_args)
+
+    call(trap_args)
+
+#
+# Native SNMP notifications
+#
+# BER encoding of SNMPv2-Trap and InformRequest PDUs (RFC 3416) in SNMPv2c
+# (RFC 1901) or SNMPv3 USM (RFC 3414) messages, so a notification is a
+# sendto() rather than an snmptrap process.
+#
+
+SYS_UPTIME_OID = '1.3.6.1.2.1.1.3.0'
+SNMP_TRAP_OID = '1.3.6.1.6.3.1.1.4.1.0'
+USM_STATS_NOT_IN_TIME_WINDOWS_OID = '1.3.6.1.6.3.15.1.1.2.0'
+USM_STATS_UNKNOWN_ENGINE_IDS_OID = '1.3.6.1.6.3.15.1.1.4.0'
+
+BER_INTEGER = 0x02
+BER_OCTET_STRING = 0x04
+BER_OID = 0x06
+BER_SEQUENCE = 0x30
+BER_TIMETICKS = 0x43
+PDU_GET = 0xa0
+PDU_RESPONSE = 0xa2
+PDU_INFORM = 0xa6
+PDU_TRAP = 0xa7
+PDU_REPORT = 0xa8
+
+USM_FLAG_AUTH = 0x01
+USM_FLAG_PRIV = 0x02
+USM_FLAG_REPORTABLE = 0x04
+USM_AUTH_HASHES = {'MD5': hashlib.md5, 'SHA': hashlib.sha1}
+
+class SnmpError(Exception):
+    """ An SnmpError is raised when a notification cannot be delivered.
     """
 
-    log("Entering {0}.".format(sys._getframe().f_code.co_name), level='DEBUG')
-    conn_error = False
-    commands = ["show interfaces status"]
+    pass
+
+def _ber(tag, payload):
+    '''Encode a BER tag-length-value.
+    '''
+
+    length = len(payload)
+    if length < 0x80:
+        return chr(tag) + chr(length) + payload
+
+    encoded = ''
+    while length:
+        encoded = chr(length & 0xff) + encoded
+        length >>= 8
+    return chr(tag) + chr(0x80 | len(encoded)) + encoded + payload
+
+def _ber_integer(value, tag=BER_INTEGER):
+    '''Encode a two's complement integer (or unsigned TimeTicks).
+    '''
+
+    encoded = chr(value & 0xff)
+    value >>= 8
+    while not ((value == 0 and not ord(encoded[0]) & 0x80) or
+               (value == -1 and ord(encoded[0]) & 0x80)):
+        encoded = chr(value & 0xff) + encoded
+        value >>= 8
+    return _ber(tag, encoded)
+
+def _ber_oid(oid):
+    '''Encode a dotted OBJECT IDENTIFIER.
+    '''
+
+    arcs = [int(arc) for arc in oid.strip('.').split('.')]
+    encoded = chr(40 * arcs[0] + arcs[1])
+    for arc in arcs[2:]:
+        chunk = chr(arc & 0x7f)
+        arc >>= 7
+        while arc:
+            chunk = chr(0x80 | (arc & 0x7f)) + chunk
+            arc >>= 7
+        encoded += chunk
+    return _ber(BER_OID, encoded)
+
+def _ber_sequence(*items):
+    return _ber(BER_SEQUENCE, ''.join(items))
+
+def _ber_decode(data, offset=0):
+    '''Decode the BER TLV at offset.
+    returns:
+        tuple: (tag, value, offset of the next TLV)
+    '''
+
+    tag = ord(data[offset])
+    length = ord(data[offset + 1])
+    offset += 2
+    if length & 0x80:
+        octets = length & 0x7f
+        length = 0
+        for char in data[offset:offset + octets]:
+            length = (length << 8) | ord(char)
+        offset += octets
+    if offset + length > len(data):
+        raise SnmpError("Truncated BER value")
+    return tag, data[offset:offset + length], offset + length
+
+def _ber_items(data):
+    '''Decode the (tag, value) items of a constructed BER value.
+    '''
+
+    items = []
+    offset = 0
+    while offset < len(data):
+        tag, value, offset = _ber_decode(data, offset)
+        items.append((tag, value))
+    return items
+
+def _ber_integer_value(data):
+    value = 0
+    for char in data:
+        value = (value << 8) | ord(char)
+    if data and ord(data[0]) & 0x80:
+        value -= 1 << (8 * len(data))
+    return value
+
+def _ber_oid_value(data):
+    arcs = [ord(data[0]) // 40, ord(data[0]) % 40]
+    arc = 0
+    for char in data[1:]:
+        arc = (arc << 7) | (ord(char) & 0x7f)
+        if not ord(char) & 0x80:
+            arcs.append(arc)
+            arc = 0
+    return '.'.join([str(number) for number in arcs])
+
+def _notification_pdu(pdu_type, request_id, uptime, message):
+    '''Build the SNMPv2-Trap/InformRequest PDU sent by :func:`send_trap`:
+    sysUpTime.0, snmpTrapOID.0 = ENTERPRISE_OID and TRAP_OID = message.
+    '''
+
+    varbinds = _ber_sequence(
+        _ber_sequence(_ber_oid(SYS_UPTIME_OID),
+                      _ber_integer(int(uptime or 0) & 0xffffffff,
+                                   BER_TIMETICKS)),
+        _ber_sequence(_ber_oid(SNMP_TRAP_OID), _ber_oid(ENTERPRISE_OID)),
+        _ber_sequence(_ber_oid(TRAP_OID), _ber(BER_OCTET_STRING, message)))
+    return _ber(pdu_type, _ber_integer(request_id) + _ber_integer(0) +
+                _ber_integer(0) + varbinds)
+
+_LOCALIZED_KEYS = {}
+_LOCALIZED_KEYS_LOCK = threading.Lock()
+
+def usm_localized_key(authprotocol, password, engine_id):
+    '''Return the USM key for password localized to engine_id (RFC 3414
+    A.2).  Keys are cached: the password hash costs a megabyte of digest.
+    args:
+        authprotocol (str): MD5|SHA
+        password (str): The auth or priv password.
+        engine_id (str): The authoritative (receiver's) snmpEngineID.
+    '''
+
+    cache_key = (authprotocol, password, engine_id)
+    with _LOCALIZED_KEYS_LOCK:
+        if cache_key in _LOCALIZED_KEYS:
+            return _LOCALIZED_KEYS[cache_key]
+
+    digest = USM_AUTH_HASHES[authprotocol]
+    repeated = password * (1048576 // len(password) + 1)
+    user_key = digest(repeated[:1048576]).digest()
+    key = digest(user_key + engine_id + user_key).digest()
+
+    with _LOCALIZED_KEYS_LOCK:
+        _LOCALIZED_KEYS[cache_key] = key
+    return key
+
+class SnmpNotifier(object):
+    '''Send SNMP v2c traps or v3 informs from within the process.
+
+    Notifications queued with :meth:`notify` are sent by a background thread
+    so the poll loop never waits on the trap host.  v3 informs discover the
+    receiver's engine ID and time window, and are retried until acknowledged.
+    '''
+
+    def __init__(self, snmp_settings, timeout=SNMP_TIMEOUT,
+                 retries=SNMP_RETRIES, queue_size=SNMP_QUEUE_SIZE):
+        self.settings = snmp_settings
+        self.timeout = timeout
+        self.retries = retries
+        self.version = snmp_settings['version']
+
+        seclevel = snmp_settings.get('seclevel', 'noAuthNoPriv')
+        self.auth = seclevel in ['authNoPriv', 'authPriv']
+        self.priv = seclevel == 'authPriv'
+        privprotocol = snmp_settings.get('privprotocol', 'DES')
+        self.privprotocol = 'AES' if privprotocol.startswith('AES') \
+                            else privprotocol
+
+        # Encrypting informs needs the Crypto module; otherwise fall back to
+        # the snmptrap command.
+        self.native = self.version in ['2c', '3'] and not \
+                      (self.priv and (AES is None or DES is None or
+                                      self.privprotocol not in ['DES', 'AES']))
+
+        host, port = snmp_settings['traphost'], 162
+        if host.count(':') == 1:
+            host, port = host.split(':')
+        self.host = host
+        self.port = int(port)
+        self.sock = None
+
+        # [engine ID, boots, time, time.time() when learned]
+        self.engine = None
+        self.msg_id = random.randint(1, 0x7fffffff)
+        self.salt = random.randint(0, 0xffffffffffffffff)
+
+        self.queue = Queue.Queue(queue_size)
+        self.thread = None
+        self.sent = 0
+        self.failed = 0
+        self.dropped = 0
+
+    def _socket(self):
+        if self.sock is None:
+            family, socktype, proto, _, address = socket.getaddrinfo(
+                self.host, self.port, 0, socket.SOCK_DGRAM)[0]
+            self.sock = socket.socket(family, socktype, proto)
+            self.sock.connect(address)
+        return self.sock
+
+    def _next_id(self):
+        self.msg_id = self.msg_id % 0x7fffffff + 1
+        return self.msg_id
+
+    def _exchange(self, packet, msg_id):
+        '''Send a v3 packet and wait for the reply with the same msgID.
+        returns:
+            tuple: (pdu type, [engine ID, boots, time], first varbind OID),
+                or None on timeout.  pdu type is PDU_RESPONSE for an
+                encrypted reply.
+        '''
+
+        sock = self._socket()
+        sock.send(packet)
+        deadline = time.time() + self.timeout
+        while True:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                return None
+            sock.settimeout(remaining)
+            try:
+                data = sock.recv(65535)
+            except socket.timeout:
+                return None
+            except socket.error:
+                # e.g. ICMP port unreachable from a previous send
+                return None
+
+            try:
+                reply = self._parse_v3(data)
+            except (SnmpError, IndexError, ValueError):
+                log("Ignoring malformed SNMP reply from {0}".
+                    format(self.host), level='DEBUG')
+                continue
+            if reply[0] == msg_id:
+                return reply[1:]
+
+    @staticmethod
+    def _parse_v3(data):
+        _, message, _ = _ber_decode(data)
+        items = _ber_items(message)
+        header = _ber_items(items[1][1])
+        msg_id = _ber_integer_value(header[0][1])
+        security = _ber_items(_ber_decode(items[2][1])[1])
+        engine = [security[0][1], _ber_integer_value(security[1][1]),
+                  _ber_integer_value(security[2][1]), time.time()]
+
+        tag, scoped_pdu = items[3]
+        if tag != BER_SEQUENCE:
+            # Encrypted: only the acknowledgement of an authPriv inform
+            return msg_id, PDU_RESPONSE, engine, None
+        pdu_type, pdu = _ber_items(scoped_pdu)[2]
+        varbinds = _ber_items(_ber_items(pdu)[3][1])
+        oid = None
+        if varbinds:
+            oid = _ber_oid_value(_ber_items(varbinds[0][1])[0][1])
+        return msg_id, pdu_type, engine, oid
+
+    def _discover(self):
+        '''Learn the receiver's engine ID, boots and time (RFC 3414 4).
+        '''
+
+        msg_id = self._next_id()
+        probe = _ber(PDU_GET, _ber_integer(msg_id) + _ber_integer(0) +
+                     _ber_integer(0) + _ber_sequence())
+        packet = self._v3_packet(msg_id, probe, ['', 0, 0, 0],
+                                 secure=False)
+        reply = self._exchange(packet, msg_id)
+        if reply is None:
+            raise SnmpError("No response to engine discovery from {0}".
+                            format(self.host))
+        self.engine = reply[1]
+
+    def _encrypt(self, scoped_pdu, priv_key, boots, engine_time):
+        '''Encrypt a scoped PDU.
+        returns:
+            tuple: (ciphertext, msgPrivacyParameters)
+        '''
+
+        self.salt = (self.salt + 1) & 0xffffffffffffffff
+        if self.privprotocol == 'AES':
+            # RFC 3826 CFB128-AES-128
+            salt = struct.pack('>Q', self.salt)
+            init_vector = struct.pack('>II', boots, engine_time) + salt
+            cipher = AES.new(priv_key[:16], AES.MODE_CFB, init_vector,
+                             segment_size=128)
+            return cipher.encrypt(scoped_pdu), salt
+
+        # RFC 3414 8.1.1 CBC-DES
+        salt = struct.pack('>II', boots, self.salt & 0xffffffff)
+        init_vector = ''.join([chr(ord(a) ^ ord(b)) for a, b
+                               in zip(priv_key[8:16], salt)])
+        padding = -len(scoped_pdu) % 8
+        cipher = DES.new(priv_key[:8], DES.MODE_CBC, init_vector)
+        return cipher.encrypt(scoped_pdu + '\x00' * padding), salt
+
+    def _v3_packet(self, msg_id, pdu, engine, secure=True):
+        '''Wrap a PDU in an SNMPv3 USM message.
+        '''
+
+        engine_id, boots, engine_time, learned = engine
+        if learned:
+            engine_time += int(time.time() - learned)
+        settings = self.settings
+        flags = USM_FLAG_REPORTABLE
+        user = ''
+        if secure:
+            user = settings['secname']
+            if self.auth:
+                flags |= USM_FLAG_AUTH
+                digest = USM_AUTH_HASHES[settings['authprotocol']]
+                auth_key = usm_localized_key(settings['authprotocol'],
+                                             settings['authpassword'],
+                                             engine_id)
+            if self.priv:
+                flags |= USM_FLAG_PRIV
+
+        scoped_pdu = _ber_sequence(_ber(BER_OCTET_STRING, engine_id),
+                                   _ber(BER_OCTET_STRING, ''), pdu)
+        priv_params = ''
+        if flags & USM_FLAG_PRIV:
+            priv_key = usm_localized_key(settings['authprotocol'],
+                                         settings['privpassword'], engine_id)
+            scoped_pdu, priv_params = self._encrypt(scoped_pdu, priv_key,
+                                                    boots, engine_time)
+            scoped_pdu = _ber(BER_OCTET_STRING, scoped_pdu)
+
+        header = _ber_sequence(_ber_integer(msg_id), _ber_integer(65507),
+                               _ber(BER_OCTET_STRING, chr(flags)),
+                               _ber_integer(3))
+
+        def message(auth_params):
+            security = _ber_sequence(_ber(BER_OCTET_STRING, engine_id),
+                                     _ber_integer(boots),
+                                     _ber_integer(engine_time),
+                                     _ber(BER_OCTET_STRING, user),
+                                     _ber(BER_OCTET_STRING, auth_params),
+                                     _ber(BER_OCTET_STRING, priv_params))
+            return _ber_sequence(_ber_integer(3), header,
+                                 _ber(BER_OCTET_STRING, security), scoped_pdu)
+
+        if not flags & USM_FLAG_AUTH:
+            return message('')
+
+        # HMAC-96 over the whole message with zeroed msgAuthenticationParameters
+        signature = hmac.new(auth_key, message('\x00' * 12), digest)
+        return message(signature.digest()[:12])
+
+    def _send_v2c(self, message, uptime):
+        pdu = _notification_pdu(PDU_TRAP, self._next_id(), uptime, message)
+        packet = _ber_sequence(_ber_integer(1),
+                               _ber(BER_OCTET_STRING,
+                                    self.settings['community']), pdu)
+        self._socket().send(packet)
+
+    def _send_v3(self, message, uptime):
+        for _ in range(self.retries + 1):
+            if self.engine is None:
+                self._discover()
+            msg_id = self._next_id()
+            pdu = _notification_pdu(PDU_INFORM, msg_id, uptime, message)
+            reply = self._exchange(self._v3_packet(msg_id, pdu, self.engine),
+                                   msg_id)
+            if reply is None:
+                continue
+            pdu_type, engine, oid = reply
+            if pdu_type == PDU_RESPONSE:
+                return
+            if oid in [USM_STATS_NOT_IN_TIME_WINDOWS_OID,
+                       USM_STATS_UNKNOWN_ENGINE_IDS_OID]:
+                # Resynchronize with the receiver and resend
+                self.engine = engine
+                continue
+            raise SnmpError("Inform to {0} rejected ({1})".
+                            format(self.host, oid))
+
+        # The receiver may have restarted with a new engine ID
+        self.engine = None
+        raise SnmpError("No acknowledgement from {0} after {1} attempts".
+                        format(self.host, self.retries + 1))
+
+    def send(self, message, uptime=0, test=False):
+        '''Send a notification now, retrying v3 informs until acknowledged.
+        args:
+            message (string): The message to include in the trap
+            uptime (string): The device's uptime for the SNMP trap.
+            test (bool): Sent a sample trap message? (Default: False)
+        '''
+
+        trace()
+
+        if not self.native:
+            send_trap(self.settings, message, uptime=uptime, test=test)
+            return
+
+        if test == "trap":
+            message = TEST_TRAP_MESSAGE
+
+        log("Sending SNMP {0} to {1}: {2}".format(
+            'trap' if self.version == '2c' else 'inform', self.host, message))
+
+        if self.version == '2c':
+            self._send_v2c(message, uptime)
+        else:
+            self._send_v3(message, uptime)
+        self.sent += 1
+
+    def notify(self, message, uptime=0):
+        '''Queue a notification for the background sender.
+        '''
+
+        if self.thread is None:
+            self.start()
+        try:
+            self.queue.put_nowait((message, uptime))
+        except Queue.Full:
+            self.dropped += 1
+            log("SNMP queue full, dropping: {0}".format(message),
+                level='WARNING')
+
+    def _run(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                return
+            message, uptime = item
+            try:
+                self.send(message, uptime=uptime)
+            except (SnmpError, socket.error), err:
+                self.failed += 1
+                log("Failed to send SNMP notification to {0}: {1}".
+                    format(self.host, err), error=True)
+            finally:
+                self.queue.task_done()
+
+    def start(self):
+        '''Start the background sender thread.
+        '''
+
+        self.thread = threading.Thread(target=self._run, name='snmp')
+        self.thread.daemon = True
+        self.thread.start()
+
+    def stop(self):
+        '''Send anything still queued, then stop the sender thread.
+        '''
+
+        if self.thread is not None:
+            self.queue.put(None)
+            self.thread.join()
+            self.thread = None
+
+def get_interfaces(switch):
+    """Get all of the interfaces on a switch.
+    Get summary info on all of the interfaces in a switch and return a
+        dictionary keyed on interface name.  NOTE: the interfaceIDs are
+        missing the space between the interface type and the number.
+    args:
+        switch (object): A :class:`jsonrpclib` Server object
+    returns:
+        dict: Dictionary, keyed on interface name (without space), of interface
+            summary information."
+    Example:
+        {u'Ethernet1': {u'autoNegotigateActive': False,
+                        u'bandwidth': 10000000000,
+                        u'description': u'',
+                        u'duplex': u'duplexFull',
+                        u'interfaceType': u'EbraTestPhyPort',
+                        u'linkStatus': u'connected',
+                        u'vlanInformation': {u'interfaceForwardingModel': u'bridged',
+                                             u'interfaceMode': u'bridged',
+                                             u'vlanId': 1}},
+        u'Ethernet2': {u'autoNegotigateActive': False,
+                       u'bandwidth': 10000000000,
+                       u'description': u'',
+                       u'duplex': u'duplexFull',
+                       u'interfaceType': u'EbraTestPhyPort',
+                       u'linkStatus': u'connected',
+                       u'vlanInformation': {u'interfaceForwardingModel': u'bridged',
+                                            u'interfaceMode': u'bridged',
+                                            u'vlanId': 1}}
+    """
+
+    trace()
+
+    response = run_commands(switch, ["show interfaces status"])
+
+    return ethernet_interfaces(response[0][u'interfaceStatuses'])
+
+def ethernet_interfaces(interface_statuses):
+    '''Filter out non-Ethernet interfaces.
+    args:
+        interface_statuses (dict): The 'interfaceStatuses' from
+            'show interfaces status'.
+    returns:
+        dict: interface_statuses, with only the Ethernet interfaces.
+    '''
+
+    for interface in interface_statuses.keys():
+        if str(interface)[:8] != 'Ethernet':
+            interface_statuses.pop(interface, None)
+
+    return interface_statuses
+
+def run_commands(switch, commands, handlers=None):
+    """Run a batch of commands on a switch in one eAPI request.
+    args:
+        switch (object): A :class:`jsonrpclib` Server object, or an
+            :class:`EapiStream`
+        commands (list): The EOS commands to run.
+        handlers (list): Passed on to :meth:`EapiStream.runCmds`.
+            (Default: None)
+    returns:
+        list: One response dict per command.
+    raises:
+        EapiException: The commands could not be run.
+    """
+
+    trace()
+    conn_error = False
+    # The kind of error, as counted in EAPI_ERRORS
+    error_type = None
+
+    try:
+        if handlers is None:
+            response = switch.runCmds(1, commands)
+        else:
+            response = switch.runCmds(1, commands, handlers)
+    except ProtocolError, err:
+        conn_error = True
+        (code, msg) = err[0]
+        # 1002: invalid command
+        if code == 1002:
+            error_type = 'invalid_command'
+            log("Invalid EOS interface name ({0})".format(commands), error=True)
+        else:
+            error_type = 'protocol'
+            log("ProtocolError while retrieving {0} ([{1}] {2})".
+                format(commands, code, msg),
+                error=True)
+    except Exception, err:
+        conn_error = True
+        #   60: Operation timed out
+        #   61: Connection refused (http vs https?)
+        #  401: Unauthorized
+        #  405: Method Not Allowed (bad URL)
+        if hasattr(err, 'errno'):
+            if err.errno == 60:
+                error_type = 'timeout'
+                log("Connection timed out: Incorrect hostname/IP or eAPI"
+                    " not configured on the switch.", error=True)
+            elif err.errno == 61:
+                error_type = 'refused'
+                log("Connection refused: http instead of https selected or"
+                    " eAPI not configured on the switch.", error=True)
+            else:
+                error_type = 'connection'
+                log("General Error retrieving {0} ({1})".format(commands,
+                                                                err),
+                    error=True)
+        else:
+            # Parse the string manually
+            msg = str(err)
+            msg = msg.strip('<>')
+            err = msg.split(': ')[-1]
+
+            if "401 Unauthorized" in err:
+                error_type = 'unauthorized'
+                log("ERROR: Bad username or password")
+            elif "405 Method" in err:
+                error_type = 'bad_url'
+                log("ERROR: Incorrect URL")
+            else:
+                error_type = 'http'
+                log("HTTP Error retrieving {0} ({1})".format(commands,
+                                                             err),
+                    error=True)
+
+    # Decoded by jsonrpclib after KeepAliveTransport read the response
+    decode_start = getattr(STAGE_CLOCK, 'decode_start', None)
+    if decode_start is not None:
+        STAGE_CLOCK.decode_start = None
+        if not conn_error:
+            TIMINGS.record('decode', monotonic() - decode_start)
+
+    if conn_error:
+        increment(EAPI_ERRORS, error_type)
+        raise EapiException("Connection error with eAPI")
+
+    return response
+
+def check_interfaces(uptime, interface, interfaceinfo, dominfo, status=None,
+                     hostname=None):
+    '''Check the DOM info for each interface on a given switch.
+    args:
+        status (dict): The switch's map of interface name to
+                       :class:`XcvrStatusReactor`. (Default: STATUS)
+        hostname (str): Name of the switch, included in notifications when
+                        monitoring more than one switch.
+    '''
+
+    trace(interface)
+
+    if status is None:
+        status = STATUS
+
+    try:
+        status[interface]
+    except (KeyError, NameError):
+        status[interface] = XcvrStatusReactor(interface, hostname=hostname)
+
+    status[interface].uptime = uptime
+    status[interface].link_up_now = link_up(interfaceinfo)
+    status[interface].check_dom_info(dominfo)
+
+    if DEBUG and status[interface].response:
+        pprint(status[interface].state())
+    # Keep only the baselines until the next poll
+    status[interface].response = None
+
+def evict_interfaces(status, interfaces):
+    '''Drop the state of interfaces that are no longer on the switch, such
+    as the breakout interfaces of a port that was un-split.
+    args:
+        status (dict): The switch's map of interface name to
+                       :class:`XcvrStatusReactor`.
+        interfaces (dict): The interfaces found by the last poll.
+    returns:
+        list: The names of the interfaces evicted.
+    '''
+
+    evicted = [interface for interface in status
+               if interface not in interfaces]
+    for interface in evicted:
+        log('{0}: no longer present, dropping its state'.format(interface),
+            level='INFO')
+        del status[interface]
+    return evicted
+
+class BaselineModel(object):
+    '''A statistical baseline: the mean and spread of a power reading,
+    updated in O(1) per reading.
+
+    The state of a reading is `fields` floats: its mean, what its variance is
+    derived from, the number of readings taken, then whatever else the model
+    keeps.  The same model serves :class:`XcvrStatusReactor`, one reading at
+    a time in an array('d') holding the fields of each reading in turn, and
+    :class:`VectorEngine`, every port at once in a NumPy array whose last
+    axis is the fields.  Both compute alike, so they report the same changes.
+    '''
+
+    MEAN = 0
+    SPREAD = 1
+    READINGS = 2
+    fields = 3
+
+    def limit(self, state, offset):
+        '''Return the deviation from the baseline, in dBm, beyond which a
+        reading is reported: TOLERANCE, or with SIGMAS the smaller of
+        TOLERANCE and SIGMAS standard deviations (but not less than
+        SIGMA_FLOOR) once SIGMA_MIN_READINGS readings were taken.
+        '''
+
+        if not SIGMAS or state[offset + self.READINGS] < SIGMA_MIN_READINGS:
+            return TOLERANCE
+        return min(TOLERANCE, max(SIGMAS * math.sqrt(self.variance(state,
+                                                                   offset)),
+                                  SIGMA_FLOOR))
+
+    def limits(self, state):
+        '''Vectorized :meth:`limit`.
+        '''
+
+        if not SIGMAS:
+            return TOLERANCE
+        return numpy.where(state[..., self.READINGS] >= SIGMA_MIN_READINGS,
+                           numpy.minimum(TOLERANCE, numpy.maximum(
+                               SIGMAS * numpy.sqrt(self.variances(state)),
+                               SIGMA_FLOOR)),
+                           TOLERANCE)
+
+class EwmaBaseline(BaselineModel):
+    '''Exponentially weighted moving average and variance: each reading
+    moves the baseline by alpha of its deviation, so the weight of a reading
+    decays geometrically instead of every reading weighing 1/N.
+    '''
+
+    def __init__(self, alpha=EWMA_ALPHA):
+        self.alpha = alpha
+
+    def start(self, state, offset, value):
+        state[offset] = value
+        state[offset + 1] = 0.0
+        state[offset + 2] = 1
+
+    def update(self, state, offset, value):
+        '''Add a reading.
+        returns:
+            float: The new baseline.
+        '''
+
+        mean = state[offset]
+        delta = value - mean
+        state[offset] = mean + self.alpha * delta
+        state[offset + 1] = (1 - self.alpha) * \
+                            (state[offset + 1] + self.alpha * delta * delta)
+        state[offset + 2] += 1
+        return state[offset]
+
+    def variance(self, state, offset):
+        return state[offset + 1]
+
+    def start_many(self, state, values):
+        state[...] = 0
+        state[..., 0] = values
+        state[..., 2] = 1
+
+    def update_many(self, state, values, mask):
+        '''Add the readings where mask is set.
+        '''
+
+        mean = state[..., 0]
+        delta = values - mean
+        variance = (1 - self.alpha) * \
+                   (state[..., 1] + self.alpha * delta * delta)
+        state[..., 0] = numpy.where(mask, mean + self.alpha * delta, mean)
+        state[..., 1] = numpy.where(mask, variance, state[..., 1])
+        state[..., 2] += mask
+
+    def variances(self, state):
+        return state[..., 1]
+
+class WindowBaseline(BaselineModel):
+    '''Mean and variance of the last window readings.  The readings are kept
+    in a ring, and each new one replaces the oldest in the running mean and
+    sum of squared deviations, so an update does not revisit the window.
+    '''
+
+    def __init__(self, window=BASELINE_WINDOW):
+        self.window = window
+        self.fields = 3 + window
+
+    def start(self, state, offset, value):
+        for field in range(self.fields):
+            state[offset + field] = 0.0
+        state[offset] = value
+        state[offset + 2] = 1
+        state[offset + 3] = value
+
+    def update(self, state, offset, value):
+        '''Add a reading.
+        returns:
+            float: The new baseline.
+        '''
+
+        mean = state[offset]
+        readings = state[offset + 2]
+        position = offset + 3 + int(readings) % self.window
+        if readings < self.window:
+            leaving = mean
+            extra = 0.0
+            count = readings + 1
+        else:
+            leaving = state[position]
+            extra = leaving - mean
+            count = self.window
+        new_mean = mean + (value - leaving) / count
+        state[offset + 1] += (value - leaving) * (value - new_mean + extra)
+        state[offset] = new_mean
+        state[offset + 2] = readings + 1
+        state[position] = value
+        return new_mean
+
+    def variance(self, state, offset):
+        return max(state[offset + 1], 0.0) / \
+               min(state[offset + 2], self.window)
+
+    def start_many(self, state, values):
+        state[...] = 0
+        state[..., 0] = values
+        state[..., 2] = 1
+        state[..., 3] = values
+
+    def update_many(self, state, values, mask):
+        '''Add the readings where mask is set.
+        '''
+
+        mean = state[..., 0]
+        readings = state[..., 2]
+        full = readings >= self.window
+        position = (readings % self.window).astype(numpy.intp)[
+            ..., numpy.newaxis]
+        ring = state[..., 3:]
+        oldest = numpy.take_along_axis(ring, position, -1)[..., 0]
+        leaving = numpy.where(full, oldest, mean)
+        new_mean = mean + (values - leaving) / \
+                   numpy.minimum(readings + 1, self.window)
+        squares = state[..., 1] + (values - leaving) * \
+                  (values - new_mean + numpy.where(full, oldest - mean, 0.0))
+        numpy.put_along_axis(ring, position, numpy.where(
+            mask, values, oldest)[..., numpy.newaxis], -1)
+        state[..., 0] = numpy.where(mask, new_mean, mean)
+        state[..., 1] = numpy.where(mask, squares, state[..., 1])
+        state[..., 2] = readings + mask
+
+    def variances(self, state):
+        return numpy.maximum(state[..., 1], 0.0) / \
+               numpy.minimum(state[..., 2], self.window)
+
+def baseline_model(baseline, alpha=EWMA_ALPHA, window=BASELINE_WINDOW):
+    '''Return the :class:`BaselineModel` of a --baseline, or None for the
+    fixed and cumulative baselines, which the checks keep themselves.
+    '''
+
+    if baseline == 'ewma':
+        return EwmaBaseline(alpha)
+    if baseline == 'rolling':
+        return WindowBaseline(window)
+    return None
+
+class XcvrStatusReactor(object):
+    '''Interface transceiver status class
+
+    Only the state the threshold checks need is kept between polls, in
+    slots rather than a per-instance __dict__, so thousands of interfaces
+    stay cheap.
+    '''
+
+    __slots__ = ('interface', 'hostname', 'response', 'rx_base_', 'tx_base_',
+                 'lanes_', 'lane_base_', 'stats_', 'base_time_', 'vendor_sn_',
+                 'uptime', 'update_time_', 'link_up_now',
+                 'link_up_on_prev_poll_', 'poll_iterations_',
+                 'logging_polls_')
+
+    def __init__(self, interface_string, hostname=None):
+        '''Initialize interface transceiver objects
+        '''
+
+        trace()
+
+        self.interface = interface_string
+        self.hostname = hostname
+        # The response of the poll being checked, released once checked
+        self.response = {}
+
+        # Baseline power, 0 when there is none
+        self.rx_base_ = 0
+        self.tx_base_ = 0
+        # Multi-lane optics: the lane IDs, and the rx then tx baseline of
+        # each lane (0 when there is none)
+        self.lanes_ = ()
+        self.lane_base_ = None
+        # With a BASELINE_MODEL, its state for the rx then tx baseline (of
+        # each lane)
+        self.stats_ = None
+        # Epoch of the baseline and serial number of the optic it is from
+        self.base_time_ = None
+        self.vendor_sn_ = None
+        self.uptime = 0
+        # The switch's updateTime of the last readings checked
+        self.update_time_ = None
+
+        self.link_up_now = False
+        self.link_up_on_prev_poll_ = False
+        self.poll_iterations_ = 0
+
+        # On consecutive logged messages, we reset the base
+        self.logging_polls_ = 0
+
+    @property
+    def name(self):
+        '''Name used in notifications: prefixed with the switch when polling
+        an inventory so messages from different switches can be told apart.
+        '''
+
+        if self.hostname:
+            return '{0} {1}'.format(self.hostname, self.interface)
+        return self.interface
+
+    @property
+    def base_timestamp_(self):
+        '''The time of the baseline, as shown in notifications.
+        '''
+
+        if self.base_time_ is None:
+            return None
+        return _time_string(self.base_time_)
+
+    def state(self):
+        '''Return the state of the interface as a dict, for debugging.
+        '''
+
+        return dict((slot, getattr(self, slot)) for slot in self.__slots__)
+
+    def reset_log(self):
+        '''On link-transition, reset the historic data.
+        '''
+
+        trace()
+        self.rx_base_ = 0
+        self.tx_base_ = 0
+        self.lanes_ = ()
+        self.lane_base_ = None
+        self.stats_ = None
+        self.poll_iterations_ = 0
+        self.logging_polls_ = 0
+        self.base_time_ = None
+        self.vendor_sn_ = None
+
+    def checkpoint(self):
+        '''Return the baseline state as a record for :class:`Checkpoint`, or
+        None if there is no baseline.
+        '''
+
+        if not (self.rx_base_ or self.tx_base_ or self.lanes_):
+            return None
+        record = {'rx': self.rx_base_,
+                  'tx': self.tx_base_,
+                  'time': self.base_time_,
+                  'polls': self.poll_iterations_,
+                  'logging': self.logging_polls_,
+                  'sn': self.vendor_sn_}
+        if self.lanes_:
+            record['lanes'] = list(self.lanes_)
+            record['lane_base'] = list(self.lane_base_)
+        return record
+
+    def restore(self, record):
+        '''Resume from a :meth:`checkpoint` record as if the link had been up
+        since, so the next poll is checked against the saved baseline.
+        '''
+
+        self.rx_base_ = record['rx']
+        self.tx_base_ = record['tx']
+        self.base_time_ = record['time']
+        self.poll_iterations_ = record['polls']
+        self.logging_polls_ = record['logging']
+        self.vendor_sn_ = record.get('sn')
+        if record.get('lanes'):
+            lanes = tuple([str(lane) for lane in record['lanes']])
+            self.lanes_ = _LANE_IDS.setdefault(lanes, lanes)
+            self.lane_base_ = array('d', record['lane_base'])
+        self.link_up_now = self.link_up_on_prev_poll_ = True
+
+    def drift(self, response):
+        '''Return the largest difference, in dBm, between the readings in
+        response and their baselines, or None if there is no baseline.
+        '''
+
+        power = [(self.rx_base_, _power(response, u'rxPower')),
+                 (self.tx_base_, _power(response, u'txPower'))]
+        if self.lanes_:
+            lanes = lane_powers(response)
+            if lanes is not None and lanes[0] == self.lanes_:
+                power.extend(zip(self.lane_base_, lanes[1]))
+        drift = [abs(reading - base) for base, reading in power
+                 if base and reading == reading]
+        return max(drift) if drift else None
+
+    def baselines(self):
+        '''Return { <lane> : (rx base, tx base) } of the baselines taken,
+        lane None for the port itself.
+        '''
+
+        bases = {}
+        if self.rx_base_ or self.tx_base_:
+            bases[None] = (self.rx_base_, self.tx_base_)
+        if self.lanes_:
+            count = len(self.lanes_)
+            for number, lane in enumerate(self.lanes_):
+                bases[lane] = (self.lane_base_[number],
+                               self.lane_base_[count + number])
+        return bases
+
+    def check_dom_info(self, response, out=sys.stdout):
+        '''Analyze the transceiver optical status of the given interface
+        response (dict): The interface-specific response from eAPI
+                         'show interfaces <ID> transceiver':
+
+                         {u'mediaType': u'100GBASE-SR10',
+                          u'rxPower': -30.0,
+                          u'temperature': 37.4609375,
+                          u'txBias': 0.0,
+                          u'txPower': -30.0,
+                          u'updateTime': 1449247873.35,
+                          u'vendorSn': u'JAS00000006',
+                          u'voltage': 3.27}
+        '''
+
+        trace()
+
+        self.response = response
+        update_time = response.get(u'updateTime')
+
+        if not self.link_up_on_prev_poll_:
+            if self.link_up_now:
+                # Recompute base every time the link comes back up
+                log("...came up", level='DEBUG')
+                self.compute_base()
+        elif self.link_up_now:
+            if update_time is not None and update_time == self.update_time_:
+                # The switch has not refreshed the readings since the last
+                # poll: checking them again would only skew the averages
+                log("...unchanged", level='DEBUG')
+            elif optic_replaced(self.vendor_sn_, response):
+                # A different optic than the baseline was taken from
+                log("...optic replaced", level='DEBUG')
+                self.compute_base()
+            else:
+                log("...still up", level='DEBUG')
+                self.check_power(out=out)
+        else:
+            # Reset everything if the link goes down
+            log("...went down", level='DEBUG')
+            self.reset_log()
+
+        self.link_up_on_prev_poll_ = self.link_up_now
+        self.update_time_ = update_time
+
+    def compute_base(self):
+        '''Compute the base DOM info against which we compare on subsequent
+        runs
+        '''
+
+        trace()
+        self.reset_log()
+        self.base_time_ = time.time()
+
+        if not self.response:
+            # No data for this interface
+            return
+        self.vendor_sn_ = vendor_serial(self.response)
+
+        tx_power = self.response.get(u'txPower', None)
+        rx_power = self.response.get(u'rxPower', None)
+
+        if tx_power is None and rx_power is None:
+            # No optical data for this interface
+            return
+
+        # If an interface is shut then it will report a DOM value of
+        # '-inf'. In this case, do not record DOM info.
+        # with that DOM info
+
+        if tx_power is "N/A":
+            tx_power = None
+        if rx_power is "N/A":
+            rx_power = None
+
+        if tx_power is not None:
+            log('%s: new TX base: %.4f' % (self.interface,
+                                           tx_power), level='INFO')
+            self.tx_base_ = tx_power
+
+        if rx_power is not None:
+            log('%s: new RX base: %.4f' % (self.interface,
+                                           rx_power), level='INFO')
+            self.rx_base_ = rx_power
+
+        lanes = lane_powers(self.response)
+        if lanes is not None:
+            self.lanes_, power = lanes
+            self.lane_base_ = array('d', [0 if lane_power != lane_power
+                                          else lane_power
+                                          for lane_power in power])
+            log('%s: new lane bases: %s' % (self.interface, ', '.join(
+                ['%s RX %.4f TX %.4f' % (lane, power[i],
+                                         power[len(self.lanes_) + i])
+                 for i, lane in enumerate(self.lanes_)])), level='INFO')
+
+    def check_power(self, out=sys.stdout):
+        '''Check the status of the optics power levels
+        '''
+
+        trace()
+
+        self.poll_iterations_ += 1
+
+        if BASELINE_MODEL is not None:
+            message_logged = self.check_model_power(out=out)
+        elif self.lanes_:
+            message_logged = self.check_lane_power(out=out)
+        else:
+            message_logged = self.check_port_power(out=out)
+
+        if not message_logged:
+            self.logging_polls_ = 0
+        else:
+            self.logging_polls_ += 1
+
+        if REBASE_POLL_LIMIT and self.logging_polls_ >= REBASE_POLL_LIMIT:
+            log('%s: recomputing base' % self.interface, level='INFO')
+            self.compute_base()
+
+    def check_port_power(self, out=sys.stdout):
+        '''Check the rx/tx power levels of the transceiver as a whole.
+        returns:
+            bool: True if a baseline was checked.
+        '''
+
+        message_logged = False
+
+        if USE_CUMULATIVE_AVERAGE:
+            if self.rx_base_:
+                rx_base_power = self.rx_base_
+                rx_power = self.response.get(u'rxPower', None)
+                self.rx_base_ = \
+                    rx_base_power + (rx_power - rx_base_power) / self.poll_iterations_
+
+            if self.tx_base_:
+                tx_base_power = self.tx_base_
+                tx_power = self.response[u'txPower']
+                self.tx_base_ = \
+                    tx_base_power + (tx_power - tx_base_power) / self.poll_iterations_
+
+        if self.rx_base_:
+            max_rx_power = self.rx_base_ + TOLERANCE
+            min_rx_power = self.rx_base_ - TOLERANCE
+            rx_power = self.response[u'rxPower']
+            log('rxBase: {0}: rxPower: {1}', self.rx_base_, rx_power,
+                level='DEBUG')
+            if not min_rx_power < rx_power < max_rx_power:
+                notify_power_change(self.name, 'rx', self.response,
+                                    self.rx_base_,
+                                    self.base_timestamp_, rx_power,
+                                    uptime=self.uptime, out=out,
+                                    hostname=self.hostname,
+                                    interface=self.interface)
+                #if DEBUG:
+                #if out != sys.stdout:
+                #    out.write("Rx change")
+            message_logged = True
+
+        if self.tx_base_:
+            max_tx_power = self.tx_base_ + TOLERANCE
+            min_tx_power = self.tx_base_ - TOLERANCE
+            tx_power = self.response[u'txPower']
+            log('txBase: {0}: txPower: {1}', self.tx_base_, tx_power,
+                level='DEBUG')
+            if not min_tx_power < tx_power < max_tx_power:
+                notify_power_change(self.name, 'tx', self.response,
+                                    self.tx_base_,
+                                    self.base_timestamp_, tx_power,
+                                    uptime=self.uptime, out=out,
+                                    hostname=self.hostname,
+                                    interface=self.interface)
+                #if DEBUG:
+                #out.write("Tx change")
+            message_logged = True
+
+        return message_logged
+
+    def check_lane_power(self, out=sys.stdout):
+        '''Check the rx/tx power levels of each lane of a multi-lane optic.
+        returns:
+            bool: True if a baseline was checked.
+        '''
+
+        lanes = lane_powers(self.response)
+        if lanes is None or lanes[0] != self.lanes_:
+            # The optic was swapped for one with different lanes
+            log('%s: lanes changed, recomputing base' % self.interface,
+                level='INFO')
+            self.compute_base()
+            return False
+
+        message_logged = False
+        count = len(self.lanes_)
+        for number, lane in enumerate(self.lanes_):
+            for offset, direction in [(0, 'rx'), (count, 'tx')]:
+                base_power = self.lane_base_[offset + number]
+                power = lanes[1][offset + number]
+                if not base_power or power != power:
+                    continue
+
+                if USE_CUMULATIVE_AVERAGE:
+                    base_power += (power - base_power) / self.poll_iterations_
+                    self.lane_base_[offset + number] = base_power
+
+                if not base_power - TOLERANCE < power < \
+                       base_power + TOLERANCE:
+                    notify_power_change('{0} lane {1}'.format(self.name,
+                                                              lane),
+                                        direction, self.response, base_power,
+                                        self.base_timestamp_, power,
+                                        uptime=self.uptime, out=out,
+                                        hostname=self.hostname,
+                                        interface=self.interface, lane=lane)
+                message_logged = True
+
+        return message_logged
+
+    def check_model_power(self, out=sys.stdout):
+        '''Check the rx/tx power levels (of each lane) against the baselines
+        of BASELINE_MODEL, then add the readings within the limit to them.
+        A reading beyond it is left out, so a failing optic does not drag its
+        baseline along; REBASE_POLL_LIMIT polls in a row with such readings
+        restart the baselines from the new levels.
+        returns:
+            bool: True if a change was notified.
+        '''
+
+        if self.lanes_:
+            lanes = lane_powers(self.response)
+            if lanes is None or lanes[0] != self.lanes_:
+                # The optic was swapped for one with different lanes
+                log('%s: lanes changed, recomputing base' % self.interface,
+                    level='INFO')
+                self.compute_base()
+                return False
+            lane_ids, bases, power = self.lanes_, self.lane_base_, lanes[1]
+        else:
+            lane_ids = (None,)
+            bases = [self.rx_base_, self.tx_base_]
+            power = [_power(self.response, u'rxPower'),
+                     _power(self.response, u'txPower')]
+
+        model = BASELINE_MODEL
+        if self.stats_ is None:
+            # First check since the baselines were taken (or restored)
+            self.stats_ = array('d', [0.0] * (model.fields * len(bases)))
+            for index, base in enumerate(bases):
+                model.start(self.stats_, index * model.fields, base)
+
+        changed = False
+        count = len(lane_ids)
+        for number, lane in enumerate(lane_ids):
+            for offset, direction in [(0, 'rx'), (count, 'tx')]:
+                index = offset + number
+                base_power = bases[index]
+                if not base_power or power[index] != power[index]:
+                    continue
+                limit = model.limit(self.stats_, index * model.fields)
+                if base_power - limit < power[index] < base_power + limit:
+                    bases[index] = model.update(self.stats_,
+                                                index * model.fields,
+                                                power[index])
+                    continue
+                name = self.name
+                if lane is not None:
+                    name = '{0} lane {1}'.format(self.name, lane)
+                notify_power_change(name, direction, self.response,
+                                    base_power, self.base_timestamp_,
+                                    power[index], uptime=self.uptime, out=out,
+                                    hostname=self.hostname,
+                                    interface=self.interface, lane=lane)
+                changed = True
+
+        if not self.lanes_:
+            self.rx_base_, self.tx_base_ = bases
+        return changed
+
+_LANE_IDS = {}
+
+# { <vendorSn as reported> : stripped vendorSn }
+_VENDOR_SNS = {}
+
+def vendor_serial(response):
+    '''Return the serial number in a transceiver response without the
+    padding EOS reports it with, or None.  Each serial is only stripped once
+    and the stripped string is shared by every poll.
+    '''
+
+    reported = response.get(u'vendorSn')
+    if not reported:
+        return None
+    serial = _VENDOR_SNS.get(reported)
+    if serial is None:
+        serial = _VENDOR_SNS.setdefault(reported, reported.rstrip())
+    return serial or None
+
+def optic_replaced(vendor_sn, response):
+    '''Return True if the serial number in a transceiver response is not the
+    one a baseline was taken from.
+    '''
+
+    current = vendor_serial(response)
+    return bool(vendor_sn and current and current != vendor_sn)
+
+def lane_powers(response):
+    '''Return the per-lane power of a multi-lane optic, as reported in the
+    'parameters' of 'show interfaces transceiver dom':
+
+        {u'rxPower': {u'unit': u'dBm',
+                      u'channels': {u'1': -2.31, u'2': -2.12, ...}},
+         u'txPower': {u'unit': u'dBm',
+                      u'channels': {u'1': -1.05, u'2': -0.98, ...}}}
+
+    returns:
+        tuple: (lane IDs, array of the rx then tx power of each lane, NaN
+            when not reported), or None if the optic has a single lane.
+    '''
+
+    parameters = response.get(u'parameters')
+    if not parameters:
+        return None
+    rx_lanes = parameters.get(u'rxPower', {}).get(u'channels', {})
+    tx_lanes = parameters.get(u'txPower', {}).get(u'channels', {})
+    lanes = sorted(set(rx_lanes) | set(tx_lanes),
+                   key=lambda lane: (len(lane), lane))
+    if len(lanes) < 2:
+        return None
+
+    # Share one lane ID tuple between every port with the same lanes
+    lanes = tuple([str(lane) for lane in lanes])
+    lanes = _LANE_IDS.setdefault(lanes, lanes)
+    nan = float('nan')
+    power = array('d', [rx_lanes.get(lane, nan) for lane in lanes] +
+                  [tx_lanes.get(lane, nan) for lane in lanes])
+    return lanes, power
+
+def merge_lane_info(dominfo, response):
+    '''Add the per-lane parameters from 'show interfaces transceiver dom' to
+    the transceiver info of each interface.
+    args:
+        dominfo (dict): The 'interfaces' of 'show interfaces transceiver'.
+        response (dict): The output of 'show interfaces transceiver dom'.
+    '''
+
+    for interface, info in response.get(u'interfaces', {}).items():
+        if interface in dominfo and info.get(u'parameters'):
+            dominfo[interface][u'parameters'] = info[u'parameters']
+
+def notify_power_change(name, direction, response, base_power,
+                        base_timestamp, power, uptime=0, out=sys.stdout,
+                        hostname=None, interface=None, lane=None):
+    '''Send a TRANSCEIVER_RX/TX_POWER_CHANGE notification.
+    args:
+        name (str): The interface name used in the message.
+        direction (str): 'rx' or 'tx'.
+        response (dict): The interface's 'show interfaces transceiver' info.
+        base_power (float): The baseline power level, in dBm.
+        base_timestamp (str): When the baseline was taken.
+        power (float): The current power level, in dBm.
+        lane (str): The lane of a multi-lane optic. (Default: None)
+    '''
+
+    db_change = round(power - base_power, 4)
+    vendor_sn = vendor_serial(response) or u''
+    fields = {'hostname': hostname,
+              'interface': interface or name,
+              'direction': direction,
+              'delta': db_change,
+              'baseline': round(base_power, 4),
+              'power': round(power, 4),
+              'vendor_sn': vendor_sn}
+    if lane is not None:
+        fields['lane'] = lane
+    notify('TRANSCEIVER_{0}_POWER_CHANGE, {1} ({2}) {0} power level '
+           'has changed by {3} dBm from baseline {4} dBm ({5}) '
+           ' to {6} dBm ({7})'
+           .format(direction.upper(),
+                   name,
+                   vendor_sn,
+                   db_change,
+                   round(base_power, 4),
+                   base_timestamp,
+                   round(power, 4),
+                   _time_string()),
+           level='WARNING',
+           uptime=uptime,
+           out=out,
+           fields=fields)
+
+def link_up(interface):
+    '''Determine link status
+    '''
+    trace()
+    is_link_up = False
+    if interface[u'linkStatus'] == u'connected':
+        is_link_up = True
+
+    return is_link_up
+
+def _power(response, key):
+    '''Return a power reading from a transceiver response as a float, NaN
+    when the transceiver does not report it.
+    '''
+
+    value = response.get(key)
+    if value is None:
+        return float('nan')
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return float('nan')
+
+def _update_time(response):
+    '''Return the updateTime of a transceiver response, NaN if there is none.
+    '''
+
+    value = response.get(u'updateTime')
+    return float('nan') if value is None else float(value)
+
+def _has_optic(response):
+    '''Return True if a transceiver response has any power reading.
+    '''
+
+    return response.get(u'rxPower') is not None or \
+           response.get(u'txPower') is not None
+
+class VectorEngine(object):
+    '''Evaluate the transceiver power of many ports at once.
+
+    Keeps the state of :class:`XcvrStatusReactor` (baselines, poll counts,
+    link state) for every port in NumPy arrays, indexed by port, and applies
+    the same link transitions, cumulative average, TOLERANCE and
+    REBASE_POLL_LIMIT rules with whole-array operations.  Notifications are
+    identical to the reactor's.  Ports are keyed by any hashable, so one
+    engine may hold a switch or a whole fleet.  Each lane of a multi-lane
+    optic is a port of its own.
+    '''
+
+    RX = 0
+    TX = 1
+
+    def __init__(self, capacity=64):
+        self.index = {}
+        self.keys = []
+        self.names = []
+        self.hostnames = []
+        self.interfaces = []
+        self.lanes = []
+        # Serial number of the optic each baseline is from
+        self.vendor_sns = []
+        self.size = 0
+
+        # [RX|TX, port]: baseline power, 0 when there is none
+        self.base = numpy.zeros((2, capacity))
+        # Epoch of the baseline, NaN when there is none
+        self.base_time = numpy.full(capacity, numpy.nan)
+        self.polls = numpy.zeros(capacity, dtype=numpy.int64)
+        self.logging_polls = numpy.zeros(capacity, dtype=numpy.int64)
+        self.link_up = numpy.zeros(capacity, dtype=bool)
+        # The switch's updateTime of the last readings, NaN when unknown
+        self.update_time = numpy.full(capacity, numpy.nan)
+        # [RX|TX, port, field]: the state of BASELINE_MODEL's baselines
+        self.model = BASELINE_MODEL
+        self.stats = None
+        if self.model is not None:
+            self.stats = numpy.zeros((2, capacity, self.model.fields))
+
+    def _grow(self):
+        capacity = 2 * len(self.polls)
+        extra = capacity - len(self.polls)
+        self.base = numpy.concatenate((self.base, numpy.zeros((2, extra))),
+                                      axis=1)
+        self.base_time = numpy.concatenate(
+            (self.base_time, numpy.full(extra, numpy.nan)))
+        self.polls = numpy.concatenate(
+            (self.polls, numpy.zeros(extra, dtype=numpy.int64)))
+        self.logging_polls = numpy.concatenate(
+            (self.logging_polls, numpy.zeros(extra, dtype=numpy.int64)))
+        self.link_up = numpy.concatenate(
+            (self.link_up, numpy.zeros(extra, dtype=bool)))
+        self.update_time = numpy.concatenate(
+            (self.update_time, numpy.full(extra, numpy.nan)))
+        if self.stats is not None:
+            self.stats = numpy.concatenate(
+                (self.stats, numpy.zeros((2, extra, self.model.fields))),
+                axis=1)
+
+    def _slot(self, key, hostname, interface, lane=None):
+        slot = self.index.get(key)
+        if slot is None:
+            if self.size == len(self.polls):
+                self._grow()
+            slot = self.index[key] = self.size
+            self.size += 1
+            self.keys.append(key)
+            self.hostnames.append(hostname)
+            self.interfaces.append(interface)
+            self.lanes.append(lane)
+            self.vendor_sns.append(None)
+            name = interface
+            if hostname:
+                name = '{0} {1}'.format(hostname, interface)
+            if lane is not None:
+                name = '{0} lane {1}'.format(name, lane)
+            self.names.append(name)
+        return slot
+
+    def _label(self, slot):
+        if self.lanes[slot] is None:
+            return self.interfaces[slot]
+        return '{0} lane {1}'.format(self.interfaces[slot], self.lanes[slot])
+
+    def _compute_base(self, slots, power, has_response, vendor_sns):
+        '''Vectorized :meth:`XcvrStatusReactor.compute_base`.
+        '''
+
+        self.base[:, slots] = 0
+        self.polls[slots] = 0
+        self.logging_polls[slots] = 0
+        self.base_time[slots] = time.time()
+        for slot, vendor_sn in zip(slots, vendor_sns):
+            self.vendor_sns[slot] = vendor_sn
+
+        present = ~numpy.isnan(power) & has_response
+        self.base[:, slots] = numpy.where(present, power, 0)
+        if self.stats is not None:
+            stats = self.stats[:, slots]
+            self.model.start_many(stats, self.base[:, slots])
+            self.stats[:, slots] = stats
+        for column in numpy.nonzero(present.any(axis=0))[0]:
+            slot = slots[column]
+            if present[self.TX, column]:
+                log('%s: new TX base: %.4f' % (self._label(slot),
+                                               power[self.TX, column]),
+                    level='INFO')
+            if present[self.RX, column]:
+                log('%s: new RX base: %.4f' % (self._label(slot),
+                                               power[self.RX, column]),
+                    level='INFO')
+
+    def _reset(self, slots):
+        '''Vectorized :meth:`XcvrStatusReactor.reset_log`.
+        '''
+
+        self.base[:, slots] = 0
+        self.polls[slots] = 0
+        self.logging_polls[slots] = 0
+        self.base_time[slots] = numpy.nan
+        for slot in slots:
+            self.vendor_sns[slot] = None
+
+    def retain(self, ports):
+        '''Drop the state of every port not in ports, compacting the arrays.
+        args:
+            ports (list): The (hostname, interface) of each port to keep.
+        returns:
+            int: The number of ports (or lanes) dropped.
+        '''
+
+        ports = set(ports)
+        keep = [slot for slot in range(self.size)
+                if self.keys[slot][:2] in ports]
+        dropped = self.size - len(keep)
+        if not dropped:
+            return 0
+
+        for key in sorted(set(key[:2] for key in self.keys) - ports):
+            log('{0}: no longer present, dropping its state'.format(key[1]),
+                level='INFO')
+        kept = numpy.array(keep, dtype=numpy.intp)
+        size = len(keep)
+        self.base[:, :size] = self.base[:, kept]
+        self.base_time[:size] = self.base_time[kept]
+        self.polls[:size] = self.polls[kept]
+        self.logging_polls[:size] = self.logging_polls[kept]
+        self.link_up[:size] = self.link_up[kept]
+        self.update_time[:size] = self.update_time[kept]
+        if self.stats is not None:
+            self.stats[:, :size] = self.stats[:, kept]
+            self.stats[:, size:] = 0
+        self.base[:, size:] = 0
+        self.base_time[size:] = numpy.nan
+        self.polls[size:] = 0
+        self.logging_polls[size:] = 0
+        self.link_up[size:] = False
+        self.update_time[size:] = numpy.nan
+        for attr in ('keys', 'names', 'hostnames', 'interfaces', 'lanes',
+                     'vendor_sns'):
+            values = getattr(self, attr)
+            setattr(self, attr, [values[slot] for slot in keep])
+        self.index = dict((key, slot) for slot, key in enumerate(self.keys))
+        self.size = size
+        return dropped
+
+    def checkpoint(self):
+        '''Return { <interface> : record } of the ports with a baseline, in
+        the format of :meth:`XcvrStatusReactor.checkpoint`.
+        '''
+
+        records = {}
+        for slot in range(self.size):
+            if not self.link_up[slot] or numpy.isnan(self.base_time[slot]):
+                continue
+            interface = self.interfaces[slot]
+            record = records.setdefault(interface, {
+                'rx': 0, 'tx': 0,
+                'time': float(self.base_time[slot]),
+                'polls': int(self.polls[slot]),
+                'logging': int(self.logging_polls[slot]),
+                'sn': self.vendor_sns[slot]})
+            if self.lanes[slot] is None:
+                record['rx'] = float(self.base[self.RX, slot])
+                record['tx'] = float(self.base[self.TX, slot])
+            else:
+                record.setdefault('lanes', []).append(self.lanes[slot])
+                record.setdefault('lane_rx', []).append(
+                    float(self.base[self.RX, slot]))
+                record.setdefault('lane_tx', []).append(
+                    float(self.base[self.TX, slot]))
+
+        for interface, record in records.items():
+            if 'lanes' in record:
+                record['lane_base'] = record.pop('lane_rx') + \
+                                      record.pop('lane_tx')
+            elif not (record['rx'] or record['tx']):
+                del records[interface]
+        return records
+
+    def restore(self, records, hostname=None):
+        '''Resume the ports in records, from :meth:`checkpoint`, as if their
+        links had been up since.
+        '''
+
+        for interface, record in records.items():
+            lanes = record.get('lanes') or [None]
+            for number, lane in enumerate(lanes):
+                slot = self._slot((hostname, interface, lane), hostname,
+                                  interface, lane)
+                if lane is None:
+                    self.base[:, slot] = [record['rx'], record['tx']]
+                else:
+                    self.base[:, slot] = [
+                        record['lane_base'][number],
+                        record['lane_base'][len(lanes) + number]]
+                self.base_time[slot] = record['time']
+                self.polls[slot] = record['polls']
+                self.logging_polls[slot] = record['logging']
+                self.vendor_sns[slot] = record.get('sn')
+                self.link_up[slot] = True
+                if self.stats is not None:
+                    self.model.start_many(self.stats[:, slot],
+                                          self.base[:, slot])
+
+    def drift(self, hostname, interface, response):
+        '''Return the drift of a port as :meth:`XcvrStatusReactor.drift`.
+        '''
+
+        lanes = lane_powers(response)
+        if lanes is None:
+            keys = [((hostname, interface, None),
+                     _power(response, u'rxPower'),
+                     _power(response, u'txPower'))]
+        else:
+            count = len(lanes[0])
+            keys = [((hostname, interface, lane), lanes[1][number],
+                     lanes[1][count + number])
+                    for number, lane in enumerate(lanes[0])]
+
+        drift = []
+        for key, rx_power, tx_power in keys:
+            slot = self.index.get(key)
+            if slot is None:
+                continue
+            for base, reading in [(self.base[self.RX, slot], rx_power),
+                                  (self.base[self.TX, slot], tx_power)]:
+                if base and reading == reading:
+                    drift.append(abs(reading - float(base)))
+        return max(drift) if drift else None
+
+    def baselines(self, hostname, interface, response):
+        '''Return the baselines of a port as
+        :meth:`XcvrStatusReactor.baselines`, the lanes being those in
+        response.
+        '''
+
+        lanes = lane_powers(response)
+        bases = {}
+        for lane in lanes[0] if lanes is not None else [None]:
+            slot = self.index.get((hostname, interface, lane))
+            if slot is not None and self.base[:, slot].any():
+                bases[lane] = (float(self.base[self.RX, slot]),
+                               float(self.base[self.TX, slot]))
+        return bases
+
+    def evaluate(self, rows, out=sys.stdout):
+        '''Check the DOM info of a batch of ports.
+        args:
+            rows (list): (hostname, interface, lane, uptime, interfaceinfo,
+                dominfo, rxPower, txPower) for each port, or for each lane of
+                a multi-lane optic with the lanes of a port in adjacent rows.
+        '''
+
+        count = len(rows)
+        if not count:
+            return
+
+        slots = numpy.fromiter(
+            (self._slot((row[0], row[1], row[2]), row[0], row[1], row[2])
+             for row in rows), dtype=numpy.intp, count=count)
+        link_up_now = numpy.fromiter(
+            (row[4][u'linkStatus'] == u'connected' for row in rows),
+            dtype=bool, count=count)
+        has_response = numpy.fromiter((bool(row[5]) for row in rows),
+                                      dtype=bool, count=count)
+        power = numpy.array([[row[6] for row in rows],
+                             [row[7] for row in rows]])
+        # The lanes of a port share its poll count and are rebased together
+        port = numpy.cumsum([index == 0 or row[:2] != rows[index - 1][:2]
+                             for index, row in enumerate(rows)]) - 1
+
+        vendor_sns = [vendor_serial(row[5]) if row[5] else None
+                      for row in rows]
+        replaced = numpy.fromiter(
+            (optic_replaced(self.vendor_sns[slot], row[5])
+             for slot, row in zip(slots, rows)), dtype=bool, count=count)
+
+        update_time = numpy.array([_update_time(row[5]) for row in rows])
+
+        link_up_prev = self.link_up[slots]
+        # Readings the switch has not refreshed since the last poll are not
+        # checked again
+        unchanged = link_up_now & link_up_prev & \
+                    (update_time == self.update_time[slots])
+        replaced &= ~unchanged
+        # A replaced optic is rebased as if its link had just come up
+        came_up = link_up_now & (~link_up_prev | replaced)
+        still_up = link_up_now & link_up_prev & ~replaced & ~unchanged
+        went_down = link_up_prev & ~link_up_now
+
+        self._reset(slots[went_down])
+        self._compute_base(slots[came_up], power[:, came_up],
+                           has_response[came_up],
+                           [vendor_sns[column] for column
+                            in numpy.nonzero(came_up)[0]])
+
+        # check_power on the ports that stayed up
+        columns = numpy.nonzero(still_up)[0]
+        checked = slots[columns]
+        current = power[:, columns]
+        polls = self.polls[checked] + 1
+        self.polls[checked] = polls
+
+        base = self.base[:, checked]
+        if USE_CUMULATIVE_AVERAGE:
+            with numpy.errstate(invalid='ignore'):
+                base = numpy.where((base != 0) & ~numpy.isnan(current),
+                                   base + (current - base) / polls, base)
+            self.base[:, checked] = base
+
+        limit = TOLERANCE
+        if self.stats is not None:
+            stats = self.stats[:, checked]
+            with numpy.errstate(invalid='ignore', divide='ignore'):
+                limit = self.model.limits(stats)
+
+        # A baseline is only checked against a reading
+        has_base = (base != 0) & ~numpy.isnan(current)
+        with numpy.errstate(invalid='ignore'):
+            changed = has_base & ~((base - limit < current) &
+                                   (current < base + limit))
+
+        for position in numpy.nonzero(changed.any(axis=0))[0]:
+            slot = checked[position]
+            row = rows[columns[position]]
+            base_timestamp = _time_string(self.base_time[slot])
+            for direction, axis in [('rx', self.RX), ('tx', self.TX)]:
+                if changed[axis, position]:
+                    notify_power_change(self.names[slot], direction, row[5],
+                                        float(base[axis, position]),
+                                        base_timestamp,
+                                        float(current[axis, position]),
+                                        uptime=row[3], out=out,
+                                        hostname=self.hostnames[slot],
+                                        interface=self.interfaces[slot],
+                                        lane=self.lanes[slot])
+
+        if self.stats is not None:
+            # check_model_power: add the readings within the limit to the
+            # baselines, and count the polls with a change toward a rebase
+            with numpy.errstate(invalid='ignore'):
+                self.model.update_many(stats, current, has_base & ~changed)
+            self.stats[:, checked] = stats
+            self.base[:, checked] = numpy.where(has_base & ~changed,
+                                                stats[..., BaselineModel.MEAN],
+                                                base)
+            logged_ports = changed.any(axis=0)
+        else:
+            logged_ports = has_base.any(axis=0)
+        logged = numpy.bincount(port[columns], weights=logged_ports,
+                                minlength=port[-1] + 1) > 0
+        logging_polls = numpy.where(logged[port[columns]],
+                                    self.logging_polls[checked] + 1, 0)
+        self.logging_polls[checked] = logging_polls
+        if REBASE_POLL_LIMIT:
+            rebase = logging_polls >= REBASE_POLL_LIMIT
+            for slot in checked[rebase]:
+                log('%s: recomputing base' % self._label(slot), level='INFO')
+            self._compute_base(checked[rebase], current[:, rebase],
+                               has_response[columns][rebase],
+                               [vendor_sns[column] for column
+                                in columns[rebase]])
+
+        self.link_up[slots] = link_up_now
+        self.update_time[slots] = update_time
+
+    def update(self, uptime, interfaces, dominfo, hostname=None, out=sys.stdout):
+        '''Check the DOM info of every interface of a switch.
+        '''
+
+        rows = []
+        for interface in interfaces.keys():
+            response = dominfo.get(interface, {})
+            lanes = lane_powers(response)
+            if lanes is None:
+                rows.append((hostname, str(interface), None, uptime,
+                             interfaces[interface], response,
+                             _power(response, u'rxPower'),
+                             _power(response, u'txPower')))
+                continue
+            lanes, power = lanes
+            for number, lane in enumerate(lanes):
+                rows.append((hostname, str(interface), lane, uptime,
+                             interfaces[interface], response, power[number],
+                             power[len(lanes) + number]))
+        self.evaluate(rows, out=out)
+
+class _HTTPSConnection(httplib.HTTPSConnection):
+    '''HTTPS connection that resumes a previous TLS session when the ssl
+    module supports it (Python 3.6+).
+    '''
+
+    session = None
+
+    def connect(self):
+        sock = socket.create_connection((self.host, self.port),
+                                        self.timeout, self.source_address)
+        kwargs = {}
+        if self.session is not None:
+            kwargs['session'] = self.session
+        self.sock = self._context.wrap_socket(sock, server_hostname=self.host,
+                                              **kwargs)
+        self.session = getattr(self.sock, 'session', None)
+
+class _UnixHTTPConnection(httplib.HTTPConnection):
+    '''HTTP connection to the eAPI Unix domain socket of the local switch.
+    The host is only sent in the Host header.
+    '''
+
+    def __init__(self, host, path, timeout=None):
+        httplib.HTTPConnection.__init__(self, host, timeout=timeout)
+        self.path = path
+
+    def connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        try:
+            sock.connect(self.path)
+        except socket.error:
+            sock.close()
+            raise
+        self.sock = sock
+
+class KeepAliveTransport(TransportMixIn, xmlrpclib.Transport):
+    '''Thread-safe :class:`jsonrpclib` transport that keeps a pool of
+    persistent HTTP(S) connections per host.
+
+    Connections are returned to the pool after each request and reused by the
+    next, so a poll costs one round trip rather than a TCP and TLS handshake.
+    At most max_connections requests are in flight to a host at a time.
+    With a unix_socket, every host is reached over that socket instead.
+    '''
+
+    def __init__(self, secure=True, timeout=EAPI_TIMEOUT,
+                 max_connections=EAPI_CONNECTIONS, verify=False,
+                 unix_socket=None):
+        TransportMixIn.__init__(self)
+        xmlrpclib.Transport.__init__(self)
+
+        self.secure = secure and not unix_socket
+        self.timeout = timeout
+        self.max_connections = max_connections
+        # Path of the local eAPI socket, None for TCP
+        self.unix_socket = unix_socket
+        self.context = None
+        if self.secure:
+            self.context = ssl.create_default_context()
+            if not verify:
+                # Switches usually serve eAPI with a self-signed certificate
+                self.context.check_hostname = False
+                self.context.verify_mode = ssl.CERT_NONE
+
+        self.lock = threading.Lock()
+        # { <host> : [ <idle connection>, ... ] }
+        self.idle = {}
+        # { <host> : BoundedSemaphore(max_connections) }
+        self.slots = {}
+        # { <host> : <ssl.SSLSession> } to resume TLS on new connections
+        self.sessions = {}
+        self.connects = 0
+
+    def _slot(self, host):
+        with self.lock:
+            if host not in self.slots:
+                self.slots[host] = threading.BoundedSemaphore(
+                    self.max_connections)
+            return self.slots[host]
+
+    def _checkout(self, host):
+        '''Return (connection, reused) for host.
+        '''
+
+        with self.lock:
+            idle = self.idle.get(host)
+            if idle:
+                return idle.pop(), True
+            self.connects += 1
+
+        if self.unix_socket:
+            connection = _UnixHTTPConnection(host, self.unix_socket,
+                                             timeout=self.timeout)
+        elif self.secure:
+            connection = _HTTPSConnection(host, timeout=self.timeout,
+                                          context=self.context)
+            connection.session = self.sessions.get(host)
+        else:
+            connection = httplib.HTTPConnection(host, timeout=self.timeout)
+        return connection, False
+
+    def _checkin(self, host, connection):
+        with self.lock:
+            if getattr(connection, 'session', None) is not None:
+                self.sessions[host] = connection.session
+            self.idle.setdefault(host, []).append(connection)
+
+    def send_content(self, connection, request_body):
+        '''Send the body with the headers: written separately, the body
+        waits on Nagle's algorithm for the server's delayed ACK of the
+        headers over TCP.
+        '''
+
+        connection.putheader('Content-Type', 'application/json-rpc')
+        connection.putheader('Content-Length', str(len(request_body)))
+        connection.endheaders(request_body)
+
+    def _open(self, host, handler, headers, request_body):
+        '''Send a request and return (connection, response) once the
+        response headers are read.
+        '''
+
+        # Retry once on a fresh connection if the switch closed an idle
+        # one since it was last used.
+        for attempt in (0, 1):
+            connection, reused = self._checkout(host)
+            try:
+                connection.putrequest('POST', handler)
+                connection.putheader('User-Agent', self.user_agent)
+                for header, value in headers or []:
+                    connection.putheader(header, value)
+                self.send_content(connection, request_body)
+                return connection, connection.getresponse()
+            except (socket.error, httplib.HTTPException):
+                connection.close()
+                if attempt or not reused:
+                    raise
+
+    def request(self, host, handler, request_body, verbose=0):
+        start = monotonic()
+        data = self.stream(host, handler, request_body,
+                           lambda read: read())
+        STAGE_CLOCK.decode_start = monotonic()
+        TIMINGS.record('fetch', STAGE_CLOCK.decode_start - start)
+
+        parser, target = self.getparser()
+        parser.feed(data)
+        parser.close()
+        return target.close()
+
+    def stream(self, host, handler, request_body, consume):
+        '''Send a request and hand the read method of the response to
+        consume, so the body can be decoded as it arrives rather than read
+        whole first.
+        args:
+            consume (function): Given read([size]), return the decoded body.
+        returns:
+            object: What consume returned.
+        '''
+
+        chost, headers, _ = self.get_host_info(host)
+
+        slot = self._slot(chost)
+        slot.acquire()
+        try:
+            connection, response = self._open(chost, handler, headers,
+                                              request_body)
+            try:
+                if response.status != 200:
+                    response.read()
+                    result = None
+                else:
+                    result = consume(response.read)
+                    # Whatever consume left is read so the connection can
+                    # be reused
+                    response.read()
+            except Exception:
+                connection.close()
+                raise
+        finally:
+            slot.release()
+
+        if response.will_close:
+            connection.close()
+        else:
+            self._checkin(chost, connection)
+
+        if response.status != 200:
+            raise xmlrpclib.ProtocolError(chost + handler, response.status,
+                                          response.reason, response.msg)
+        return result
+
+    def close(self):
+        '''Close all idle connections.
+        '''
+
+        with self.lock:
+            idle, self.idle = self.idle, {}
+        for connections in idle.values():
+            for connection in connections:
+                connection.close()
+
+# The fields of each interface kept when a response is streamed: those
+# checked, and those recorded by a SampleRing
+XCVR_FIELDS = (u'rxPower', u'txPower', u'vendorSn', u'updateTime',
+               u'temperature', u'voltage', u'txBias')
+
+_JSON_SPACE = re.compile(r'[ \t\n\r]*')
+
+class JsonStream(object):
+    '''Pull parser over a JSON document read in chunks.
+
+    The caller walks the document: :meth:`members` and :meth:`elements`
+    step through an object or array without decoding it, and :meth:`value`
+    decodes the next value whole.  Only the value being decoded and one
+    chunk are buffered, so a large response is never held in memory at once.
+    '''
+
+    def __init__(self, read, chunk_size=STREAM_CHUNK_SIZE):
+        '''args:
+            read (function): Given a size, return up to that many bytes, or
+                an empty string at the end of the document.
+            chunk_size (int): Bytes read at a time.
+        '''
+
+        self.read = read
+        self.chunk_size = chunk_size
+        self.buffer = ''
+        self.pos = 0
+        self.decoder = json.JSONDecoder()
+
+    def _fill(self):
+        '''Read another chunk, dropping what has been parsed.  Return False
+        at the end of the document.
+        '''
+
+        data = self.read(self.chunk_size)
+        if not data:
+            return False
+        self.buffer = self.buffer[self.pos:] + data
+        self.pos = 0
+        return True
+
+    def peek(self):
+        '''Return the next character that is not whitespace, without
+        consuming it.
+        '''
+
+        while True:
+            self.pos = _JSON_SPACE.match(self.buffer, self.pos).end()
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self._fill():
+                raise ValueError('Unexpected end of JSON document')
+
+    def expect(self, chars):
+        '''Consume the next character, which must be one of chars.
+        '''
+
+        char = self.peek()
+        if char not in chars:
+            raise ValueError('Expecting one of {0!r} at {1!r}'.format(
+                chars, self.buffer[self.pos:self.pos + 20]))
+        self.pos += 1
+        return char
+
+    def value(self):
+        '''Decode the next value.
+        '''
+
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+            except ValueError:
+                # Most likely cut short by the end of the buffer
+                if self._fill():
+                    continue
+                raise
+            # A number at the end of the buffer may go on in the next chunk
+            if end == len(self.buffer) and self._fill():
+                continue
+            self.pos = end
+            return value
+
+    def members(self):
+        '''Step through the next object, yielding each key.  The caller
+        consumes the value of each key before asking for the next.
+        '''
+
+        self.expect('{')
+        if self.peek() == '}':
+            self.pos += 1
+            return
+        while True:
+            self.expect('"')
+            while True:
+                try:
+                    key, end = json.decoder.scanstring(self.buffer, self.pos)
+                    break
+                except ValueError:
+                    if not self._fill():
+                        raise
+            self.pos = end
+            self.expect(':')
+            yield key
+            if self.expect(',}') == '}':
+                return
+
+    def elements(self):
+        '''Step through the next array, yielding the index of each element.
+        The caller consumes each element before asking for the next.
+        '''
+
+        self.expect('[')
+        if self.peek() == ']':
+            self.pos += 1
+            return
+        index = 0
+        while True:
+            yield index
+            index += 1
+            if self.expect(',]') == ']':
+                return
+
+class EapiStream(object):
+    '''eAPI client, standing in for a :class:`jsonrpclib` Server, that
+    decodes the response with a :class:`JsonStream` as it is read.  The
+    output of a command may be handed to a function that walks it, keeping
+    only what it needs, instead of being decoded whole.
+    '''
+
+    def __init__(self, transport, host, handler='/command-api'):
+        '''args:
+            transport (object): A :class:`KeepAliveTransport`.
+            host (str): [username:password@]hostname[:port]
+        '''
+
+        self.transport = transport
+        self.host = host
+        self.handler = handler
+        self.request_id = 0
+
+    def runCmds(self, version, commands, handlers=()):
+        '''Run commands and return the output of each.
+        args:
+            handlers (list): For each command, None to decode its output
+                whole, or a function given the :class:`JsonStream` at the
+                output and the outputs of the commands before it, that
+                returns the output.
+        raises:
+            ProtocolError: eAPI returned an error.
+        '''
+
+        self.request_id += 1
+        body = json.dumps({'jsonrpc': '2.0', 'method': 'runCmds',
+                           'params': [version, commands],
+                           'id': str(self.request_id)})
+        start = monotonic()
+
+        def consume(read):
+            decode_start = monotonic()
+            TIMINGS.record('fetch', decode_start - start)
+            result = self._decode(JsonStream(read), handlers)
+            TIMINGS.record('decode', monotonic() - decode_start)
+            return result
+
+        return self.transport.stream(self.host, self.handler, body, consume)
+
+    @staticmethod
+    def _decode(stream, handlers):
+        result = None
+        error = None
+        for key in stream.members():
+            if key == u'result':
+                result = []
+                for index in stream.elements():
+                    handler = handlers[index] if index < len(handlers) \
+                              else None
+                    if handler is None:
+                        result.append(stream.value())
+                    else:
+                        result.append(handler(stream, result))
+            elif key == u'error':
+                error = stream.value()
+            else:
+                stream.value()
+        if error is not None:
+            raise ProtocolError((error.get(u'code'), error.get(u'message')))
+        return result
+
+def stream_records(key, trim, on_record=None):
+    '''Return an :class:`EapiStream` handler for the output of a 'show
+    interfaces' command, { key : { <interface> : {...} } }, that decodes one
+    interface at a time and keeps only what trim returns for it.
+    args:
+        key (str): The key of the interfaces in the output.
+        trim (function): Given an interface and its info, return what is
+            kept, or None to drop the interface.
+        on_record (function): Called with (interface, info, outputs) as
+            each interface is decoded, outputs being those of the commands
+            before it. (Default: None)
+    '''
+
+    def handler(stream, outputs):
+        output = {}
+        for name in stream.members():
+            if name != key:
+                output[name] = stream.value()
+                continue
+            records = output[name] = {}
+            for interface in stream.members():
+                record = trim(interface, stream.value())
+                if record is None:
+                    continue
+                records[interface] = record
+                if on_record is not None:
+                    on_record(interface, record, outputs)
+        return output
+    return handler
+
+def _trim_status(interface, info):
+    '''Keep the link status of Ethernet interfaces.
+    '''
+
+    if interface[:8] != u'Ethernet':
+        return None
+    return {u'linkStatus': info.get(u'linkStatus')}
+
+def _trim_transceiver(interface, info):
+    '''Keep the XCVR_FIELDS of a transceiver.
+    '''
+
+    return dict((field, info[field]) for field in XCVR_FIELDS
+                if field in info)
+
+def _trim_lanes(interface, info):
+    '''Keep the per-lane power levels of a multi-lane optic.
+    '''
+
+    parameters = info.get(u'parameters') or {}
+    kept = dict((field, {u'channels': parameters[field].get(u'channels',
+                                                            {})})
+                for field in (u'rxPower', u'txPower') if field in parameters)
+    return {u'parameters': kept} if kept else None
+
+# Transceiver readings kept by a SampleRing
+SAMPLE_FIELDS = ('rxPower', 'txPower', 'temperature', 'voltage', 'txBias')
+
+Sample = collections.namedtuple('Sample', ['time', 'interface'] +
+                                list(SAMPLE_FIELDS))
+
+class SampleRing(object):
+    '''Fixed-size ring buffer of transceiver samples, memory mapped from a
+    file (or anonymous memory) so recent history survives the process and can
+    be examined after a flap without re-polling the switch.
+
+    Layout: a header, a table of interface names (a sample refers to its
+    interface by position in the table), then size fixed-width records of
+    (time, interface, rxPower, txPower, temperature, voltage, txBias).
+    Writing a sample is O(1); once full, the oldest sample is overwritten.
+    '''
+
+    MAGIC = 'DOMRING1'
+    HEADER = struct.Struct('<8sIIIQ')
+    NAME = struct.Struct('<32s')
+    RECORD = struct.Struct('<dI5f')
+
+    def __init__(self, filename=None, size=HISTORY_SIZE, ports=HISTORY_PORTS):
+        '''args:
+            filename (str): File backing the ring, reopened if it exists with
+                the same size. (Default: anonymous memory)
+            size (int): Number of samples kept.
+            ports (int): Number of interfaces that can be recorded.
+        '''
+
+        self.filename = filename
+        self.size = size
+        self.ports = ports
+        self.lock = threading.Lock()
+        self.records = self.HEADER.size + ports * self.NAME.size
+        length = self.records + size * self.RECORD.size
+
+        if filename is None:
+            self.file = None
+            self.map = mmap.mmap(-1, length)
+        else:
+            mode = 'r+b' if os.path.exists(filename) else 'w+b'
+            self.file = open(filename, mode)
+            if os.fstat(self.file.fileno()).st_size != length:
+                self.file.truncate(length)
+            self.map = mmap.mmap(self.file.fileno(), length)
+
+        # { <interface> : position in the name table }
+        self.index = {}
+        self.names = []
+        magic, ring_size, ring_ports, count, self.written = \
+            self.HEADER.unpack_from(self.map, 0)
+        if magic != self.MAGIC or ring_size != size or ring_ports != ports:
+            self.map[:self.records] = '\0' * self.records
+            count = self.written = 0
+            self._write_header()
+
+        for position in range(count):
+            name = self.NAME.unpack_from(
+                self.map, self.HEADER.size + position * self.NAME.size)[0]
+            name = name.rstrip('\0')
+            self.index[name] = position
+            self.names.append(name)
+
+    def _write_header(self):
+        self.HEADER.pack_into(self.map, 0, self.MAGIC, self.size, self.ports,
+                              len(self.names), self.written)
+
+    def _port(self, interface):
+        position = self.index.get(interface)
+        if position is None:
+            if len(self.names) == self.ports:
+                return None
+            position = self.index[interface] = len(self.names)
+            self.names.append(interface)
+            self.NAME.pack_into(self.map, self.HEADER.size +
+                                position * self.NAME.size, interface)
+        return position
+
+    def append(self, interface, response, timestamp=None):
+        '''Record the transceiver readings of an interface.
+        args:
+            interface (str): The interface name.
+            response (dict): Its 'show interfaces transceiver' output.
+            timestamp (float): Time of the sample. (Default: the response's
+                updateTime, or now)
+        returns:
+            bool: False if the name table is full and the sample was dropped.
+        '''
+
+        if timestamp is None:
+            timestamp = response.get(u'updateTime') or time.time()
+        with self.lock:
+            position = self._port(str(interface))
+            if position is None:
+                return False
+            self.RECORD.pack_into(
+                self.map, self.records +
+                self.written % self.size * self.RECORD.size,
+                timestamp, position,
+                *[_power(response, field) for field in SAMPLE_FIELDS])
+            self.written += 1
+            self._write_header()
+        return True
+
+    def _samples(self):
+        '''Yield every sample held, newest first.
+        '''
+
+        with self.lock:
+            written = self.written
+            names = list(self.names)
+            data = self.map[self.records:]
+        for number in range(written - 1, max(written - self.size, 0) - 1, -1):
+            record = self.RECORD.unpack_from(
+                data, number % self.size * self.RECORD.size)
+            yield Sample(record[0], names[record[1]], *record[2:])
+
+    def last(self, interface, count=10):
+        '''Return the last samples of an interface, oldest first.
+        '''
+
+        samples = []
+        for sample in self._samples():
+            if len(samples) == count:
+                break
+            if sample.interface == interface:
+                samples.append(sample)
+        samples.reverse()
+        return samples
+
+    def window(self, interface, start, end=None):
+        '''Return the samples of an interface taken between start and end
+        (epoch seconds), oldest first.
+        '''
+
+        if end is None:
+            end = float('inf')
+        samples = [sample for sample in self._samples()
+                   if sample.interface == interface and
+                   start <= sample.time <= end]
+        samples.reverse()
+        return samples
+
+    def summary(self, interface, start, end=None):
+        '''Return { <field> : (min, max, mean) } of the readings of an
+        interface between start and end, ignoring missing readings.
+        '''
+
+        samples = self.window(interface, start, end)
+        result = {}
+        for field in SAMPLE_FIELDS:
+            values = [getattr(sample, field) for sample in samples
+                      if getattr(sample, field) == getattr(sample, field)]
+            if values:
+                result[field] = (min(values), max(values),
+                                 sum(values) / len(values))
+        return result
+
+    def flush(self):
+        self.map.flush()
+
+    def close(self):
+        self.map.close()
+        if self.file is not None:
+            self.file.close()
+
+class Checkpoint(object):
+    '''The baselines of every monitored interface, saved to a file so that a
+    restart resumes them instead of learning new ones from possibly degraded
+    optics.
+
+    To spare the flash, the file is rewritten at most once per interval, in
+    one write to a temporary file renamed over the previous checkpoint, so a
+    crash never leaves a partial file.
+    '''
+
+    VERSION = 1
+
+    def __init__(self, filename, interval=CHECKPOINT_INTERVAL):
+        self.filename = filename
+        self.interval = interval
+        self.saved = 0
+        self.last = None
+        self.writes = 0
+
+    def load(self):
+        '''Return { <hostname> : { <interface> : record } } from the file.
+        '''
+
+        trace()
+
+        if not os.path.exists(self.filename):
+            return {}
+        try:
+            with open(self.filename) as checkpoint:
+                data = json.load(checkpoint)
+        except (IOError, ValueError), err:
+            log("Ignoring unreadable checkpoint {0}: {1}".format(
+                self.filename, err), level='WARNING')
+            return {}
+        if data.get('version') != self.VERSION:
+            log("Ignoring checkpoint {0} of version {1}".format(
+                self.filename, data.get('version')), level='WARNING')
+            return {}
+        self.saved = time.time()
+        return data['switches']
+
+    def restore(self, switches, tag=False):
+        '''Restore the saved baselines of each switch.
+        args:
+            tag (bool): Whether notifications name the switch.
+        returns:
+            int: The number of interfaces restored.
+        '''
+
+        saved = self.load()
+        restored = 0
+        for switch in switches:
+            records = saved.get(switch.hostname, {})
+            switch.restore(records, hostname=switch.hostname if tag else None)
+            restored += len(records)
+        if restored:
+            log("Restored the baselines of {0} interfaces from {1}".format(
+                restored, self.filename))
+        return restored
+
+    def due(self):
+        '''Return whether interval seconds have passed since the last write.
+        '''
+
+        return time.time() - self.saved >= self.interval
+
+    def save(self, switches, force=False):
+        '''Write the baselines of each switch, unless the last write was less
+        than interval seconds ago or nothing has changed.
+        returns:
+            bool: True if the file was written.
+        '''
+
+        if not force and not self.due():
+            return False
+        return self.write(dict((switch.hostname, switch.checkpoint())
+                               for switch in switches))
+
+    def write(self, records):
+        '''Write { <hostname> : { <interface> : record } }, unless nothing
+        has changed since the last write.
+        returns:
+            bool: True if the file was written.
+        '''
+
+        data = json.dumps({'version': self.VERSION, 'switches': records},
+                          separators=(',', ':'), sort_keys=True)
+        self.saved = time.time()
+        if data == self.last:
+            return False
+
+        temporary = '{0}.tmp'.format(self.filename)
+        try:
+            with open(temporary, 'w') as checkpoint:
+                checkpoint.write(data)
+                checkpoint.flush()
+                os.fsync(checkpoint.fileno())
+            os.rename(temporary, self.filename)
+        except (IOError, OSError), err:
+            log("Unable to write checkpoint {0}: {1}".format(self.filename,
+                                                             err), error=True)
+            return False
+        self.last = data
+        self.writes += 1
+        log("Saved baselines to {0}".format(self.filename), level='DEBUG')
+        return True
+
+class PollScheduler(object):
+    '''Choose the interfaces of a switch to poll each cycle, each at its own
+    rate between interval and max_interval.
+
+    Interfaces whose link just changed, or whose readings have drifted
+    halfway to the TOLERANCE, are polled every cycle.  Otherwise the interval
+    doubles on each poll up to max_interval, and interfaces with no baseline
+    or no optic are polled at max_interval.
+
+    The switch refreshes transceiver readings on its own cadence, learned
+    from the updateTime of successive readings.  Polls are never more
+    frequent than that, and are timed just after the next expected refresh.
+    '''
+
+    # Polls after a link change during which an interface is polled fast
+    SETTLE_POLLS = 3
+    # Weight of each new refresh interval in the cadence estimate
+    CADENCE_WEIGHT = 0.2
+    # Seconds after an expected refresh to poll
+    REFRESH_MARGIN = 1.0
+
+    def __init__(self, interval, max_interval):
+        self.interval = interval
+        self.max_interval = max(interval, max_interval)
+        # { <interface> : (time due, current interval) }
+        self.schedule = {}
+        # { <interface> : linkStatus on the last poll }
+        self.links = {}
+        # { <interface> : fast polls left after a link change }
+        self.settling = {}
+        # { <interface> : updateTime of its last readings }
+        self.update_times = {}
+        # Seconds between refreshes of the readings by the switch
+        self.cadence = None
+
+    def observe(self, interfaces, now):
+        '''Make new interfaces, and those whose link changed, due now and
+        forget the interfaces that are gone.
+        '''
+
+        for interface, info in interfaces.items():
+            link = info.get(u'linkStatus')
+            if self.links.get(interface) != link:
+                self.links[interface] = link
+                self.schedule[interface] = (now, self.interval)
+                self.settling[interface] = self.SETTLE_POLLS
+        for interface in self.links.keys():
+            if interface not in interfaces:
+                del self.links[interface]
+                self.schedule.pop(interface, None)
+                self.settling.pop(interface, None)
+                self.update_times.pop(interface, None)
+
+    def due(self, now):
+        '''Return the interfaces due by now, or None before the first poll.
+        '''
+
+        if not self.links:
+            return None
+        # Allow for the time a cycle takes
+        now += self.interval / 2.0
+        return [interface for interface, (due, _) in self.schedule.items()
+                if due <= now]
+
+    def refreshed(self, interface, update_time):
+        '''Learn the refresh cadence from the updateTime of a reading.
+        '''
+
+        previous = self.update_times.get(interface)
+        self.update_times[interface] = update_time
+        if previous is None or update_time <= previous:
+            return
+        # A poll may span several refreshes; count the shortest
+        elapsed = update_time - previous
+        if self.cadence is not None:
+            elapsed /= max(1, round(elapsed / self.cadence))
+            self.cadence += self.CADENCE_WEIGHT * (elapsed - self.cadence)
+        else:
+            self.cadence = elapsed
+
+    def align(self, interface, due):
+        '''Move a due time to just after the next expected refresh of the
+        readings of an interface.
+        '''
+
+        update_time = self.update_times.get(interface)
+        if not self.cadence or update_time is None:
+            return due
+        refreshes = math.ceil((due - self.REFRESH_MARGIN - update_time) /
+                              self.cadence)
+        aligned = update_time + max(refreshes, 1) * self.cadence + \
+                  self.REFRESH_MARGIN
+        # Bound the delay should the switch's clock be off
+        return min(aligned, due + self.cadence)
+
+    def update(self, interface, now, optic=True, drift=None,
+               update_time=None):
+        '''Schedule the next poll of an interface that was just polled.
+        args:
+            optic (bool): Whether the transceiver reported any readings.
+            drift (float): Largest difference from the baseline in dBm,
+                None if there is no baseline.
+            update_time (float): The updateTime of the readings.
+        '''
+
+        if update_time is not None:
+            self.refreshed(interface, update_time)
+
+        interval = self.schedule.get(interface, (now, self.interval))[1]
+        settling = self.settling.get(interface, 0)
+        if settling:
+            self.settling[interface] = settling - 1
+        if not optic or drift is None:
+            interval = self.max_interval
+        elif settling or drift >= TOLERANCE / 2.0:
+            interval = self.interval
+        else:
+            interval = min(interval * 2, self.max_interval)
+        if self.cadence:
+            interval = max(interval, min(self.cadence, self.max_interval))
+        self.schedule[interface] = (self.align(interface, now + interval),
+                                    interval)
+
+class StaticCache(object):
+    '''The data of a switch that rarely changes, kept between polls so only
+    the link status and transceiver info are fetched: the names of its
+    Ethernet interfaces, joined for the 'show interfaces <list> ...'
+    commands, its bootupTimestamp and the serial numbers of its optics.
+
+    The cache is refreshed by a full poll every interval seconds, after a
+    poll fails (as when the switch reboots) and after an optic is swapped.
+    A changed bootupTimestamp on refresh is logged as a reboot.
+    '''
+
+    def __init__(self, interval=STATIC_REFRESH):
+        self.interval = interval
+        # The sorted Ethernet interfaces, None until the first refresh
+        self.interfaces = None
+        self.names = None
+        self.uptime = None
+        # { <interface> : vendorSn as reported }
+        self.serials = {}
+        # Monotonic time of the last refresh
+        self.refreshed = None
+        # Why the cache must be refreshed before the interval is up
+        self.stale = None
+
+    def due(self, now):
+        '''Return True if the next poll must refresh the cache.
+        '''
+
+        return (self.interfaces is None or self.uptime is None or
+                self.stale is not None or
+                now - self.refreshed >= self.interval)
+
+    def invalidate(self, reason):
+        '''Refresh the cache on the next poll.
+        '''
+
+        if self.stale is None and self.interfaces is not None:
+            log("Static data stale: {0}".format(reason), level='DEBUG')
+            self.stale = reason
+
+    def refresh(self, interfaces, uptime, now, hostname=None):
+        '''Keep the static data read by a full poll.
+        args:
+            interfaces (dict): The Ethernet interfaces' status.
+            uptime (int): The bootupTimestamp, None if it was not read.
+        '''
+
+        if uptime is not None:
+            if self.uptime is not None and uptime != self.uptime:
+                log("{0}: rebooted at {1}".format(hostname,
+                                                  time.ctime(uptime)))
+            self.uptime = uptime
+        interfaces = sorted(interfaces)
+        if interfaces != self.interfaces:
+            self.names = ', '.join(interfaces)
+            for interface in self.serials.keys():
+                if interface not in interfaces:
+                    del self.serials[interface]
+            self.interfaces = interfaces
+        self.refreshed = now
+        self.stale = None
+
+    def observe(self, dominfo):
+        '''Note the serial numbers in transceiver info, invalidating the
+        cache if an optic was swapped.
+        '''
+
+        serials = self.serials
+        for interface, info in dominfo.items():
+            serial = info.get(u'vendorSn')
+            previous = serials.get(interface, serial)
+            if previous != serial:
+                self.invalidate('{0} optic swapped'.format(interface))
+            serials[interface] = serial
+
+def history_file(directory, hostname):
+    '''Return the path of the sample ring of a switch.
+    '''
+
+    return os.path.join(directory, '{0}.ring'.format(hostname))
+
+def show_history(ring, interface, window=HISTORY_WINDOW, count=10,
+                 out=sys.stdout):
+    '''Print the last readings of an interface and a summary of its readings
+    over the last window seconds.
+    '''
+
+    out.write('{0}: last {1} readings\n'.format(interface, count))
+    out.write('  {0:19s} {1}\n'.format('time', ' '.join(
+        ['{0:>11s}'.format(field) for field in SAMPLE_FIELDS])))
+    for sample in ring.last(interface, count):
+        out.write('  {0} {1}\n'.format(_time_string(sample.time), ' '.join(
+            ['{0:11.4f}'.format(getattr(sample, field))
+             for field in SAMPLE_FIELDS])))
+
+    out.write('{0}: last {1} seconds (min/max/mean)\n'.format(interface,
+                                                               window))
+    summary = ring.summary(interface, time.time() - window)
+    for field in SAMPLE_FIELDS:
+        if field in summary:
+            out.write('  {0:11s} {1:.4f} / {2:.4f} / {3:.4f}\n'.format(
+                field, *summary[field]))
+
+def poll_file(directory, hostname):
+    '''Return the path of the poll recording of a switch.
+    '''
+
+    return os.path.join(directory, '{0}.polls'.format(hostname))
+
+class PollRecorder(object):
+    '''Append the results of each poll of a switch to a file, for replaying
+    them through the checks with other settings (see :func:`sweep`).
+
+    Layout: MAGIC, then a record per poll: its length and a zlib-compressed
+    JSON list of [time, uptime, { <interface> : <linkStatus> },
+    { <interface> : <transceiver info> }, <interfaces checked or null for
+    all>].  Only the fields the checks read are kept.  A record is written
+    whole and flushed, so a crash leaves at most a partial last record, which
+    :func:`read_polls` skips and is cut off when the file is reopened.
+    '''
+
+    MAGIC = 'DOMPOLL1'
+    LENGTH = struct.Struct('<I')
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.lock = threading.Lock()
+        self.file = open(filename, 'ab')
+        end = self.complete(filename)
+        if end < os.path.getsize(filename):
+            self.file.truncate(end)
+        if not end:
+            self.file.write(self.MAGIC)
+            self.file.flush()
+
+    @classmethod
+    def complete(cls, filename):
+        '''Return the length of the complete records of a recording,
+        including MAGIC (0 if it has none).
+        '''
+
+        size = os.path.getsize(filename)
+        with open(filename, 'rb') as recording:
+            if recording.read(len(cls.MAGIC)) != cls.MAGIC:
+                return 0
+            end = len(cls.MAGIC)
+            while True:
+                header = recording.read(cls.LENGTH.size)
+                if len(header) < cls.LENGTH.size:
+                    return end
+                length = cls.LENGTH.unpack(header)[0]
+                if end + cls.LENGTH.size + length > size:
+                    return end
+                end += cls.LENGTH.size + length
+                recording.seek(end)
+
+    def append(self, timestamp, uptime, interfaces, dominfo, checked=None):
+        '''Record a poll.
+        args:
+            timestamp (float): Time of the poll.
+            uptime (int): The switch's bootupTimestamp.
+            interfaces (dict): The Ethernet 'interfaceStatuses'.
+            dominfo (dict): The transceiver info of the interfaces checked.
+            checked (list): The interfaces checked. (Default: all)
+        '''
+
+        statuses = dict((interface, info.get(u'linkStatus'))
+                        for interface, info in interfaces.items())
+        responses = {}
+        for interface in interfaces if checked is None else checked:
+            info = dominfo.get(interface)
+            if not info:
+                continue
+            response = _trim_transceiver(interface, info)
+            response.update(_trim_lanes(interface, info) or {})
+            responses[interface] = response
+        if checked is not None and len(checked) == len(interfaces):
+            checked = None
+        payload = zlib.compress(json.dumps(
+            [timestamp, uptime, statuses, responses,
+             None if checked is None else list(checked)],
+            separators=(',', ':')))
+        with self.lock:
+            self.file.write(self.LENGTH.pack(len(payload)) + payload)
+            self.file.flush()
+
+    def close(self):
+        with self.lock:
+            self.file.close()
+
+def read_polls(filename):
+    '''Read the polls recorded by a :class:`PollRecorder`.
+    returns:
+        generator: (time, uptime, interfaces, dominfo, checked) for each
+            poll, interfaces as in 'interfaceStatuses'.
+    '''
+
+    with open(filename, 'rb') as recording:
+        if recording.read(len(PollRecorder.MAGIC)) != PollRecorder.MAGIC:
+            raise ValueError('{0} is not a poll recording'.format(filename))
+        while True:
+            header = recording.read(PollRecorder.LENGTH.size)
+            if len(header) < PollRecorder.LENGTH.size:
+                return
+            length = PollRecorder.LENGTH.unpack(header)[0]
+            payload = recording.read(length)
+            if len(payload) < length:
+                # Cut short by a crash while recording
+                return
+            timestamp, uptime, statuses, dominfo, checked = \
+                json.loads(zlib.decompress(payload))
+            interfaces = dict((interface, {u'linkStatus': status})
+                              for interface, status in statuses.items())
+            yield timestamp, uptime, interfaces, dominfo, checked
+
+def _baseline(value):
+    '''Check the name of a baseline.
+    '''
+
+    if value not in BASELINES:
+        raise ValueError('invalid baseline: {0!r}'.format(value))
+    return value
+
+# Settings a replay can sweep, and the type of their values
+REPLAY_SETTINGS = {'tolerance': float,
+                   'rebase-poll-limit': int,
+                   'baseline': _baseline,
+                   'ewma-alpha': float,
+                   'baseline-window': int,
+                   'sigmas': float,
+                   'sigma-floor': float}
+
+class ReplaySink(object):
+    '''Collect the power change notifications of a replay.
+    '''
+
+    name = 'replay'
+
+    def __init__(self):
+        # Time of the poll being replayed
+        self.now = None
+        # [(time, (switch, interface, lane, direction)), ...]
+        self.alerts = []
+        self.switch = None
+
+    def send(self, notification):
+        fields = notification.fields
+        if 'direction' in fields:
+            self.alerts.append((self.now, (self.switch, fields['interface'],
+                                           fields.get('lane'),
+                                           fields['direction'])))
+
+def _readings(response):
+    '''Return [(lane, direction, power), ...] of a transceiver response,
+    lane None for single-lane optics.
+    '''
+
+    lanes = lane_powers(response)
+    if lanes is None:
+        return [(None, 'rx', _power(response, u'rxPower')),
+                (None, 'tx', _power(response, u'txPower'))]
+    count = len(lanes[0])
+    return [(lane, direction, lanes[1][offset + number])
+            for number, lane in enumerate(lanes[0])
+            for offset, direction in [(0, 'rx'), (count, 'tx')]]
+
+def find_changes(recordings, change=REPLAY_CHANGE):
+    '''Find when each reading first moved change dBm or more from its value
+    after the link came up: the changes time to detect is measured from.
+    args:
+        recordings (dict): { <switch> : [poll, ...] } as from
+            :func:`read_polls`.
+    returns:
+        list: (onset, end, key) of each change, end being when the link went
+            down after it (None if it stayed up) and key (switch, interface,
+            lane, direction).
+    '''
+
+    changes = []
+    for switch, polls in sorted(recordings.items()):
+        # { <interface> : { (lane, direction) : reading after the link came
+        # up, None once it changed } }
+        reference = {}
+        # { <interface> : [index in changes, ...] } of the link's changes
+        open_changes = {}
+        for timestamp, _, interfaces, dominfo, checked in polls:
+            for interface in interfaces if checked is None else checked:
+                if interface not in interfaces:
+                    continue
+                if not link_up(interfaces[interface]):
+                    for index in open_changes.pop(interface, []):
+                        changes[index][1] = timestamp
+                    reference.pop(interface, None)
+                    continue
+                bases = reference.setdefault(interface, {})
+                for lane, direction, power in _readings(
+                        dominfo.get(interface, {})):
+                    if power != power or not power:
+                        continue
+                    base = bases.setdefault((lane, direction), power)
+                    if base is None or abs(power - base) < change:
+                        continue
+                    changes.append([timestamp, None,
+                                    (switch, interface, lane, direction)])
+                    open_changes.setdefault(interface, []).append(
+                        len(changes) - 1)
+                    bases[(lane, direction)] = None
+    return [tuple(item) for item in changes]
+
+def replay_settings(args):
+    '''Return { <setting> : value } of every REPLAY_SETTINGS from the command
+    line.
+    '''
+
+    return dict((name, getattr(args, name.replace('-', '_')))
+                for name in REPLAY_SETTINGS)
+
+def apply_settings(settings):
+    '''Set the module settings a replay sweeps, from { <setting> : value }
+    as in REPLAY_SETTINGS.
+    returns:
+        dict: The previous values, for restoring them.
+    '''
+
+    global TOLERANCE, REBASE_POLL_LIMIT, USE_CUMULATIVE_AVERAGE
+    global BASELINE_MODEL, SIGMAS, SIGMA_FLOOR
+    previous = {'TOLERANCE': TOLERANCE,
+                'REBASE_POLL_LIMIT': REBASE_POLL_LIMIT,
+                'USE_CUMULATIVE_AVERAGE': USE_CUMULATIVE_AVERAGE,
+                'BASELINE_MODEL': BASELINE_MODEL,
+                'SIGMAS': SIGMAS,
+                'SIGMA_FLOOR': SIGMA_FLOOR}
+    TOLERANCE = settings['tolerance']
+    REBASE_POLL_LIMIT = settings['rebase-poll-limit']
+    USE_CUMULATIVE_AVERAGE = settings['baseline'] == 'cumulative'
+    BASELINE_MODEL = baseline_model(settings['baseline'],
+                                    alpha=settings['ewma-alpha'],
+                                    window=settings['baseline-window'])
+    SIGMAS = settings['sigmas']
+    SIGMA_FLOOR = settings['sigma-floor']
+    return previous
+
+def replay(recordings, settings, changes=()):
+    '''Run recorded polls through the checks with some settings, as fast as
+    they can be checked.
+    args:
+        recordings (dict): { <switch> : [poll, ...] } as from
+            :func:`read_polls`.
+        settings (dict): { <setting> : value } for every REPLAY_SETTINGS.
+        changes (list): The changes to measure the time to detect of, from
+            :func:`find_changes`.
+    returns:
+        dict: The settings, 'polls', 'alerts', 'changes', 'detected' and
+            'delays', the seconds each detected change took to be alerted.
+    '''
+
+    global SINKS, COALESCER, DISPATCHER
+    sink = ReplaySink()
+    saved = (SINKS, COALESCER, DISPATCHER)
+    SINKS, COALESCER, DISPATCHER = [sink], None, None
+    previous = apply_settings(settings)
+    polls = 0
+    try:
+        for switch, recorded in sorted(recordings.items()):
+            sink.switch = switch
+            status = {}
+            for timestamp, uptime, interfaces, dominfo, checked in recorded:
+                sink.now = timestamp
+                polls += 1
+                for interface in interfaces if checked is None else checked:
+                    if interface in interfaces:
+                        check_interfaces(uptime, str(interface),
+                                         interfaces[interface],
+                                         dominfo.get(interface, {}),
+                                         status=status)
+                evict_interfaces(status, interfaces)
+    finally:
+        globals().update(previous)
+        SINKS, COALESCER, DISPATCHER = saved
+
+    alert_times = collections.defaultdict(list)
+    for timestamp, key in sink.alerts:
+        alert_times[key].append(timestamp)
+    delays = []
+    for onset, end, key in changes:
+        alerted = [timestamp for timestamp in alert_times.get(key, [])
+                   if timestamp >= onset and (end is None or timestamp < end)]
+        if alerted:
+            delays.append(alerted[0] - onset)
+    return {'settings': settings, 'polls': polls, 'alerts': len(sink.alerts),
+            'changes': len(changes), 'detected': len(delays),
+            'delays': delays}
+
+# The recordings and changes a sweep's worker processes replay, inherited
+# from the parent rather than sent with every task
+_REPLAY = {}
+
+def _replay_settings(settings):
+    '''Worker: replay the recordings with one combination of settings.
+    '''
+
+    return replay(_REPLAY['recordings'], settings, _REPLAY['changes'])
+
+def sweep(filenames, base, sweeps=(), change=REPLAY_CHANGE, processes=None):
+    '''Replay recordings with every combination of the swept settings, in
+    parallel across a process pool.
+    args:
+        filenames (list): Files recorded by :class:`PollRecorder`.
+        base (dict): { <setting> : value } for every REPLAY_SETTINGS.
+        sweeps (list): (setting, [value, ...]) of each setting swept.
+        change (float): See :func:`find_changes`.
+        processes (int): Size of the pool. (Default: a process per CPU, no
+            pool for a single combination)
+    returns:
+        list: The :func:`replay` results of each combination, in order.
+    '''
+
+    recordings = {}
+    for filename in filenames:
+        switch = os.path.basename(filename)
+        if switch.endswith('.polls'):
+            switch = switch[:-len('.polls')]
+        recordings[switch] = list(read_polls(filename))
+    changes = find_changes(recordings, change)
+
+    names = [name for name, _ in sweeps]
+    combinations = []
+    for values in itertools.product(*[values for _, values in sweeps]):
+        settings = dict(base)
+        settings.update(zip(names, values))
+        combinations.append(settings)
+
+    _REPLAY['recordings'] = recordings
+    _REPLAY['changes'] = changes
+    try:
+        if len(combinations) == 1 or processes == 1:
+            return [_replay_settings(combination)
+                    for combination in combinations]
+        pool = multiprocessing.Pool(processes)
+        try:
+            return pool.map(_replay_settings, combinations, chunksize=1)
+        finally:
+            pool.terminate()
+            pool.join()
+    finally:
+        _REPLAY.clear()
+
+def show_replay(results, sweeps=(), out=sys.stdout):
+    '''Print the alerts and time to detect of each combination of settings.
+    '''
+
+    names = [name for name, _ in sweeps] or ['tolerance']
+    if results:
+        out.write('{0} polls, {1} changes\n'.format(results[0]['polls'],
+                                                   results[0]['changes']))
+    out.write('{0} {1:>7s} {2:>9s} {3:>11s} {4:>11s}\n'.format(
+        ' '.join(['{0:>17s}'.format(name) for name in names]), 'alerts',
+        'detected', 'median TTD', 'max TTD'))
+    for result in results:
+        delays = sorted(result['delays'])
+        out.write('{0} {1:7d} {2:>9s} {3:>11s} {4:>11s}\n'.format(
+            ' '.join(['{0:>17s}'.format(str(result['settings'][name]))
+                      for name in names]),
+            result['alerts'],
+            '{0}/{1}'.format(result['detected'], result['changes']),
+            '{0:.0f} s'.format(delays[len(delays) // 2]) if delays else '-',
+            '{0:.0f} s'.format(delays[-1]) if delays else '-'))
+
+def _label_value(value):
+    '''Escape a metric label value.
+    '''
+
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace(
+        '\n', '\\n')
+
+def _metric_value(value):
+    '''Format a metric sample value.
+    '''
+
+    if isinstance(value, (int, long)):
+        return str(value)
+    if math.isinf(value):
+        return '+Inf' if value > 0 else '-Inf'
+    return repr(float(value))
+
+class MetricsExporter(object):
+    '''The latest DOM readings of each interface and the daemon's health,
+    in the Prometheus text format or OpenMetrics, for a
+    :class:`MetricsServer`.
+
+    The samples of an interface are rendered when it is polled, and the
+    rendered body is kept until the next poll, so a scrape only reads
+    prepared text and a few counters: it never waits on, or adds to, eAPI.
+    '''
+
+    # (name, help) of the gauges of each interface, and of each lane of
+    # multi-lane optics
+    PORT_METRICS = [
+        ('dom_rx_power_dbm', 'Latest received optical power.'),
+        ('dom_tx_power_dbm', 'Latest transmitted optical power.'),
+        ('dom_rx_baseline_dbm', 'Received power baseline.'),
+        ('dom_tx_baseline_dbm', 'Transmitted power baseline.'),
+        ('dom_rx_deviation_dbm', 'Received power less its baseline.'),
+        ('dom_tx_deviation_dbm', 'Transmitted power less its baseline.'),
+        ('dom_temperature_celsius', 'Latest transceiver temperature.'),
+        ('dom_voltage_volts', 'Latest transceiver supply voltage.')]
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        # { <hostname> : { <interface> : { <metric> : <sample lines> } } }
+        self.ports = {}
+        # { <hostname> : Switch }
+        self.switches = {}
+        # The rendered samples of every interface, None when out of date
+        self.body = None
+
+    def update(self, switch, interfaces, dominfo, selected, hostname=None):
+        '''Render the readings of the interfaces polled, and drop the
+        interfaces no longer on the switch.
+        args:
+            switch (object): The :class:`Switch` polled.
+            interfaces (dict): Every interface found by the poll.
+            dominfo (dict): The transceiver info fetched.
+            selected (list): The interfaces whose transceivers were fetched.
+            hostname (str): Name the switch's notifications are tagged with.
+        '''
+
+        rendered = {}
+        for interface in selected:
+            response = dominfo.get(interface) or {}
+            rendered[interface] = self._render_port(
+                switch.hostname, interface, response,
+                switch.baselines(str(interface), response, hostname))
+
+        with self.lock:
+            self.switches[switch.hostname] = switch
+            ports = self.ports.setdefault(switch.hostname, {})
+            for interface in ports.keys():
+                if interface not in interfaces:
+                    del ports[interface]
+            ports.update(rendered)
+            self.body = None
+
+    def merge(self, result):
+        '''Take the poll counters and rendered samples of a switch polled by
+        a worker process of a :class:`Supervisor`.
+        args:
+            result (object): A :class:`PollResult`.
+        '''
+
+        with self.lock:
+            self.switches[result.hostname] = result
+            if result.ports is not None:
+                self.ports[result.hostname] = result.ports
+                self.body = None
+
+    def samples(self, hostname):
+        '''Return { <interface> : { <metric> : <sample lines> } } of a
+        switch, for a :class:`PollResult`.
+        '''
+
+        with self.lock:
+            return dict(self.ports.get(hostname, {}))
+
+    @staticmethod
+    def _render_port(hostname, interface, response, baselines):
+        '''Return { <metric> : <sample lines> } of an interface.
+        '''
+
+        samples = collections.defaultdict(list)
+        labels = 'switch="{0}",interface="{1}"'.format(
+            _label_value(hostname), _label_value(interface))
+
+        readings = [(None, _power(response, u'rxPower'),
+                     _power(response, u'txPower'))]
+        lanes = lane_powers(response)
+        if lanes is not None:
+            count = len(lanes[0])
+            readings.extend((lane, lanes[1][number], lanes[1][count + number])
+                            for number, lane in enumerate(lanes[0]))
+
+        for lane, rx_power, tx_power in readings:
+            lane_labels = labels if lane is None else \
+                          '{0},lane="{1}"'.format(labels, lane)
+            rx_base, tx_base = baselines.get(lane, (0, 0))
+            for direction, power, base in [('rx', rx_power, rx_base),
+                                           ('tx', tx_power, tx_base)]:
+                if power == power:
+                    samples['dom_{0}_power_dbm'.format(direction)].append(
+                        (lane_labels, power))
+                if base:
+                    samples['dom_{0}_baseline_dbm'.format(direction)].append(
+                        (lane_labels, base))
+                    if power == power:
+                        samples['dom_{0}_deviation_dbm'.format(
+                            direction)].append((lane_labels, power - base))
+
+        for field, name in [(u'temperature', 'dom_temperature_celsius'),
+                            (u'voltage', 'dom_voltage_volts')]:
+            value = _power(response, field)
+            if value == value:
+                samples[name].append((labels, value))
+
+        return dict((name, ''.join(['{0}{{{1}}} {2}\n'.format(
+            name, sample_labels, _metric_value(value))
+                                    for sample_labels, value in lines]))
+                    for name, lines in samples.items())
+
+    def render(self, openmetrics=False):
+        '''Return the metrics, in OpenMetrics rather than the Prometheus
+        text format if openmetrics.
+        '''
+
+        with self.lock:
+            if self.body is None:
+                parts = []
+                for name, text in self.PORT_METRICS:
+                    parts.append('# HELP {0} {1}\n# TYPE {0} gauge\n'.format(
+                        name, text))
+                    for hostname in sorted(self.ports):
+                        ports = self.ports[hostname]
+                        for interface in sorted(ports):
+                            parts.append(ports[interface].get(name, ''))
+                self.body = ''.join(parts)
+            body = self.body
+            switches = sorted(self.switches.items())
+
+        body += self._render_health(switches, openmetrics)
+        if openmetrics:
+            body += '# EOF\n'
+        return body
+
+    @staticmethod
+    def _render_health(switches, openmetrics=False):
+        '''Render the daemon's health from the switches' poll counters and
+        the module counters.
+        '''
+
+        with COUNTERS_LOCK:
+            eapi_errors = sorted(EAPI_ERRORS.items())
+            notifications = sorted(NOTIFICATIONS_SENT.items())
+
+        families = [
+            ('dom_poll_duration_seconds', 'summary',
+             'Time taken by the polls of each switch.',
+             [('_sum', [('switch', hostname)], switch.total_poll_duration)
+              for hostname, switch in switches] +
+             [('_count', [('switch', hostname)], switch.polls)
+              for hostname, switch in switches]),
+            ('dom_last_poll_duration_seconds', 'gauge',
+             'Time taken by the last poll of each switch.',
+             [('', [('switch', hostname)], switch.last_poll_duration)
+              for hostname, switch in switches]),
+            ('dom_switch_consecutive_errors', 'gauge',
+             'Polls of each switch that failed since the last success.',
+             [('', [('switch', hostname)], switch.errors)
+              for hostname, switch in switches]),
+            ('dom_poll_overruns', 'counter',
+             'Poll ticks of each switch skipped because the previous poll '
+             'was still running or the poll loop fell behind.',
+             [('_total', [('switch', hostname)], switch.overruns)
+              for hostname, switch in switches]),
+            ('dom_eapi_errors', 'counter',
+             'eAPI requests that failed, by type of error.',
+             [('_total', [('type', error_type)], value)
+              for error_type, value in eapi_errors]),
+            ('dom_notifications', 'counter',
+             'Notifications sent, by level.',
+             [('_total', [('level', level)], value)
+              for level, value in notifications])]
+
+        if DISPATCHER is not None:
+            stats = DISPATCHER.stats()
+            families.extend([
+                ('dom_notification_queue_depth', 'gauge',
+                 'Notifications waiting to be delivered.',
+                 [('', [], stats['depth'])]),
+                ('dom_notifications_dropped', 'counter',
+                 'Notifications dropped from a full queue.',
+                 [('_total', [], stats['dropped'])]),
+                ('dom_notifications_failed', 'counter',
+                 'Notifications a sink failed to deliver.',
+                 [('_total', [], stats['failed'])])])
+        if SNMP_NOTIFIER is not None and SNMP_NOTIFIER.thread is not None:
+            families.append(
+                ('dom_snmp_queue_depth', 'gauge',
+                 'SNMP notifications waiting to be sent.',
+                 [('', [], SNMP_NOTIFIER.queue.qsize())]))
+        if REMOTE_SYSLOG_SINK is not None:
+            stats = REMOTE_SYSLOG_SINK.stats()
+            families.extend([
+                ('dom_remote_syslog_buffer_depth', 'gauge',
+                 'Messages waiting to be sent to the remote syslog '
+                 'collector.',
+                 [('', [], stats['depth'])]),
+                ('dom_remote_syslog_messages_dropped', 'counter',
+                 'Messages dropped from the full remote syslog buffer.',
+                 [('_total', [], stats['dropped'])])])
+
+        stages = []
+        for stage, histogram in TIMINGS.snapshot():
+            total = 0
+            for bound, count in zip(Histogram.BOUNDS, histogram.buckets):
+                total += count
+                stages.append(('_bucket', [('stage', stage),
+                                           ('le', repr(bound))], total))
+            stages.extend([
+                ('_bucket', [('stage', stage), ('le', '+Inf')],
+                 histogram.count),
+                ('_sum', [('stage', stage)], histogram.sum),
+                ('_count', [('stage', stage)], histogram.count)])
+        families.append(('dom_stage_duration_seconds', 'histogram',
+                         'Time spent in each stage of polling.', stages))
+
+        lines = []
+        for name, kind, text, samples in families:
+            # OpenMetrics names a counter without its _total suffix
+            family = name + '_total' if kind == 'counter' and \
+                                        not openmetrics else name
+            lines.append('# HELP {0} {1}\n# TYPE {0} {2}\n'.format(
+                family, text, kind))
+            for suffix, labels, value in samples:
+                labels = ','.join(['{0}="{1}"'.format(label,
+                                                      _label_value(label_value))
+                                   for label, label_value in labels])
+                lines.append('{0}{1}{2} {3}\n'.format(
+                    name, suffix, '{' + labels + '}' if labels else '',
+                    _metric_value(value)))
+        return ''.join(lines)
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    '''Serve /metrics from the server's :class:`MetricsExporter`.
+    '''
+
+    def do_GET(self):
+        if self.path.split('?', 1)[0] != '/metrics':
+            self.send_error(404)
+            return
+        openmetrics = 'application/openmetrics-text' in \
+                      self.headers.get('Accept', '')
+        body = self.server.exporter.render(openmetrics)
+        self.send_response(200)
+        if openmetrics:
+            self.send_header('Content-Type', 'application/openmetrics-text; '
+                             'version=1.0.0; charset=utf-8')
+        else:
+            self.send_header('Content-Type',
+                             'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+class MetricsServer(ThreadingMixIn, HTTPServer):
+    '''HTTP server of a :class:`MetricsExporter`, run in its own thread.
+    '''
+
+    daemon_threads = True
+
+    def __init__(self, exporter, address=METRICS_ADDRESS, port=METRICS_PORT):
+        HTTPServer.__init__(self, (address, port), MetricsHandler)
+        self.exporter = exporter
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        return self
+
+    def stop(self):
+        if self.thread is not None:
+            self.shutdown()
+            self.thread.join()
+            self.thread = None
+        self.server_close()
+
+class Switch(object):
+    '''A monitored switch: its eAPI connection and per-interface state.
+    '''
+
+    def __init__(self, hostname, port=PORT, protocol=None,
+                 username=None, password=None, batched=False,
+                 transport=None, engine=None, lanes=False, history=None,
+                 scheduler=None, stream=False, exporter=None, recorder=None,
+                 cache=None):
+        self.hostname = hostname
+        self.port = port
+        # (Default: PROTOCOL, USERNAME and PASSWORD as they are when the
+        # switch is created)
+        self.protocol = protocol or PROTOCOL
+        self.username = username or USERNAME
+        self.password = password or PASSWORD
+
+        # A :class:`KeepAliveTransport`, usually shared by all switches.
+        # (Default: a new connection per request)
+        self.transport = transport
+
+        # { <interface> : XcvrStatusReactor }
+        self.status = {}
+        # A :class:`VectorEngine` evaluating all interfaces at once instead
+        # of the per-interface reactors in status.
+        self.engine = engine
+        self.connection = None
+
+        # Fetch status, transceiver and version in a single eAPI request
+        self.batched = batched
+        # Also decode that request as it arrives, checking each interface
+        # as soon as its transceiver info is read
+        self.stream = stream
+        # Also fetch and check the per-lane DOM of multi-lane optics
+        self.lanes = lanes
+        # A :class:`SampleRing` recording every transceiver reading
+        self.history = history
+        # A :class:`PollScheduler` choosing the interfaces to poll each cycle
+        # (Default: every interface, every cycle)
+        self.scheduler = scheduler
+        # A :class:`MetricsExporter` given the readings of each poll
+        self.exporter = exporter
+        # A :class:`PollRecorder` recording each poll for replays
+        self.recorder = recorder
+        # A :class:`StaticCache` of the interface status and version read
+        # between full polls (Default: both read every poll)
+        self.cache = cache
+
+        # Set while a poll is running in the worker pool, since
+        # poll_started (monotonic seconds)
+        self.busy = False
+        self.poll_started = None
+        self.errors = 0
+        # Poll ticks skipped because the previous poll was still running or
+        # the poll loop fell behind
+        self.overruns = 0
+
+        # Per-cycle latency: eAPI requests and seconds spent in the last poll
+        self.polls = 0
+        self.last_poll_requests = 0
+        self.last_poll_duration = 0.0
+        self.total_poll_duration = 0.0
+
+    def __repr__(self):
+        return 'Switch({0}:{1})'.format(self.hostname, self.port)
+
+    def connect(self):
+        '''Return the :class:`jsonrpclib` Server object for this switch, or
+        an :class:`EapiStream` when streaming.
+        '''
+
+        if self.connection is not None:
+            return self.connection
+
+        unix = self.protocol == 'unix'
+        if self.transport is None and (self.stream or unix):
+            self.transport = KeepAliveTransport(
+                secure=(self.protocol == 'https'),
+                unix_socket=EAPI_SOCKET if unix else None)
+        if unix:
+            # The local socket needs no credentials
+            host = self.hostname
+        else:
+            host = "{0}:{1}@{2}:{3}".format(self.username, self.password,
+                                            self.hostname, self.port)
+
+        if self.stream:
+            self.connection = EapiStream(self.transport, host)
+        else:
+            self.connection = Server("{0}://{1}/command-api".format(
+                'http' if unix else self.protocol, host),
+                                     transport=self.transport)
+        return self.connection
+
+    def poll(self, hostname=None):
+        '''Poll the switch once and check the DOM info of each interface.
+        args:
+            hostname (str): Name to tag notifications with. (Default: None)
+        '''
+
+        trace(self.hostname)
+
+        start = monotonic()
+        # Wall clock, as PollScheduler follows the switch's updateTime
+        now = time.time()
+        switch = self.connect()
+        # Interfaces whose transceivers are fetched, None for all
+        selected = None
+        # Interfaces checked while the response was streamed
+        checked = set()
+
+        def check(interfaces, uptime, interface, response):
+            if self.history is not None and response:
+                self.history.append(interface, response)
+            check_interfaces(uptime, str(interface), interfaces[interface],
+                             response, status=self.status, hostname=hostname)
+            checked.add(interface)
+
+        cache = self.cache
+        cached = cache is not None and not cache.due(start)
+
+        if COALESCER is not None:
+            COALESCER.begin()
+        try:
+            if cached:
+                uptime = cache.uptime
+                if self.scheduler is not None:
+                    selected = self.scheduler.due(now)
+                if cache.names:
+                    def check_cached(interfaces, interface, response):
+                        check(interfaces, uptime, interface, response)
+
+                    # The link status is read every poll: a link that went
+                    # down must not be checked against its baseline
+                    interfaces, dominfo = self.fetch_cached(
+                        switch, cache.names,
+                        None if selected is None else ', '.join(selected),
+                        self.lanes, self.stream,
+                        check=check_cached if self.engine is None else None)
+                    requests = 1
+                else:
+                    interfaces, dominfo = {}, {}
+                    requests = 0
+                if self.scheduler is not None:
+                    self.scheduler.observe(interfaces, now)
+            elif self.batched or self.stream:
+                if self.scheduler is not None:
+                    selected = self.scheduler.due(now)
+                if self.stream:
+                    # The engine checks every interface at once instead
+                    interfaces, dominfo, uptime = self.fetch_streamed(
+                        switch, self.lanes, selected,
+                        check=check if self.engine is None else None)
+                else:
+                    interfaces, dominfo, uptime = self.fetch_batched(
+                        switch, self.lanes, selected)
+                if self.scheduler is not None:
+                    self.scheduler.observe(interfaces, now)
+                requests = 1
+            elif self.scheduler is not None:
+                selected = []
+
+                def select(interfaces):
+                    self.scheduler.observe(interfaces, now)
+                    selected.extend(self.scheduler.due(now))
+                    return selected
+
+                interfaces, dominfo, uptime = self.fetch(switch, self.lanes,
+                                                         select)
+                requests = 2 if selected else 1
+            else:
+                interfaces, dominfo, uptime = self.fetch(switch, self.lanes)
+                requests = 2
+
+            if cache is not None:
+                if not cached:
+                    cache.refresh(interfaces, uptime, start,
+                                  hostname=self.hostname)
+                cache.observe(dominfo)
+
+            if selected is None:
+                selected = interfaces.keys()
+            else:
+                selected = [interface for interface in selected
+                            if interface in interfaces]
+
+            if self.history is not None:
+                for interface in selected:
+                    if dominfo.get(interface) and interface not in checked:
+                        self.history.append(interface, dominfo[interface])
+
+            evaluate_start = monotonic()
+            if self.engine is not None:
+                self.engine.update(uptime, dict((interface,
+                                                 interfaces[interface])
+                                                for interface in selected),
+                                   dominfo, hostname=hostname)
+                self.engine.retain([(hostname, str(interface))
+                                    for interface in interfaces.keys()])
+            else:
+                for interface in selected:
+                    if interface not in checked:
+                        check_interfaces(uptime, str(interface),
+                                         interfaces[interface],
+                                         dominfo.get(interface, {}),
+                                         status=self.status,
+                                         hostname=hostname)
+                evict_interfaces(self.status, interfaces)
+            TIMINGS.record('evaluate', monotonic() - evaluate_start)
+        except Exception:
+            # As when the switch reboots or an interface is removed
+            if cache is not None:
+                cache.invalidate('poll failed')
+            raise
+        finally:
+            if COALESCER is not None:
+                for notification in COALESCER.end():
+                    dispatch(notification)
+
+        if self.scheduler is not None:
+            for interface in selected:
+                response = dominfo.get(interface, {})
+                self.scheduler.update(interface, now,
+                                      optic=_has_optic(response),
+                                      drift=self.drift(str(interface),
+                                                       response, hostname),
+                                      update_time=response.get(
+                                          u'updateTime'))
+
+        self.record_latency(monotonic() - start, requests)
+
+        if self.exporter is not None:
+            self.exporter.update(self, interfaces, dominfo, selected,
+                                 hostname=hostname)
+        if self.recorder is not None:
+            self.recorder.append(now, uptime, interfaces, dominfo, selected)
+
+    def drift(self, interface, response, hostname=None):
+        '''Return how far the readings in response are from the baseline of
+        an interface, in dBm, or None if it has no baseline.
+        '''
+
+        if self.engine is not None:
+            return self.engine.drift(hostname, interface, response)
+        reactor = self.status.get(interface)
+        if reactor is None:
+            return None
+        return reactor.drift(response)
+
+    def baselines(self, interface, response, hostname=None):
+        '''Return { <lane> : (rx base, tx base) } of an interface, lane None
+        for the port itself.
+        '''
+
+        if self.engine is not None:
+            return self.engine.baselines(hostname, interface, response)
+        reactor = self.status.get(interface)
+        if reactor is None:
+            return {}
+        return reactor.baselines()
+
+    @staticmethod
+    def fetch(switch, lanes=False, select=None):
+        '''Get the interface status, then the transceiver info of just the
+        Ethernet interfaces, in two eAPI requests.
+        args:
+            lanes (bool): Also get the per-lane DOM. (Default: False)
+            select (function): Given the interfaces, return the names of
+                those to get the transceiver info of. (Default: all)
+        returns:
+            tuple: (interfaces, dominfo, uptime)
+        '''
+
+        interfaces = get_interfaces(switch)
+        names = interfaces.keys() if select is None else select(interfaces)
+        if not names:
+            return interfaces, {}, None
+
+        names = ', '.join(names)
+        commands = ["show interfaces {0} transceiver".format(names),
+                    "show version"]
+        if lanes:
+            commands.append("show interfaces {0} transceiver dom"
+                            .format(names))
+        response = run_commands(switch, commands)
+        dominfo = response[0][u'interfaces']
+        if lanes:
+            merge_lane_info(dominfo, response[2])
+        return (interfaces, dominfo, int(response[1][u'bootupTimestamp']))
+
+    @staticmethod
+    def fetch_batched(switch, lanes=False, names=None):
+        '''Get the interface status, transceiver info and version in one
+        eAPI request and filter the Ethernet interfaces locally.
+        args:
+            lanes (bool): Also get the per-lane DOM. (Default: False)
+            names (list): Interfaces to get the transceiver info of.
+                (Default: all)
+        returns:
+            tuple: (interfaces, dominfo, uptime)
+        '''
+
+        if names is None:
+            subset = ""
+        elif names:
+            subset = " {0}".format(', '.join(names))
+        else:
+            response = run_commands(switch, ["show interfaces status"])
+            return (ethernet_interfaces(response[0][u'interfaceStatuses']),
+                    {}, None)
+
+        commands = ["show interfaces status",
+                    "show interfaces{0} transceiver".format(subset),
+                    "show version"]
+        if lanes:
+            commands.append("show interfaces{0} transceiver dom".format(subset))
+        response = run_commands(switch, commands)
+        dominfo = response[1][u'interfaces']
+        if lanes:
+            merge_lane_info(dominfo, response[3])
+        return (ethernet_interfaces(response[0][u'interfaceStatuses']),
+                dominfo, int(response[2][u'bootupTimestamp']))
+
+    @staticmethod
+    def fetch_cached(switch, interfaces, names=None, lanes=False,
+                     stream=False, check=None):
+        '''Get the link status and transceiver info of interfaces, in one
+        eAPI request, when the interface list and the version are cached.
+        args:
+            interfaces (str): The Ethernet interfaces, joined by commas.
+            names (str): The interfaces to get the transceiver info of,
+                joined by commas, '' for none. (Default: interfaces)
+            lanes (bool): Also get the per-lane DOM. (Default: False)
+            stream (bool): Decode the response as :meth:`fetch_streamed`
+                does. (Default: False)
+            check (function): Called with (interfaces, interface, info) for
+                each interface as it is decoded when streaming.
+                (Default: None)
+        returns:
+            tuple: (interfaces, dominfo)
+        '''
+
+        if names is None:
+            names = interfaces
+        commands = ["show interfaces {0} status".format(interfaces)]
+        if names:
+            if lanes:
+                commands.append("show interfaces {0} transceiver dom"
+                                .format(names))
+            commands.append("show interfaces {0} transceiver".format(names))
+        if not stream:
+            response = run_commands(switch, commands)
+            statuses = ethernet_interfaces(response[0][u'interfaceStatuses'])
+            if not names:
+                return statuses, {}
+            dominfo = response[-1][u'interfaces']
+            if lanes:
+                merge_lane_info(dominfo, response[1])
+            return statuses, dominfo
+
+        def record(interface, info, outputs):
+            statuses = outputs[0][u'interfaceStatuses']
+            if interface not in statuses:
+                return
+            if lanes:
+                lane_info = outputs[1][u'interfaces'].get(interface)
+                if lane_info is not None:
+                    info.update(lane_info)
+            if check is not None:
+                check(statuses, interface, info)
+
+        handlers = [stream_records(u'interfaceStatuses', _trim_status)]
+        if names:
+            if lanes:
+                handlers.append(stream_records(u'interfaces', _trim_lanes))
+            handlers.append(stream_records(u'interfaces', _trim_transceiver,
+                                           record))
+        response = run_commands(switch, commands, handlers)
+        return (response[0][u'interfaceStatuses'],
+                response[-1][u'interfaces'] if names else {})
+
+    @staticmethod
+    def fetch_streamed(switch, lanes=False, names=None, check=None):
+        '''Get the same info as :meth:`fetch_batched` from an
+        :class:`EapiStream`, decoding the transceiver info one interface at a
+        time as it arrives and keeping only the fields checked.  The version
+        (and per-lane DOM) are requested before the transceiver info so each
+        interface can be checked as soon as it is decoded.
+        args:
+            lanes (bool): Also get the per-lane DOM. (Default: False)
+            names (list): Interfaces to get the transceiver info of.
+                (Default: all)
+            check (function): Called with (interfaces, uptime, interface,
+                info) for each Ethernet interface as it is decoded.
+                (Default: None)
+        returns:
+            tuple: (interfaces, dominfo, uptime)
+        '''
+
+        statuses = stream_records(u'interfaceStatuses', _trim_status)
+        if names is None:
+            subset = ""
+        elif names:
+            subset = " {0}".format(', '.join(names))
+        else:
+            response = run_commands(switch, ["show interfaces status"],
+                                    [statuses])
+            return response[0][u'interfaceStatuses'], {}, None
+
+        def record(interface, info, outputs):
+            interfaces = outputs[0][u'interfaceStatuses']
+            if interface not in interfaces:
+                return
+            if lanes:
+                lane_info = outputs[2][u'interfaces'].get(interface)
+                if lane_info is not None:
+                    info.update(lane_info)
+            if check is not None:
+                check(interfaces, int(outputs[1][u'bootupTimestamp']),
+                      interface, info)
+
+        commands = ["show interfaces status", "show version"]
+        handlers = [statuses, None]
+        if lanes:
+            commands.append("show interfaces{0} transceiver dom"
+                            .format(subset))
+            handlers.append(stream_records(u'interfaces', _trim_lanes))
+        commands.append("show interfaces{0} transceiver".format(subset))
+        handlers.append(stream_records(u'interfaces', _trim_transceiver,
+                                       record))
+        response = run_commands(switch, commands, handlers)
+        return (response[0][u'interfaceStatuses'],
+                response[-1][u'interfaces'],
+                int(response[1][u'bootupTimestamp']))
+
+    def checkpoint(self):
+        '''Return { <interface> : record } of the interfaces with a baseline.
+        '''
+
+        if self.engine is not None:
+            return self.engine.checkpoint()
+        records = {}
+        for interface, reactor in self.status.items():
+            record = reactor.checkpoint()
+            if record is not None:
+                records[interface] = record
+        return records
+
+    def restore(self, records, hostname=None):
+        '''Resume the baselines from :meth:`checkpoint` records.
+        args:
+            hostname (str): Name to tag notifications with. (Default: None)
+        '''
+
+        if self.engine is not None:
+            self.engine.restore(records, hostname=hostname)
+            return
+        for interface, record in records.items():
+            interface = str(interface)
+            reactor = XcvrStatusReactor(interface, hostname=hostname)
+            reactor.restore(record)
+            self.status[interface] = reactor
+
+    def record_latency(self, duration, requests):
+        '''Record the latency of a poll cycle.
+        args:
+            duration (float): Seconds taken by the poll.
+            requests (int): eAPI requests made by the poll.
+        '''
+
+        self.polls += 1
+        self.last_poll_requests = requests
+        self.last_poll_duration = duration
+        self.total_poll_duration += duration
+        TIMINGS.record('poll', duration)
+        log("{0}: poll took {1:.1f} ms in {2} eAPI request(s) "
+            "(average {3:.1f} ms)", self.hostname, duration * 1000, requests,
+            self.total_poll_duration / self.polls * 1000, level='DEBUG')
+
+def read_inventory(filename):
+    '''Read the list of switches to monitor.
+    args:
+        filename (str): Path to a file with one 'hostname[:port]' per line.
+    returns:
+        list: (hostname, port) of each switch.
+    '''
+
+    hosts = []
+    with open(filename) as inventory:
+        for line in inventory:
+            line = line.split('#', 1)[0].strip()
+            if not line:
+                continue
+            if ':' in line:
+                hostname, port = line.rsplit(':', 1)
+                hosts.append((hostname, int(port)))
+            else:
+                hosts.append((line, PORT))
+
+    return hosts
+
+def load_inventory(filename, **kwargs):
+    '''Create the switches to monitor.
+    args:
+        filename (str): Path to a file with one 'hostname[:port]' per line.
+        kwargs: Passed on to each :class:`Switch`.
+    returns:
+        list: A list of :class:`Switch` objects.
+    '''
+
+    return [Switch(hostname, port=port, **kwargs)
+            for hostname, port in read_inventory(filename)]
+
+class Poller(object):
+    '''Poll a set of switches concurrently through a bounded worker pool.
 
-    try:
-        response = switch.runCmds(1, commands)
-    except ProtocolError, err:
-        (errno, msg) = err[0]
-        # 1002: invalid command
-        if errno == 1002:
-            log("Invalid EOS interface name ({0})".format(commands), error=True)
-        else:
-            conn_error = True
-            log("ProtocolError while retrieving {0} ([{1}] {2})".
-                format(commands, errno, msg),
+    A switch whose previous poll is still running (slow or unreachable) is
+    skipped for the cycle rather than holding up the rest of the inventory.
+    '''
+
+    def __init__(self, switches, workers=WORKERS, tag=None):
+        self.switches = switches
+        self.workers = min(workers, len(switches)) or 1
+        self.pool = ThreadPool(self.workers)
+        self.lock = threading.Lock()
+
+        # Only tag notifications with the switch name when there is more
+        # than one switch, so single-switch messages are unchanged.
+        # (Default: tag if polling more than one switch)
+        self.tag = len(switches) > 1 if tag is None else tag
+
+    def _poll(self, switch):
+        '''Worker: poll one switch, containing any failure to that switch.
+        '''
+
+        try:
+            switch.poll(hostname=switch.hostname if self.tag else None)
+            switch.errors = 0
+        except EapiException, err:
+            switch.errors += 1
+            log("{0}: {1}, skipping".format(switch.hostname, err),
                 error=True)
-    except Exception, err:
-        conn_error = True
-        #   60: Operation timed out
-        #   61: Connection refused (http vs https?)
-        #  401: Unauthorized
-        #  405: Method Not Allowed (bad URL)
-        if hasattr(err, 'errno'):
-            if err.errno == 60:
-                log("Connection timed out: Incorrect hostname/IP or eAPI"
-                    " not configured on the switch.", error=True)
-            elif err.errno == 61:
-                log("Connection refused: http instead of https selected or"
-                    " eAPI not configured on the switch.", error=True)
-            else:
-                log("General Error retrieving {0} ({1})".format(commands,
-                                                                err),
-                    error=True)
-        else:
-            # Parse the string manually
-            msg = str(err)
-            msg = msg.strip('<>')
-            err = msg.split(': ')[-1]
+        except Exception, err:
+            switch.errors += 1
+            log("{0}: Unexpected error while polling ({1})".
+                format(switch.hostname, err), error=True)
+            log(traceback.format_exc(), level='DEBUG')
+        finally:
+            with self.lock:
+                switch.busy = False
 
-            if "401 Unauthorized" in err:
-                log("ERROR: Bad username or password")
-            elif "405 Method" in err:
-                log("ERROR: Incorrect URL")
-            else:
-                log("HTTP Error retrieving {0} ({1})".format(commands,
-                                                             err),
-                    error=True)
+    def run_cycle(self, switches=None):
+        '''Start one poll of each idle switch.  A switch still busy with its
+        previous poll has overrun its period: the overrun is counted and the
+        poll skipped.
+        args:
+            switches (list): The switches to poll. (Default: all)
+        returns:
+            list: The :class:`multiprocessing.pool.AsyncResult` of each poll
+                started.
+        '''
 
-    if conn_error:
-        raise EapiException("Connection error with eAPI")
+        started = []
+        for switch in self.switches if switches is None else switches:
+            with self.lock:
+                if switch.busy:
+                    switch.overruns += 1
+                    log("{0}: previous poll still running after {1:.1f} "
+                        "seconds, skipping", switch.hostname,
+                        monotonic() - switch.poll_started, level='WARNING')
+                    continue
+                switch.busy = True
+                switch.poll_started = monotonic()
+            started.append(self.pool.apply_async(self._poll, (switch,)))
 
-    # Filter out non-Ethernet interfaces
-    for interface in response[0][u'interfaceStatuses'].keys():
-        if str(interface)[:8] != 'Ethernet':
-            response[0][u'interfaceStatuses'].pop(interface, None)
+        return started
+
+    def close(self):
+        '''Stop the worker pool.
+        '''
 
-    return response[0][u'interfaceStatuses']
+        self.pool.terminate()
+        self.pool.join()
 
-def check_interfaces(uptime, interface, interfaceinfo, dominfo):
-    '''Check the DOM info for each interface on a given switch.
+class TickScheduler(object):
+    '''Fixed-rate poll ticks on the monotonic clock.
+
+    Each switch is polled every interval seconds from its first tick, however
+    long its polls or the notifications take, rather than sleeping for the
+    interval after each cycle.  With jitter, the first tick of each switch is
+    offset by a stable fraction of the interval derived from its hostname, so
+    a fleet is not polled in lockstep.  Ticks that pass while the poll loop
+    is behind are counted as overruns of the switch and skipped, not
+    polled in a burst.
+    '''
+
+    def __init__(self, switches, interval, jitter=POLL_JITTER, clock=None):
+        '''args:
+            switches (list): The :class:`Switch` objects to schedule.
+            interval (float): Seconds between polls of a switch.
+            jitter (float): Fraction of the interval the first ticks are
+                spread over.
+            clock (callable): Current time in seconds. (Default: monotonic)
+        '''
+
+        self.switches = switches
+        self.interval = interval
+        self.clock = clock or monotonic
+        start = self.clock()
+        self.first = [start + self.offset(switch.hostname, interval, jitter)
+                      for switch in switches]
+        self.ticks = [0] * len(switches)
+        # [(<next tick>, <index of the switch>), ...]
+        self.queue = [(first, index) for index, first in enumerate(self.first)]
+        heapq.heapify(self.queue)
+
+    @staticmethod
+    def offset(hostname, interval, jitter):
+        '''Return the offset of a switch's first tick: the same for a
+        hostname on every start.
+        '''
+
+        return (zlib.crc32(hostname) & 0xffffffff) / 2.0 ** 32 * \
+               jitter * interval
+
+    def wait(self):
+        '''Sleep until the next tick.
+        returns:
+            list: The switches due.
+        '''
+
+        tick = self.queue[0][0]
+        asleep = max(0.0, tick - self.clock())
+        log("---sleeping for {0:.3f} seconds.", asleep, level='DEBUG')
+        time.sleep(asleep)
+        now = self.clock()
+        TIMINGS.record('sleep_drift', max(0.0, now - tick))
+
+        due = []
+        while self.queue and self.queue[0][0] <= now:
+            tick, index = heapq.heappop(self.queue)
+            due.append(index)
+            if self.interval:
+                missed = int((now - tick) // self.interval)
+                if missed:
+                    self.switches[index].overruns += missed
+                    log("{0}: poll loop {1:.1f} seconds behind, skipping "
+                        "{2} tick(s)", self.switches[index].hostname,
+                        now - tick, missed, level='WARNING')
+                self.ticks[index] += missed + 1
+        for index in due:
+            heapq.heappush(self.queue, (self.first[index] +
+                                        self.ticks[index] * self.interval
+                                        if self.interval else now, index))
+        return [self.switches[index] for index in due]
+
+def shard_of(hostname, shards):
+    '''Return the shard polling a switch: the same in every process and
+    across restarts, unlike hash().
+    '''
+
+    return (zlib.crc32(hostname) & 0xffffffff) % shards
+
+class ShardChannel(object):
+    '''The end of a worker process's pipe to its :class:`Supervisor`,
+    shared by the threads of the worker.  Messages are tuples of their kind,
+    the shard and the kind's fields.
+    '''
+
+    def __init__(self, connection, shard):
+        self.connection = connection
+        self.shard = shard
+        self.lock = threading.Lock()
+
+    def send(self, kind, *fields):
+        with self.lock:
+            self.connection.send((kind, self.shard) + fields)
+
+class ChannelSink(object):
+    '''Deliver notifications to the :class:`Supervisor`, which hands them
+    to its own sinks.
+    '''
+
+    name = 'channel'
+
+    def __init__(self, channel):
+        self.channel = channel
+
+    def send(self, notification):
+        self.channel.send('notify', notification)
+
+class PollResult(object):
+    '''What a :class:`Supervisor` learns of a switch polled by a worker:
+    the poll counters :class:`MetricsExporter` reads from a :class:`Switch`,
+    and the rendered samples of its interfaces when metrics are served.
+    '''
+
+    def __init__(self, switch, ports=None):
+        self.hostname = switch.hostname
+        self.polls = switch.polls
+        self.last_poll_duration = switch.last_poll_duration
+        self.total_poll_duration = switch.total_poll_duration
+        self.errors = switch.errors
+        self.overruns = switch.overruns
+        self.ports = ports
+
+def _on_term(signum, frame):
+    raise SystemExit(0)
+
+# Fields of a checkpoint record that change on every poll, not only when the
+# baseline does
+POLL_COUNTERS = ('polls', 'logging')
+
+def baseline_changes(records, previous):
+    '''Return what a worker reports of the checkpoint records of a switch:
+    those of the interfaces whose baseline is not the one previously
+    reported, and None for the interfaces no longer with a baseline.  The
+    poll counters are left out of the comparison, so a switch whose
+    baselines are unchanged reports nothing.
+    args:
+        records (dict): { <interface> : record } of
+            :meth:`Switch.checkpoint`.
+        previous (dict): { <interface> : record } previously reported.
+    returns:
+        dict: { <interface> : record or None }
+    '''
+
+    def baseline(record):
+        return dict((name, value) for name, value in record.items()
+                    if name not in POLL_COUNTERS)
+
+    updates = dict((interface, record) for interface, record
+                   in records.items()
+                   if interface not in previous or
+                   baseline(record) != baseline(previous[interface]))
+    for interface in previous:
+        if interface not in records:
+            updates[interface] = None
+    return updates
+
+def run_shard(args, shard, hosts, connection, records):
+    '''Poll one shard of the inventory: the target of a
+    :class:`Supervisor`'s worker processes.
+
+    Notifications are sent to the supervisor as they are raised.  After each
+    poll cycle, the :class:`PollResult` of each switch polled, the eAPI
+    errors since the last report and the records of the interfaces whose
+    baseline changed (see :func:`baseline_changes`) are sent.
+    args:
+        hosts (list): (hostname, port) of the switches of the shard.
+        connection (object): The sending end of a :func:`multiprocessing.Pipe`.
+        records (dict): { <hostname> : { <interface> : record } } of the
+            :class:`Checkpoint` baselines to resume.
     '''
 
-    log("\nEntering {0} for {1}.".format(sys._getframe().f_code.co_name,
-                                         interface), level='DEBUG')
+    # The supervisor stops its workers
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, _on_term)
+    set_proc_name('dom-{0}'.format(shard))
 
-    global STATUS
+    # Locks held by the supervisor's threads when it forked stay held here,
+    # and its counters are its own
+    global COUNTERS_LOCK, EAPI_ERRORS, NOTIFICATIONS_SENT, TIMINGS
+    COUNTERS_LOCK = threading.Lock()
+    EAPI_ERRORS = collections.Counter()
+    NOTIFICATIONS_SENT = collections.Counter()
+    TIMINGS = StageTimings()
 
+    channel = ShardChannel(connection, shard)
+    global SINKS, DISPATCHER, SNMP_NOTIFIER, REMOTE_SYSLOG_SINK, COALESCER
+    SINKS = [ChannelSink(channel)]
+    DISPATCHER = SNMP_NOTIFIER = REMOTE_SYSLOG_SINK = None
+    COALESCER = None
+    if args.coalesce_threshold:
+        COALESCER = NotificationCoalescer(threshold=args.coalesce_threshold,
+                                          group=args.coalesce_group)
+
+    transport = make_transport(args)
+    switches = make_switches(args, transport, hosts)
+    exporter = None
+    if args.metrics_port:
+        exporter = MetricsExporter()
+        for switch in switches:
+            switch.exporter = exporter
+    signal.signal(signal.SIGUSR1, on_usr1(make_profiler(args)))
+
+    # Tagged as when the whole inventory is polled by one process
+    poller = Poller(switches, workers=args.workers, tag=True)
+    for switch in switches:
+        switch.restore(records.get(switch.hostname, {}),
+                       hostname=switch.hostname)
+    ticks = TickScheduler(switches, args.poll_interval, jitter=args.jitter)
+
+    # { <hostname> : (polls, errors) reported }
+    reported = {}
+    # { <hostname> : { <interface> : record reported } }
+    states = dict(records)
+    errors = collections.Counter()
     try:
-        STATUS[interface]
-    except (KeyError, NameError):
-        STATUS[interface] = XcvrStatusReactor(interface)
+        while True:
+            poller.run_cycle(ticks.wait())
 
-    STATUS[interface].uptime = uptime
-    STATUS[interface].link_up_now = link_up(interfaceinfo)
-    STATUS[interface].check_dom_info(dominfo)
+            results = []
+            changed = {}
+            for switch in switches:
+                counters = (switch.polls, switch.errors)
+                if switch.busy or reported.get(switch.hostname) == counters:
+                    continue
+                reported[switch.hostname] = counters
+                results.append(PollResult(
+                    switch, exporter.samples(switch.hostname)
+                    if exporter is not None else None))
+                state = switch.checkpoint()
+                updates = baseline_changes(state,
+                                           states.get(switch.hostname, {}))
+                if updates:
+                    states[switch.hostname] = state
+                    changed[switch.hostname] = updates
+            with COUNTERS_LOCK:
+                new_errors = EAPI_ERRORS - errors
+                errors = collections.Counter(EAPI_ERRORS)
+            if results or new_errors:
+                channel.send('polled', results, dict(new_errors), changed)
+    finally:
+        poller.close()
+        transport.close()
+        close_switches(switches)
+        connection.close()
 
-    if DEBUG and STATUS[interface].response:
-        pprint(vars(STATUS[interface]))
+class ForkServer(object):
+    '''Start the worker processes of a :class:`Supervisor` from a helper
+    process forked before the supervisor starts any thread.  A process
+    forked while another of its parent's threads holds a lock (the
+    dispatcher's, the logging's, one of the interpreter's own) finds the
+    lock held and never released, so workers restarted later are not forked
+    from the supervisor, whose sink and metrics threads are running by then.
 
-class XcvrStatusReactor(object):
-    '''Interface transceiver status class
+    The helper starts each process with the sending end of a new pipe, and
+    passes the receiving end back to the supervisor over its own socket.
     '''
 
-    def __init__(self, interface_string):
-        '''Initialize interface transceiver objects
+    def __init__(self, target):
+        '''args:
+            target (function): Run by each process, with its pipe as the
+                connection keyword argument.
         '''
 
-        log("Entering {0}.".format(sys._getframe().f_code.co_name),
-            level='DEBUG')
+        self.target = target
+        self.connection = None
+        self.process = None
 
-        self.interface = interface_string
-        self.response = {}
+    def start(self):
+        '''Fork the helper process.
+        '''
 
-        # { 'rx'|'tx' : { <laneId> : power } }
-        self.base_power_ = {}
-        self.base_power_['rx'] = {}
-        self.base_power_['tx'] = {}
-        self.base_timestamp_ = None
-        self.uptime = 0
+        self.connection, child = multiprocessing.Pipe()
+        # Not a daemon: those may not start processes
+        self.process = multiprocessing.Process(
+            target=self._serve, name='dom-forks',
+            args=(child, self.connection))
+        self.process.start()
+        child.close()
+        return self
 
-        self.link_up_now = False
-        self.link_up_on_prev_poll_ = False
-        self.poll_iterations_ = 0
+    def spawn(self, name, args, kwargs):
+        '''Start a process running target(*args, connection=<pipe>,
+        **kwargs).
+        returns:
+            tuple: (pid, the receiving end of its pipe)
+        '''
 
-        # On consecutive logged messages, we reset the base
-        self.logging_polls_ = 0
+        self.connection.send(('spawn', name, args, kwargs))
+        receiver = _multiprocessing.Connection(recv_handle(self.connection),
+                                               writable=False)
+        return self.connection.recv(), receiver
 
-    def reset_log(self):
-        '''On link-transition, reset the historic data.
+    def reap(self):
+        '''Return [(pid, exit code)] of the processes that exited since the
+        last call.
         '''
 
-        log("Entering {0}.".format(sys._getframe().f_code.co_name),
-            level='DEBUG')
-        self.base_power_['rx'] = 0
-        self.base_power_['tx'] = 0
-        self.poll_iterations_ = 0
-        self.logging_polls_ = 0
-        self.base_timestamp_ = None
+        self.connection.send(('reap',))
+        return self.connection.recv()
 
-    def check_dom_info(self, response, out=sys.stdout):
-        '''Analyze the transceiver optical status of the given interface
-        response (dict): The interface-specific response from eAPI
-                         'show interfaces <ID> transceiver':
+    def stop(self):
+        '''Stop the helper, killing any process still running.
+        '''
 
-                         {u'mediaType': u'100GBASE-SR10',
-                          u'rxPower': -30.0,
-                          u'temperature': 37.4609375,
-                          u'txBias': 0.0,
-                          u'txPower': -30.0,
-                          u'updateTime': 1449247873.35,
-                          u'vendorSn': u'JAS00000006',
-                          u'voltage': 3.27}
+        if self.process is not None:
+            self.connection.close()
+            self.process.join()
+            self.process = None
+
+    def _serve(self, connection, parent):
+        parent.close()
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        signal.signal(signal.SIGUSR1, signal.SIG_IGN)
+        set_proc_name('dom-forks')
+
+        # { <pid> : multiprocessing.Process }
+        processes = {}
+        try:
+            while True:
+                try:
+                    request = connection.recv()
+                except (EOFError, IOError):
+                    # The supervisor exited
+                    return
+                if request[0] == 'spawn':
+                    name, args, kwargs = request[1:]
+                    receiver, sender = multiprocessing.Pipe(duplex=False)
+                    kwargs['connection'] = sender
+                    process = multiprocessing.Process(
+                        target=self._run, name=name,
+                        args=(connection, args, kwargs))
+                    process.daemon = True
+                    process.start()
+                    sender.close()
+                    send_handle(connection, receiver.fileno(), None)
+                    receiver.close()
+                    processes[process.pid] = process
+                    connection.send(process.pid)
+                elif request[0] == 'reap':
+                    exited = [(pid, process.exitcode)
+                              for pid, process in processes.items()
+                              if not process.is_alive()]
+                    for pid, _ in exited:
+                        del processes[pid]
+                    connection.send(exited)
+        finally:
+            for process in processes.values():
+                if process.is_alive():
+                    os.kill(process.pid, signal.SIGKILL)
+                process.join()
+
+    def _run(self, control, args, kwargs):
+        control.close()
+        self.target(*args, **kwargs)
+
+class ShardWorker(object):
+    '''A worker process of a :class:`Supervisor` and its pipe.
+    '''
+
+    def __init__(self, pid, connection):
+        self.pid = pid
+        self.connection = connection
+        self.started = monotonic()
+
+class Supervisor(object):
+    '''Split an inventory across worker processes, each polling its shard
+    of the switches with its own threads, and gather their notifications and
+    results.
+
+    A switch always falls in the same shard (:func:`shard_of`), so its
+    baselines are only kept by one worker.  Workers report the baselines
+    that change after each poll cycle, interface by interface, and a worker
+    that dies is restarted with those of its shard, after a delay doubling
+    up to WORKER_RESTART_MAX_DELAY while it keeps dying within a minute.
+
+    Each worker writes to its own pipe: one shared queue would be left
+    locked by a worker killed while writing to it.  Workers are started by a
+    :class:`ForkServer`, so :meth:`start` must be called before the process
+    starts any thread.
+    '''
+
+    # Seconds a worker must have run for its restart delay to be reset
+    STABLE_SECONDS = 60
+
+    def __init__(self, args, hosts, records=None, exporter=None,
+                 target=run_shard):
+        '''args:
+            hosts (list): (hostname, port) of every switch.
+            records (dict): { <hostname> : { <interface> : record } } of
+                the baselines to start from.
+            exporter (object): A :class:`MetricsExporter` given the
+                :class:`PollResult` of each poll.
+            target (function): Run by each worker, as :func:`run_shard`.
         '''
 
-        log("Entering {0}.".format(sys._getframe().f_code.co_name),
-            level='DEBUG')
+        self.args = args
+        self.shards = [[] for _ in range(args.processes)]
+        for hostname, port in hosts:
+            self.shards[shard_of(hostname, args.processes)].append(
+                (hostname, port))
+        self.records = dict(records or {})
+        self.exporter = exporter
+        self.target = target
+        # { <shard> : ShardWorker }
+        self.workers = {}
+        # { <shard> : (monotonic time due, delay) } of the dead workers
+        self.restarts = {}
+        # { <shard> : seconds to wait before its next restart }
+        self.delays = {}
+        self.deaths = 0
+        self.forks = ForkServer(target)
 
-        self.response = response
+    def start(self):
+        '''Start a worker for each shard with switches.
+        '''
 
-        if not self.link_up_on_prev_poll_:
-            if self.link_up_now:
-                # Recompute base every time the link comes back up
-                log("...came up", level='DEBUG')
-                self.compute_base()
-        elif self.link_up_now:
-            log("...still up", level='DEBUG')
-            self.check_power(out=out)
-        else:
-            # Reset everything if the link goes down
-            log("...went down", level='DEBUG')
-            self.reset_log()
+        self.forks.start()
+        for shard, hosts in enumerate(self.shards):
+            if hosts:
+                self._start(shard)
+        log("Polling {0} switches with {1} worker processes".format(
+            sum(len(hosts) for hosts in self.shards), len(self.workers)))
+        return self
 
-        self.link_up_on_prev_poll_ = self.link_up_now
+    def _start(self, shard):
+        hosts = self.shards[shard]
+        records = dict((hostname, self.records[hostname])
+                       for hostname, _ in hosts if hostname in self.records)
+        pid, receiver = self.forks.spawn('dom-{0}'.format(shard),
+                                         (self.args, shard, hosts),
+                                         {'records': records})
+        self.workers[shard] = ShardWorker(pid, receiver)
 
-    def compute_base(self):
-        '''Compute the base DOM info against which we compare on subsequent
-        runs
+    def handle(self, message):
+        '''Act on a message from a worker.
         '''
 
-        log("Entering {0}.".format(sys._getframe().f_code.co_name),
-            level='DEBUG')
-        self.reset_log()
-        self.base_timestamp_ = _time_string()
+        kind, shard = message[:2]
+        if kind == 'notify':
+            dispatch(message[2])
+        elif kind == 'polled':
+            results, errors, changed = message[2:]
+            if self.exporter is not None:
+                for result in results:
+                    self.exporter.merge(result)
+            with COUNTERS_LOCK:
+                EAPI_ERRORS.update(errors)
+            for hostname, updates in changed.items():
+                records = dict(self.records.get(hostname, {}))
+                for interface, record in updates.items():
+                    if record is None:
+                        records.pop(interface, None)
+                    else:
+                        records[interface] = record
+                self.records[hostname] = records
+        else:
+            log("Unknown message {0!r} from worker {1}".format(kind, shard),
+                level='WARNING')
 
-        if not self.response:
-            # No data for this interface
-            return
+    def _receive(self, shard):
+        '''Handle the messages waiting from a worker.
+        returns:
+            bool: False once its pipe is closed.
+        '''
 
-        tx_power = self.response.get(u'txPower', None)
-        rx_power = self.response.get(u'rxPower', None)
+        connection = self.workers[shard].connection
+        try:
+            while connection.poll():
+                self.handle(connection.recv())
+        except (EOFError, IOError):
+            return False
+        return True
 
-        if tx_power is None and rx_power is None:
-            # No optical data for this interface
-            return
+    def run_once(self, timeout=1.0):
+        '''Handle the messages of the workers for up to timeout seconds,
+        then restart those that died.
+        '''
 
-        # If an interface is shut then it will report a DOM value of
-        # '-inf'. In this case, do not record DOM info.
-        # with that DOM info
+        shards = dict((worker.connection.fileno(), shard)
+                      for shard, worker in self.workers.items())
+        try:
+            ready = select.select(shards.keys(), [], [], timeout)[0]
+        except select.error:
+            # Interrupted by a signal
+            ready = []
+        for fileno in ready:
+            self._receive(shards[fileno])
+        self._check()
 
-        if tx_power is "N/A":
-            tx_power = None
-        if rx_power is "N/A":
-            rx_power = None
+    def _check(self):
+        now = monotonic()
+        exited = dict(self.forks.reap())
+        for shard, worker in self.workers.items():
+            if worker.pid not in exited:
+                continue
+            # What it sent before dying
+            self._receive(shard)
+            worker.connection.close()
+            del self.workers[shard]
+            self.deaths += 1
 
-        if tx_power is not None:
-            log('%s: new TX base: %.4f' % (self.interface,
-                                           tx_power), level='INFO')
-            self.base_power_['tx'] = tx_power
+            delay = WORKER_RESTART_DELAY
+            if now - worker.started < self.STABLE_SECONDS:
+                delay = min(self.delays.get(shard, 0) * 2 or delay,
+                            WORKER_RESTART_MAX_DELAY)
+            self.delays[shard] = delay
+            self.restarts[shard] = now + delay
+            log("Worker {0} (pid {1}) exited with code {2}, restarting it "
+                "in {3} seconds".format(shard, worker.pid,
+                                        exited[worker.pid], delay),
+                level='WARNING')
 
-        if rx_power is not None:
-            log('%s: new RX base: %.4f' % (self.interface,
-                                           rx_power), level='INFO')
-            self.base_power_['rx'] = rx_power
+        for shard, due in self.restarts.items():
+            if due <= now:
+                del self.restarts[shard]
+                self._start(shard)
 
-    def check_power(self, out=sys.stdout):
-        '''Check the status of the optics power levels
+    def send_signal(self, signum):
+        '''Send a signal to every worker.
         '''
 
-        log("Entering {0}.".format(sys._getframe().f_code.co_name),
-            level='DEBUG')
+        for worker in self.workers.values():
+            try:
+                os.kill(worker.pid, signum)
+            except OSError:
+                pass
 
-        self.poll_iterations_ += 1
-        message_logged = False
+    def stop(self, timeout=5):
+        '''Stop the workers, handling what they send until they exit, and
+        kill those still running after timeout seconds.
+        '''
 
-        if USE_CUMULATIVE_AVERAGE:
-            if self.base_power_['rx']:
-                rx_base_power = self.base_power_['rx']
-                rx_power = self.response.get(u'rxPower', None)
-                self.base_power_['rx'] = \
-                    rx_base_power + (rx_power - rx_base_power) / self.poll_iterations_
+        self.send_signal(signal.SIGTERM)
+        deadline = monotonic() + timeout
+        running = dict((worker.pid, shard)
+                       for shard, worker in self.workers.items())
+        killed = False
+        while running:
+            for shard in running.values():
+                self._receive(shard)
+            for pid, _ in self.forks.reap():
+                running.pop(pid, None)
+            if running and not killed and monotonic() >= deadline:
+                # SIGTERM is only handled between Python instructions
+                for pid, shard in running.items():
+                    log("Worker {0} (pid {1}) did not exit, killing "
+                        "it".format(shard, pid), level='WARNING')
+                    os.kill(pid, signal.SIGKILL)
+                killed = True
+            if running:
+                time.sleep(0.05)
+        for shard, worker in self.workers.items():
+            self._receive(shard)
+            worker.connection.close()
+        self.forks.stop()
+        self.workers = {}
+        self.restarts = {}
 
-            if self.base_power_['tx']:
-                tx_base_power = self.base_power_['tx']
-                tx_power = self.response[u'txPower']
-                self.base_power_['tx'] = \
-                    tx_base_power + (tx_power - tx_base_power) / self.poll_iterations_
+def supervise(args):
+    '''Poll the inventory from args.processes worker processes.
+    '''
 
-        if self.base_power_['rx']:
-            max_rx_power = self.base_power_['rx'] + TOLERANCE
-            min_rx_power = self.base_power_['rx'] - TOLERANCE
-            rx_power = self.response.get[u'rxPower']
-            log('rxBase: {0}: rxPower: {1}'.format(self.base_power_['rx'],
-                                                   rx_power), level='DEBUG')
-            if not min_rx_power < rx_power < max_rx_power:
-                db_change = round(rx_power - self.base_power_['rx'], 4)
-                vendor_sn = self.response[u'vendorSn'].rstrip()
-                notify('TRANSCEIVER_RX_POWER_CHANGE, {0} ({1}) RX power level '
-                       'has changed by {2} dBm from baseline {3} dBm ({4}) '
-                       ' to {5} dBm ({6})'
-                       .format(self.interface,
-                               vendor_sn,
-                               db_change,
-                               round(self.base_power_['rx'], 4),
-                               self.base_timestamp_,
-                               round(rx_power, 4),
-                               _time_string()),
-                       level='WARNING',
-                       uptime=self.uptime,
-                       out=out)
-                #if DEBUG:
-                #if out != sys.stdout:
-                #    out.write("Rx change")
-            message_logged = True
+    checkpoint = None
+    records = {}
+    if args.checkpoint:
+        checkpoint = Checkpoint(args.checkpoint,
+                                interval=args.checkpoint_interval)
+        records = checkpoint.load()
 
-        if self.base_power_['tx']:
-            max_tx_power = self.base_power_['tx'] + TOLERANCE
-            min_tx_power = self.base_power_['tx'] - TOLERANCE
-            tx_power = self.response[u'txPower']
-            log('txBase: {0}: txPower: {1}'.format(self.base_power_['tx'],
-                                                   tx_power), level='DEBUG')
-            if not min_tx_power < tx_power < max_tx_power:
-                db_change = round(tx_power - self.base_power_['tx'], 4)
-                vendor_sn = self.response[u'vendorSn'].rstrip()
-                notify('TRANSCEIVER_TX_POWER_CHANGE, {0} ({1}) TX power level '
-                       'has changed by {2} dBm from baseline {3} dBm ({4}) '
-                       ' to {5} dBm ({6})'
-                       .format(self.interface,
-                               vendor_sn,
-                               db_change,
-                               round(self.base_power_['tx'], 4),
-                               self.base_timestamp_,
-                               round(tx_power, 4),
-                               _time_string()),
-                       level='WARNING',
-                       uptime=self.uptime,
-                       out=out)
-                #if DEBUG:
-                #out.write("Tx change")
-            message_logged = True
+    exporter = metrics = None
+    if args.metrics_port:
+        exporter = MetricsExporter()
+    supervisor = Supervisor(args, read_inventory(args.inventory),
+                            records=records, exporter=exporter)
+    # Each worker logs its own stage timings and profiles itself
+    signal.signal(signal.SIGUSR1,
+                  lambda signum, frame: supervisor.send_signal(signum))
+    # Forked before the sinks and the metrics server start their threads: a
+    # lock held by another thread when the process forks stays held in the
+    # worker.  Workers restarted later are forked by the fork server.
+    supervisor.start()
+    start_sinks(args)
+    if exporter is not None:
+        metrics = MetricsServer(exporter, args.metrics_address,
+                                args.metrics_port).start()
 
-        if not message_logged:
-            self.logging_polls_ = 0
-        else:
-            self.logging_polls_ += 1
+    log("Started up successfully. Entering main loop...")
 
-        if REBASE_POLL_LIMIT and self.logging_polls_ >= REBASE_POLL_LIMIT:
-            log('%s: recomputing base' % self.interface, level='INFO')
-            self.compute_base()
+    try:
+        while True:
+            supervisor.run_once()
+            if checkpoint is not None and checkpoint.due():
+                checkpoint.write(supervisor.records)
+    finally:
+        supervisor.stop()
+        if metrics is not None:
+            metrics.stop()
+        if checkpoint is not None:
+            checkpoint.write(supervisor.records)
+        stop_sinks()
 
-def link_up(interface):
-    '''Determine link status
+def make_transport(args):
+    '''Return the :class:`KeepAliveTransport` shared by every switch.
     '''
-    log("Entering {0}.".format(sys._getframe().f_code.co_name), level='DEBUG')
-    is_link_up = False
-    if interface[u'linkStatus'] == u'connected':
-        is_link_up = True
 
-    return is_link_up
+    # The timeout bounds each eAPI request so an unreachable switch only
+    # ties up its worker for that long.
+    return KeepAliveTransport(secure=(PROTOCOL == 'https'),
+                              timeout=args.timeout,
+                              max_connections=args.eapi_connections,
+                              verify=args.verify_cert,
+                              unix_socket=args.eapi_socket
+                              if PROTOCOL == 'unix' else None)
+
+def make_switches(args, transport, hosts=None):
+    '''Create the switches to poll as the command line configures them.
+    args:
+        transport (object): The :class:`KeepAliveTransport` they share.
+        hosts (list): (hostname, port) of each switch. (Default: those of
+            the inventory, or HOSTNAME)
+    returns:
+        list: The :class:`Switch` objects.
+    '''
+
+    options = {'batched': args.batched, 'transport': transport,
+               'lanes': args.per_lane, 'stream': args.stream}
+    if hosts is not None:
+        switches = [Switch(hostname, port=port, **options)
+                    for hostname, port in hosts]
+    elif args.inventory:
+        switches = load_inventory(args.inventory, **options)
+    else:
+        switches = [Switch(HOSTNAME, **options)]
+
+    if args.engine == 'vector':
+        for switch in switches:
+            switch.engine = VectorEngine()
+    if args.adaptive:
+        for switch in switches:
+            switch.scheduler = PollScheduler(args.poll_interval,
+                                             args.max_poll_interval)
+    if args.static_refresh:
+        for switch in switches:
+            switch.cache = StaticCache(args.static_refresh)
+    if args.history and switches:
+        if not os.path.isdir(args.history):
+            os.makedirs(args.history)
+        for switch in switches:
+            switch.history = SampleRing(history_file(args.history,
+                                                     switch.hostname),
+                                        size=args.history_size)
+    if args.record and switches:
+        if not os.path.isdir(args.record):
+            os.makedirs(args.record)
+        for switch in switches:
+            switch.recorder = PollRecorder(poll_file(args.record,
+                                                     switch.hostname))
+    return switches
+
+def close_switches(switches):
+    '''Close the history and recording files of the switches.
+    '''
+
+    for switch in switches:
+        if switch.history is not None:
+            switch.history.close()
+        if switch.recorder is not None:
+            switch.recorder.close()
+
+def start_sinks(args):
+    '''Start delivering notifications as the command line configures:
+    the SNMP notifier, the sinks, the coalescer and the dispatch queue.
+    '''
+
+    global SNMP_NOTIFIER
+    if SNMP and not SNMP_EXEC:
+        SNMP_NOTIFIER = SnmpNotifier(SNMP_SETTINGS)
+        if not SNMP_NOTIFIER.native:
+            log("Python Crypto module not found: sending SNMP {0} informs "
+                "with snmptrap".format(SNMP_SETTINGS['seclevel']),
+                level='WARNING')
+        SNMP_NOTIFIER.start()
+
+    global REMOTE_SYSLOG_SINK
+    if args.remote_syslog:
+        REMOTE_SYSLOG_SINK = RemoteSyslogSink(
+            args.remote_syslog, buffer_size=args.remote_syslog_buffer,
+            ca_certs=args.remote_syslog_ca).start()
+
+    global SINKS
+    SINKS = default_sinks(rate=args.rate_limit, burst=args.rate_limit_burst)
+
+    global COALESCER
+    if args.coalesce_threshold:
+        COALESCER = NotificationCoalescer(threshold=args.coalesce_threshold,
+                                          group=args.coalesce_group)
+
+    global DISPATCHER
+    if args.dispatch_workers:
+        DISPATCHER = NotificationDispatcher(SINKS,
+                                            workers=args.dispatch_workers,
+                                            queue_size=args.dispatch_queue_size,
+                                            overflow=args.dispatch_overflow)
+        DISPATCHER.start()
+
+def stop_sinks():
+    '''Deliver the notifications still queued and stop the threads
+    delivering them.
+    '''
+
+    if DISPATCHER is not None:
+        DISPATCHER.stop()
+    if SNMP_NOTIFIER is not None:
+        SNMP_NOTIFIER.stop()
+    if REMOTE_SYSLOG_SINK is not None:
+        REMOTE_SYSLOG_SINK.stop()
+
+def make_profiler(args):
+    '''Return the :class:`SamplingProfiler` of --profile, or None.
+    '''
+
+    if not args.profile:
+        return None
+    if not os.path.isdir(args.profile):
+        os.makedirs(args.profile)
+    return SamplingProfiler(args.profile, args.profile_seconds)
 
 def main(args):
     '''Do Stuff.
     '''
 
-    log("Entering {0}.".format(sys._getframe().f_code.co_name), level='DEBUG')
+    trace()
 
-    log("Started up successfully. Entering main loop...")
+    if args.processes > 1:
+        supervise(args)
+        return
 
-    switch = Server("{0}://{1}:{2}@{3}:{4}/command-api"\
-        .format(PROTOCOL, USERNAME, PASSWORD, HOSTNAME, PORT))
-    interfaces = {}
-    while True:
-        interfaces = get_interfaces(switch)
-        response = switch.runCmds(1, ["show interfaces {0} transceiver"
-                                      .format(', '.join(interfaces.keys())),
-                                      "show version"])
-        dominfo = response[0][u'interfaces']
-        uptime = int(response[1][u'bootupTimestamp'])
+    # One pool of keep-alive connections shared by every switch.
+    transport = make_transport(args)
+    switches = make_switches(args, transport)
+    if not switches:
+        log("No switches found in {0}".format(args.inventory), error=True)
+        return
 
-        for interface in interfaces.keys():
-            check_interfaces(uptime, str(interface), interfaces[interface],
-                             dominfo[interface])
+    start_sinks(args)
 
-        log("---sleeping for {0} seconds.".format(args.poll_interval),
-            level='DEBUG')
-        time.sleep(args.poll_interval)
+    metrics = None
+    if args.metrics_port:
+        exporter = MetricsExporter()
+        for switch in switches:
+            switch.exporter = exporter
+        metrics = MetricsServer(exporter, args.metrics_address,
+                                args.metrics_port).start()
+
+    signal.signal(signal.SIGUSR1, on_usr1(make_profiler(args)))
+
+    poller = Poller(switches, workers=args.workers)
+
+    checkpoint = None
+    if args.checkpoint:
+        checkpoint = Checkpoint(args.checkpoint,
+                                interval=args.checkpoint_interval)
+        checkpoint.restore(switches, tag=poller.tag)
+
+    ticks = TickScheduler(switches, args.poll_interval, jitter=args.jitter)
+
+    log("Started up successfully. Entering main loop...")
 
-if __name__ == '__main__':
-    #TODO: This code is for use on systems which fail when self-signed certs
-    #      are used.
     try:
-        _create_unverified_https_context = ssl._create_unverified_context
-    except AttributeError:
-        # Legacy Python that doesn't verify HTTPS certificates by default
-        pass
-    else:
-        # Handle target environment that doesn't support HTTPS verification
-        ssl._create_default_https_context = _create_unverified_https_context
+        while True:
+            poller.run_cycle(ticks.wait())
+            if checkpoint is not None:
+                checkpoint.save(switches)
 
+            if DISPATCHER is not None:
+                log("Notification queue: {0}", DISPATCHER.stats(),
+                    level='DEBUG')
+    finally:
+        poller.close()
+        if metrics is not None:
+            metrics.stop()
+        if checkpoint is not None:
+            checkpoint.save(switches, force=True)
+        transport.close()
+        close_switches(switches)
+        stop_sinks()
+
+if __name__ == '__main__':
     ARGS = parse_cmd_line()
     set_proc_name('dom')
 
@@ -774,8 +6733,33 @@ if __name__ == '__main__':
         pprint(ARGS)
         sys.exit(0)
 
+    if ARGS.history_query:
+        if ':' in ARGS.history_query:
+            QUERY_HOST, QUERY_INTERFACE = ARGS.history_query.split(':', 1)
+        else:
+            QUERY_HOST, QUERY_INTERFACE = HOSTNAME, ARGS.history_query
+        if not os.path.exists(history_file(ARGS.history, QUERY_HOST)):
+            print "No history for {0} in {1}".format(QUERY_HOST, ARGS.history)
+            sys.exit(1)
+        RING = SampleRing(history_file(ARGS.history, QUERY_HOST),
+                          size=ARGS.history_size)
+        show_history(RING, QUERY_INTERFACE, ARGS.history_window)
+        RING.close()
+        sys.exit(0)
+
+    if ARGS.replay:
+        # The INFO messages of rebases would flood syslog
+        syslog.setlogmask(syslog.LOG_UPTO(syslog.LOG_WARNING))
+        show_replay(sweep(ARGS.replay, replay_settings(ARGS), ARGS.sweep,
+                          change=ARGS.replay_change), ARGS.sweep)
+        sys.exit(0)
+
     elif ARGS.test == 'trap':
-        send_trap(SNMP_SETTINGS, '', uptime='1449684931', test='trap')
+        if ARGS.snmptrap:
+            send_trap(SNMP_SETTINGS, '', uptime='1449684931', test='trap')
+        else:
+            SnmpNotifier(SNMP_SETTINGS).send('', uptime='1449684931',
+                                             test='trap')
         sys.exit(0)
 
     try:
@@ -0,0 +1,217 @@
+"""Benchmark main()'s poll loop against a fleet of simulated switches (see
+test/lib/eapisim.py): polls per second, per-poll latency percentiles, and
+CPU time and memory per port.
+
+    python test/bench/bench_fleet.py [--switches N] [--ports N] [--lanes N]
+        [--latency SECONDS] [--drift DBM] [--jump P] [--flap P]
+        [--duration SECONDS] [--interval SECONDS] [-- DOM_OPTIONS ...]
+
+Each poll cycle starts as soon as the previous one has finished, unless an
+--interval is given.  Without DOM_OPTIONS, the default polling is compared
+with --batched, --stream and --engine vector.  The simulated switches run in
+a separate process so only dom.py's own CPU time is counted.
+"""
+
+import sys
+import os
+import time
+import argparse
+import resource
+import tempfile
+import threading
+import multiprocessing
+import mock
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '../lib'))
+sys.path.append(os.path.join(os.path.dirname(__file__), '../..'))
+
+import dom
+from dom import Poller
+from eapisim import serve_fleet
+
+SCENARIOS = [('default', []),
+             ('batched', ['--batched']),
+             ('stream', ['--stream']),
+             ('vector', ['--batched', '--engine', 'vector'])]
+
+WARMUP_CYCLES = 2
+
+class Finished(Exception):
+    pass
+
+class MeasuredPoller(Poller):
+    """Poller recording the duration of each successful switch poll
+    """
+
+    def __init__(self, *args, **kwargs):
+        Poller.__init__(self, *args, **kwargs)
+        self.durations = []
+        self.errors = 0
+        self.started = []
+        MeasuredPoller.current = self
+
+    def _poll(self, switch):
+        Poller._poll(self, switch)
+        with self.lock:
+            if switch.errors:
+                self.errors += 1
+            else:
+                self.durations.append(switch.last_poll_duration)
+
+    def run_cycle(self, switches=None):
+        self.started = Poller.run_cycle(self, switches)
+        return self.started
+
+def rss():
+    """Resident memory of this process, in bytes
+    """
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * resource.getpagesize()
+    except IOError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+def cpu():
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+def percentile(values, percent):
+    index = int(round(percent / 100.0 * (len(values) - 1)))
+    return sorted(values)[index]
+
+def run(ports, options, args, connection):
+    """Run main() on an inventory of the simulated switches for
+    args.duration seconds after warming up, and send back the measurements.
+    """
+
+    inventory = tempfile.NamedTemporaryFile(delete=False)
+    inventory.write(''.join('127.0.0.1:{0}\n'.format(port)
+                            for port in ports))
+    inventory.close()
+
+    dom.PROTOCOL = 'http'
+    sys.argv = ['dom.py', '--inventory', inventory.name, '--no-checkpoint',
+                '--poll-interval', '0', '--workers', str(len(ports))] + \
+               options
+    dom_args = dom.parse_cmd_line()
+
+    sleep = time.sleep
+    measured = {'cycles': 0}
+    rss_before = rss()
+
+    def pace(seconds):
+        """Stands in for main()'s sleep between cycles
+        """
+        if threading.current_thread().name != 'MainThread':
+            return sleep(seconds)
+        poller = MeasuredPoller.current
+        for result in poller.started:
+            result.wait()
+        if args.interval:
+            sleep(args.interval)
+
+        measured['cycles'] += 1
+        if measured['cycles'] == WARMUP_CYCLES:
+            with poller.lock:
+                poller.durations = []
+                poller.errors = 0
+            measured['start'] = time.time()
+            measured['cpu'] = cpu()
+        elif measured['cycles'] > WARMUP_CYCLES and \
+             time.time() - measured['start'] >= args.duration:
+            measured['elapsed'] = time.time() - measured['start']
+            measured['cpu'] = cpu() - measured['cpu']
+            measured['rss'] = rss() - rss_before
+            raise Finished()
+
+    with mock.patch('dom.Poller', MeasuredPoller), \
+         mock.patch('time.sleep', pace):
+        try:
+            dom.main(dom_args)
+        except Finished:
+            pass
+    os.unlink(inventory.name)
+
+    poller = MeasuredPoller.current
+    measured['durations'] = poller.durations
+    measured['errors'] = poller.errors
+    connection.send(measured)
+
+def measure(ports, options, args):
+    """Run a scenario in its own process, so each starts from a clean
+    interpreter.
+    """
+
+    parent, child = multiprocessing.Pipe()
+    process = multiprocessing.Process(target=run,
+                                      args=(ports, options, args, child))
+    process.start()
+    child.close()
+    try:
+        measured = parent.recv()
+    except EOFError:
+        raise SystemExit('{0} failed'.format(' '.join(options) or 'dom.py'))
+    finally:
+        process.join()
+    return measured
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--switches', type=int, default=8)
+    parser.add_argument('--ports', type=int, default=144)
+    parser.add_argument('--lanes', type=int, default=0)
+    parser.add_argument('--latency', type=float, default=0.0)
+    parser.add_argument('--drift', type=float, default=0.1)
+    parser.add_argument('--jump', type=float, default=0.001)
+    parser.add_argument('--flap', type=float, default=0.001)
+    parser.add_argument('--duration', type=float, default=3.0)
+    parser.add_argument('--interval', type=float, default=0.0)
+    parser.add_argument('options', nargs=argparse.REMAINDER)
+    args = parser.parse_args()
+
+    scenarios = SCENARIOS
+    if args.options:
+        options = [option for option in args.options if option != '--']
+        scenarios = [(' '.join(options), options)]
+
+    fleet, child = multiprocessing.Pipe()
+    simulator = multiprocessing.Process(
+        target=serve_fleet, args=(child, args.switches),
+        kwargs={'ports': args.ports, 'lanes': args.lanes,
+                'latency': args.latency, 'drift': args.drift,
+                'jump': args.jump, 'flap': args.flap})
+    simulator.start()
+    ports = fleet.recv()
+
+    print '{0} switches x {1} ports, {2} lanes, {3:.0f} ms latency, ' \
+          'drift {4} dBm, jump {5}, flap {6}'.format(
+              args.switches, args.ports, args.lanes, args.latency * 1000,
+              args.drift, args.jump, args.flap)
+    print '  {0:10s} {1:>8s} {2:>8s} {3:>8s} {4:>8s} {5:>8s} {6:>11s} ' \
+          '{7:>8s}'.format('', 'polls/s', 'p50 ms', 'p90 ms', 'p99 ms',
+                           'max ms', 'CPU us/port', 'KB/port')
+    try:
+        for label, options in scenarios:
+            measured = measure(ports, options, args)
+            durations = [duration * 1000 for duration
+                         in measured['durations']]
+            polls = len(durations)
+            if not polls:
+                print '  {0:10s} no successful polls ({1} errors)'.format(
+                    label, measured['errors'])
+                continue
+            print '  {0:10s} {1:8.1f} {2:8.2f} {3:8.2f} {4:8.2f} {5:8.2f} ' \
+                  '{6:11.1f} {7:8.2f}{8}'.format(
+                      label, polls / measured['elapsed'],
+                      percentile(durations, 50), percentile(durations, 90),
+                      percentile(durations, 99), max(durations),
+                      measured['cpu'] / (polls * args.ports) * 1e6,
+                      measured['rss'] / 1024.0 / (args.switches * args.ports),
+                      ' ({0} errors)'.format(measured['errors'])
+                      if measured['errors'] else '')
+    finally:
+        fleet.send('stop')
+        simulator.join()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+"""Benchmark the per-interface cost of check_interfaces with debug off, with
+the logging fast path and with the logging it replaced (a frame lookup and
+format for every trace, eager formatting, and an eval of the priority for
+every message logged).
+
+    python test/bench/bench_logging.py [POLLS]
+"""
+
+import sys
+import os
+import timeit
+import syslog
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '../lib'))
+sys.path.append(os.path.join(os.path.dirname(__file__), '../..'))
+
+import dom
+from dom import check_interfaces
+
+PORTS = 64
+
+def legacy_log(msg, *args, **kwargs):
+    """The previous log(): always formats, then filters by level
+    """
+    if args:
+        msg = msg.format(*args)
+    level = kwargs.get('level', 'INFO')
+    if kwargs.get('error'):
+        level = 'ERR'
+    if not dom.DEBUG and level == 'DEBUG':
+        return
+    priority = ''.join(["syslog.LOG_", level])
+    syslog.syslog(eval(priority), msg)
+
+def legacy_trace(*context):
+    """The previous function entry logging
+    """
+    if context:
+        legacy_log("Entering {0} for {1}.".format(
+            sys._getframe(1).f_code.co_name, context[0]), level='DEBUG')
+    else:
+        legacy_log("Entering {0}.".format(sys._getframe(1).f_code.co_name),
+                   level='DEBUG')
+
+def poll(number):
+    """Return (interfaces, dominfo) of a stable switch on a given poll
+    """
+    interfaces = {}
+    dominfo = {}
+    for port in range(PORTS):
+        name = 'Ethernet{0}'.format(port + 1)
+        interfaces[name] = {u'linkStatus': u'connected'}
+        dominfo[name] = {u'rxPower': -2.0 - port % 7 / 10.0,
+                         u'txPower': -1.0 - port % 5 / 10.0,
+                         u'updateTime': 1449776317.0 + number,
+                         u'vendorSn': u'XKE{0:09d}'.format(port)}
+    return interfaces, dominfo
+
+def run(polls):
+    """Seconds per interface evaluated by check_interfaces
+    """
+    status = {}
+    samples = [poll(number) for number in range(polls)]
+
+    def cycle():
+        for interfaces, dominfo in samples:
+            for interface in interfaces:
+                check_interfaces(1449684931, interface,
+                                 interfaces[interface], dominfo[interface],
+                                 status=status)
+
+    # Only the per-poll checks, not the new baselines of the first poll
+    cycle()
+    # Keep the baselines from being recomputed by REBASE_POLL_LIMIT
+    dom.REBASE_POLL_LIMIT = 0
+    elapsed = min(timeit.repeat(cycle, number=1, repeat=5))
+    dom.REBASE_POLL_LIMIT = 3
+    return elapsed / (polls * PORTS)
+
+def main(polls):
+    syslog.openlog('dom-bench')
+    dom.SYSLOG = False
+    dom.DEBUG = False
+
+    current = run(polls)
+    log, trace = dom.log, dom.trace
+    dom.log, dom.trace = legacy_log, legacy_trace
+    try:
+        legacy = run(polls)
+    finally:
+        dom.log, dom.trace = log, trace
+
+    print 'check_interfaces, debug off, {0} ports x {1} polls'.format(PORTS,
+                                                                      polls)
+    print '  legacy logging:  {0:6.2f} us per interface'.format(legacy * 1e6)
+    print '  fast path:       {0:6.2f} us per interface ({1:.0f}% less)'.format(
+        current * 1e6, 100 * (1 - current / legacy))
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200)
@@ -0,0 +1,115 @@
+"""Benchmark the memory held per interface between polls: the reactor state
+against the layout it replaced (a __dict__ per reactor, nested baseline dicts,
+a formatted timestamp and the last transceiver response).
+
+    python test/bench/bench_memory.py [PORTS]
+"""
+
+import sys
+import os
+import time
+import mock
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '../lib'))
+sys.path.append(os.path.join(os.path.dirname(__file__), '../..'))
+
+import dom
+from dom import check_interfaces
+
+class LegacyReactor(object):
+    """The attributes XcvrStatusReactor kept before it used __slots__
+    """
+
+    def __init__(self, interface, hostname, response):
+        self.interface = interface
+        self.hostname = hostname
+        self.name = '{0} {1}'.format(hostname, interface)
+        self.response = response
+        self.base_power_ = {'rx': response[u'rxPower'],
+                            'tx': response[u'txPower']}
+        self.base_timestamp_ = time.strftime('%Y-%m-%d %H:%M:%S')
+        self.uptime = 1449684931
+        self.link_up_now = True
+        self.link_up_on_prev_poll_ = True
+        self.poll_iterations_ = 12
+        self.logging_polls_ = 0
+
+def deep_size(obj, seen):
+    """Size of obj and everything it references not already in seen
+    """
+    if id(obj) in seen or isinstance(obj, type):
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(deep_size(key, seen) + deep_size(value, seen)
+                    for key, value in obj.items())
+    elif isinstance(obj, (list, tuple, set)):
+        size += sum(deep_size(item, seen) for item in obj)
+    if hasattr(obj, '__dict__'):
+        size += deep_size(vars(obj), seen)
+    for slot in getattr(type(obj), '__slots__', ()):
+        size += deep_size(getattr(obj, slot, None), seen)
+    return size
+
+def poll(ports):
+    """Return (interfaces, dominfo) of a poll, as decoded from eAPI
+    """
+    interfaces = {}
+    dominfo = {}
+    for port in range(ports):
+        name = u'Ethernet{0}/{1}'.format(port // 4 + 1, port % 4 + 1)
+        interfaces[name] = {u'linkStatus': u'connected'}
+        dominfo[name] = {u'mediaType': u'100GBASE-SR4',
+                         u'rxPower': -2.0 - port % 7 / 10.0,
+                         u'temperature': 31.5,
+                         u'txBias': 6.75,
+                         u'txPower': -1.0 - port % 5 / 10.0,
+                         u'updateTime': 1449776317.0992758,
+                         u'vendorSn': u'XKE{0:09d}'.format(port),
+                         u'voltage': 3.2868}
+    return interfaces, dominfo
+
+def main(ports):
+    interfaces, dominfo = poll(ports)
+
+    # Names and constants are shared with the poll output either way
+    shared = set([id(None), id(True), id(False)])
+    for interface in interfaces:
+        shared.add(id(interface))
+        shared.add(id(str(interface)))
+
+    legacy = dict((str(interface), LegacyReactor(str(interface), 'leaf1',
+                                                 dominfo[interface]))
+                  for interface in interfaces)
+    legacy_size = deep_size(legacy, set(shared))
+
+    status = {}
+    with mock.patch('dom.log'):
+        for _ in range(3):
+            for interface in interfaces:
+                check_interfaces(1449684931, str(interface),
+                                 interfaces[interface], dominfo[interface],
+                                 status=status, hostname='leaf1')
+    size = deep_size(status, set(shared))
+
+    print '{0} ports'.format(ports)
+    print '  legacy layout:   {0:8d} bytes ({1:.0f} per port)'.format(
+        legacy_size, float(legacy_size) / ports)
+    print '  slots layout:    {0:8d} bytes ({1:.0f} per port)'.format(
+        size, float(size) / ports)
+
+    if dom.numpy is not None:
+        engine = dom.VectorEngine(capacity=ports)
+        with mock.patch('dom.log'):
+            engine.update(1449684931, interfaces, dominfo, hostname='leaf1')
+        arrays = sum(array.nbytes for array in
+                     [engine.base, engine.base_time, engine.polls,
+                      engine.logging_polls, engine.link_up])
+        lists = deep_size([engine.index, engine.keys, engine.names,
+                           engine.hostnames, engine.lanes], set(shared))
+        print '  vector engine:   {0:8d} bytes ({1:.0f} per port)'.format(
+            arrays + lists, float(arrays + lists) / ports)
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 4096)
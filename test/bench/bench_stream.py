@@ -0,0 +1,94 @@
+"""Benchmark decoding a large chassis' eAPI response whole, as jsonrpclib
+does, against streaming it with JsonStream: the time until the first
+interface can be checked, the total decode time, and the memory held by the
+body and decoded output.
+
+    python test/bench/bench_stream.py [PORTS]
+"""
+
+import sys
+import os
+import json
+import time
+from StringIO import StringIO
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '../lib'))
+sys.path.append(os.path.join(os.path.dirname(__file__), '../..'))
+
+from dom import EapiStream, JsonStream, stream_records, _trim_transceiver
+
+def response(ports):
+    """Return the JSON-RPC body of 'show interfaces transceiver' with the
+    detail EOS reports for each interface
+    """
+    interfaces = {}
+    for port in range(ports):
+        name = 'Ethernet{0}/{1}'.format(port // 36 + 1, port % 36 + 1)
+        info = {'rxPower': -2.0 - port % 7 / 10.0,
+                'txPower': -1.0 - port % 5 / 10.0,
+                'vendorSn': 'XKE{0:09d}'.format(port),
+                'updateTime': 1449776317.0,
+                'temperature': 31.5, 'voltage': 3.29, 'txBias': 6.9,
+                'vendorName': 'Arista Networks', 'vendorPn': 'QSFP-100G-LR4',
+                'vendorRev': '20', 'mediaType': '100GBASE-LR4',
+                'mfgDate': '2015-11-30', 'displayName': name,
+                'details': {}}
+        for field in ('temperature', 'voltage', 'txBias', 'txPower',
+                      'rxPower'):
+            info['details'][field] = {'highAlarm': 3.5, 'highWarn': 2.5,
+                                      'lowAlarm': -13.3, 'lowWarn': -10.0,
+                                      'unit': 'dBm'}
+        interfaces[name] = info
+    return json.dumps({'jsonrpc': '2.0', 'id': '1',
+                       'result': [{'interfaces': interfaces}]})
+
+def sizeof(value):
+    """Approximate bytes held by a decoded JSON value
+    """
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(sizeof(key) + sizeof(item)
+                    for key, item in value.items())
+    elif isinstance(value, list):
+        size += sum(sizeof(item) for item in value)
+    return size
+
+def whole(body):
+    """(seconds to the first interface, total seconds, bytes held)
+    """
+    start = time.time()
+    data = StringIO(body).read()
+    output = json.loads(data)[u'result'][0][u'interfaces']
+    first = time.time()
+    for interface in output:
+        pass
+    return first - start, time.time() - start, len(data) + sizeof(output)
+
+def streamed(body):
+    """(seconds to the first interface, total seconds, bytes held)
+    """
+    times = []
+
+    def record(interface, info, outputs):
+        if not times:
+            times.append(time.time())
+
+    start = time.time()
+    stream = JsonStream(StringIO(body).read)
+    output = EapiStream._decode(stream, [stream_records(
+        u'interfaces', _trim_transceiver, record)])[0][u'interfaces']
+    return (times[0] - start, time.time() - start,
+            len(stream.buffer) + sizeof(output))
+
+def main(ports):
+    body = response(ports)
+    print 'show interfaces transceiver, {0} ports ({1} KB)'.format(
+        ports, len(body) // 1024)
+    for label, decode in [('whole:   ', whole), ('streamed:', streamed)]:
+        first, total, held = min(decode(body) for _ in range(5))
+        print '  {0} first interface {1:7.2f} ms, all {2:7.2f} ms, ' \
+              '{3:6d} KB held'.format(label, first * 1000, total * 1000,
+                                      held // 1024)
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 576)
@@ -0,0 +1,151 @@
+"""Benchmark polling a simulated switch over each eAPI transport: HTTPS, HTTPS
+with a new connection (and TLS handshake) every poll, plain HTTP, and the
+Unix domain socket used on the switch itself with --transport unix.  The
+per-poll latency percentiles and CPU time per poll of dom.py are compared.
+
+    python test/bench/bench_transport.py [--ports N] [--lanes N]
+        [--latency SECONDS] [--polls N]
+
+The simulated switch runs in a separate process so only dom.py's own CPU
+time is counted.  HTTPS needs the openssl command to make a certificate;
+without it only HTTP and the Unix socket are compared.
+"""
+
+import sys
+import os
+import shutil
+import argparse
+import resource
+import tempfile
+import subprocess
+import multiprocessing
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '../lib'))
+sys.path.append(os.path.join(os.path.dirname(__file__), '../..'))
+
+from dom import Switch, KeepAliveTransport
+from eapisim import EapiSimulator, UnixEapiSimulator
+
+# (label, protocol, new connection every poll)
+SCENARIOS = [('https', 'https', False),
+             ('https new', 'https', True),
+             ('http', 'http', False),
+             ('unix', 'unix', False)]
+
+WARMUP_POLLS = 3
+
+def certificate(directory):
+    """Make a self-signed certificate and key in one PEM file.
+    returns:
+        str: The file name, or None without openssl.
+    """
+    certfile = os.path.join(directory, 'eapi.pem')
+    try:
+        subprocess.check_call(['openssl', 'req', '-x509', '-newkey',
+                               'rsa:2048', '-nodes', '-days', '1',
+                               '-subj', '/CN=localhost',
+                               '-keyout', certfile, '-out', certfile],
+                              stdout=open(os.devnull, 'w'),
+                              stderr=subprocess.STDOUT)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return certfile
+
+def serve(connection, directory, certfile, **kwargs):
+    """Serve the same simulated switch over each transport until told to
+    stop, sending back where each listens.
+    """
+    servers = {'http': EapiSimulator(**kwargs).start(),
+               'unix': UnixEapiSimulator(os.path.join(directory,
+                                                      'command-api.sock'),
+                                         **kwargs).start()}
+    if certfile:
+        servers['https'] = EapiSimulator(certfile=certfile, **kwargs).start()
+    connection.send(dict((protocol, server.server_address)
+                         for protocol, server in servers.items()))
+    connection.recv()
+    for server in servers.values():
+        server.stop()
+
+def cpu():
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+def percentile(values, percent):
+    index = int(round(percent / 100.0 * (len(values) - 1)))
+    return sorted(values)[index]
+
+def measure(protocol, address, reconnect, polls):
+    """Poll the switch at address, as main() does.
+    returns:
+        tuple: (poll durations, CPU seconds) after warming up.
+    """
+
+    if protocol == 'unix':
+        transport = KeepAliveTransport(unix_socket=address)
+        switch = Switch('localhost', protocol='unix', batched=True,
+                        transport=transport)
+    else:
+        transport = KeepAliveTransport(secure=(protocol == 'https'))
+        switch = Switch(address[0], port=address[1], protocol=protocol,
+                        batched=True, transport=transport)
+
+    durations = []
+    for poll in range(WARMUP_POLLS + polls):
+        if poll == WARMUP_POLLS:
+            start = cpu()
+        switch.poll()
+        if switch.errors:
+            raise SystemExit('{0} poll failed'.format(protocol))
+        if reconnect:
+            transport.close()
+        if poll >= WARMUP_POLLS:
+            durations.append(switch.last_poll_duration)
+    used = cpu() - start
+    transport.close()
+    return durations, used
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--ports', type=int, default=64)
+    parser.add_argument('--lanes', type=int, default=0)
+    parser.add_argument('--latency', type=float, default=0.0)
+    parser.add_argument('--polls', type=int, default=200)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    certfile = certificate(directory)
+    server, child = multiprocessing.Pipe()
+    simulator = multiprocessing.Process(
+        target=serve, args=(child, directory, certfile),
+        kwargs={'ports': args.ports, 'lanes': args.lanes,
+                'latency': args.latency, 'jump': 0, 'flap': 0})
+    simulator.start()
+    addresses = server.recv()
+
+    print '1 switch x {0} ports, {1} lanes, {2:.0f} ms latency, {3} ' \
+          'polls'.format(args.ports, args.lanes, args.latency * 1000,
+                         args.polls)
+    print '  {0:10s} {1:>8s} {2:>8s} {3:>8s} {4:>8s} {5:>12s}'.format(
+        '', 'p50 ms', 'p90 ms', 'p99 ms', 'max ms', 'CPU ms/poll')
+    try:
+        for label, protocol, reconnect in SCENARIOS:
+            if protocol not in addresses:
+                print '  {0:10s} skipped: openssl not found'.format(label)
+                continue
+            durations, used = measure(protocol, addresses[protocol],
+                                      reconnect, args.polls)
+            durations = [duration * 1000 for duration in durations]
+            print '  {0:10s} {1:8.2f} {2:8.2f} {3:8.2f} {4:8.2f} ' \
+                  '{5:12.3f}'.format(label, percentile(durations, 50),
+                                     percentile(durations, 90),
+                                     percentile(durations, 99),
+                                     max(durations),
+                                     used / len(durations) * 1000)
+    finally:
+        server.send('stop')
+        simulator.join()
+        shutil.rmtree(directory)
+
+if __name__ == '__main__':
+    main()
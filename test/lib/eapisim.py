@@ -0,0 +1,375 @@
+"""Simulated Arista switches answering the eAPI commands dom.py polls, for
+benchmarks and for trying dom.py without a switch.
+
+    python test/lib/eapisim.py [--switches N] [--ports N] [--lanes N]
+        [--latency SECONDS] [--drift DBM] [--jump P] [--flap P]
+
+prints the port each simulated switch listens on (plain HTTP, any username
+and password) and serves until interrupted.  The servers also speak HTTPS
+given a certificate, or listen on a Unix domain socket as eAPI does on the
+switch itself.
+"""
+
+import os
+import sys
+import ssl
+import json
+import socket
+import time
+import random
+import argparse
+import threading
+from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+from SocketServer import BaseServer, ThreadingMixIn, UnixStreamServer
+
+PORTS_PER_LINECARD = 36
+
+class SimulatedSwitch(object):
+    """The links and optics of a switch.  Each time its transceivers are
+    read the power levels of every optic drift, occasionally jump, and links
+    occasionally flap.
+    """
+
+    def __init__(self, ports=64, lanes=0, drift=0.1, jump=0.001, flap=0.001,
+                 empty=0.1, refresh=0, seed=0):
+        """args:
+            ports (int): Number of Ethernet interfaces.
+            lanes (int): Lanes of every optic, 0 for single-lane optics.
+            drift (float): Standard deviation of the change in each power
+                level between readings, in dBm.
+            jump (float): Probability of a power level jumping 5 dBm.
+            flap (float): Probability of a link changing state.
+            empty (float): Fraction of interfaces without an optic.
+            refresh (float): Seconds between readings, the last reading
+                (and its updateTime) being repeated in between.
+            seed (int): Seed of the random patterns.
+        """
+
+        self.rand = random.Random(seed)
+        self.lanes = lanes
+        self.drift = drift
+        self.jump = jump
+        self.flap = flap
+        self.refresh = refresh
+        self.boot_time = float(int(time.time()) - 86400)
+        self.update_time = 0.0
+        self.lock = threading.Lock()
+
+        self.names = ['Ethernet{0}/{1}'.format(
+            port // PORTS_PER_LINECARD + 1, port % PORTS_PER_LINECARD + 1)
+                      for port in range(ports)]
+        self.optic = [self.rand.random() >= empty for _ in range(ports)]
+        self.up = [optic and self.rand.random() < 0.9
+                   for optic in self.optic]
+        # [rx, tx] per lane (one lane for single-lane optics)
+        self.power = [[[self.rand.uniform(-6, -1), self.rand.uniform(-4, 0)]
+                       for _ in range(lanes or 1)] for _ in range(ports)]
+
+    def advance(self, now):
+        """Take a new reading of every optic, if one is due.
+        """
+
+        with self.lock:
+            if now - self.update_time < self.refresh:
+                return
+            self.update_time = now
+            rand = self.rand
+            for port in range(len(self.names)):
+                if not self.optic[port]:
+                    continue
+                if rand.random() < self.flap:
+                    self.up[port] = not self.up[port]
+                for lane in self.power[port]:
+                    for direction in (0, 1):
+                        lane[direction] += rand.gauss(0, self.drift)
+                        if rand.random() < self.jump:
+                            lane[direction] += rand.choice([-5, 5])
+
+    def _select(self, names):
+        if names is None:
+            return range(len(self.names))
+        wanted = set(names)
+        return [port for port, name in enumerate(self.names)
+                if name in wanted]
+
+    def status(self):
+        """The output of 'show interfaces status'.
+        """
+
+        statuses = {}
+        for port, name in enumerate(self.names):
+            statuses[name] = {
+                'autoNegotiateActive': False,
+                'bandwidth': 100000000000,
+                'description': '',
+                'duplex': 'duplexFull',
+                'interfaceType': '100GBASE-LR4' if self.optic[port]
+                                 else 'Not Present',
+                'linkStatus': 'connected' if self.up[port] else 'notconnect',
+                'vlanInformation': {'interfaceForwardingModel': 'bridged',
+                                    'interfaceMode': 'bridged',
+                                    'vlanId': 1}}
+        statuses['Management1'] = dict(statuses[self.names[0]],
+                                       interfaceType='10/100/1000',
+                                       linkStatus='connected')
+        return {'interfaceStatuses': statuses}
+
+    def _levels(self, port):
+        """(rx, tx) power of each lane: no light is received on a down link.
+        """
+
+        return [(rx if self.up[port] else -40.0, tx)
+                for rx, tx in self.power[port]]
+
+    def transceiver(self, names=None):
+        """The output of 'show interfaces [<names>] transceiver'.
+        """
+
+        interfaces = {}
+        for port in self._select(names):
+            if not self.optic[port]:
+                interfaces[self.names[port]] = {}
+                continue
+            levels = self._levels(port)
+            rx = sum(level[0] for level in levels) / len(levels)
+            tx = sum(level[1] for level in levels) / len(levels)
+            interfaces[self.names[port]] = {
+                'rxPower': round(rx, 4), 'txPower': round(tx, 4),
+                'vendorSn': 'XKE{0:09d}  '.format(port),
+                'updateTime': self.update_time,
+                'temperature': 31.5, 'voltage': 3.29, 'txBias': 6.9,
+                'vendorName': 'Arista Networks',
+                'vendorPn': 'QSFP-100G-LR4', 'vendorRev': '20',
+                'mediaType': '100GBASE-LR4', 'mfgDate': '2015-11-30',
+                'displayName': self.names[port],
+                'details': dict((field, {'highAlarm': 3.5, 'highWarn': 2.5,
+                                         'lowAlarm': -13.3, 'lowWarn': -10.0})
+                                for field in ('temperature', 'voltage',
+                                              'txBias', 'txPower',
+                                              'rxPower'))}
+        return {'interfaces': interfaces}
+
+    def dom(self, names=None):
+        """The output of 'show interfaces [<names>] transceiver dom'.
+        """
+
+        interfaces = {}
+        for port in self._select(names):
+            if not self.optic[port] or not self.lanes:
+                continue
+            levels = self._levels(port)
+            interfaces[self.names[port]] = {
+                'updateTime': self.update_time,
+                'parameters': {
+                    'rxPower': {'unit': 'dBm', 'channels': dict(
+                        (str(lane + 1), round(level[0], 4))
+                        for lane, level in enumerate(levels))},
+                    'txPower': {'unit': 'dBm', 'channels': dict(
+                        (str(lane + 1), round(level[1], 4))
+                        for lane, level in enumerate(levels))},
+                    'temperature': {'unit': 'C', 'channels': {'-': 31.5}}}}
+        return {'interfaces': interfaces}
+
+    def version(self):
+        """The output of 'show version'.
+        """
+
+        return {'modelName': 'DCS-7508N', 'version': '4.20.1F',
+                'bootupTimestamp': self.boot_time}
+
+    def run(self, command):
+        """Return the output of a command, or None if it is not simulated.
+        """
+
+        words = command.split()
+        if words == ['show', 'interfaces', 'status']:
+            return self.status()
+        if words == ['show', 'version']:
+            return self.version()
+        if words[:2] != ['show', 'interfaces']:
+            return None
+        if words[-1] == 'transceiver':
+            output, names = self.transceiver, words[2:-1]
+        elif words[-2:] == ['transceiver', 'dom']:
+            output, names = self.dom, words[2:-2]
+        else:
+            return None
+        if names:
+            names = ''.join(names).split(',')
+        return output(names or None)
+
+class EapiHandler(BaseHTTPRequestHandler):
+    """HTTP/1.1 command-api of a :class:`SimulatedSwitch`
+    """
+    protocol_version = 'HTTP/1.1'
+    # Buffer each response, flushed once written, rather than a write per
+    # header line
+    wbufsize = -1
+
+    def setup(self):
+        # As nginx serves eAPI on a switch: the end of a response is not
+        # held back by Nagle's algorithm until the client's delayed ACK
+        if self.server.address_family == socket.AF_INET:
+            self.request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY,
+                                    1)
+        BaseHTTPRequestHandler.setup(self)
+
+    def do_POST(self):
+        request = json.loads(self.rfile.read(
+            int(self.headers['Content-Length'])))
+        simulator = self.server.simulator
+        if simulator.latency:
+            time.sleep(simulator.latency)
+
+        commands = request['params'][1]
+        if any(command.endswith(('transceiver', 'transceiver dom'))
+               for command in commands):
+            simulator.advance(time.time())
+        result = []
+        for number, command in enumerate(commands):
+            output = simulator.run(command)
+            if output is None:
+                response = {'jsonrpc': '2.0', 'id': request['id'],
+                            'error': {'code': 1002,
+                                      'message': "CLI command {0} of {1} "
+                                                 "'{2}' failed: invalid "
+                                                 "command".format(
+                                                     number + 1,
+                                                     len(commands), command)}}
+                break
+            result.append(output)
+        else:
+            response = {'jsonrpc': '2.0', 'id': request['id'],
+                        'result': result}
+
+        body = json.dumps(response)
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+class Serving(ThreadingMixIn):
+    """Serve a :class:`SimulatedSwitch` from a background thread.
+    """
+    daemon_threads = True
+
+    def simulate(self, latency, **kwargs):
+        self.simulator = SimulatedSwitch(**kwargs)
+        self.simulator.latency = latency
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def handle_error(self, request, client_address):
+        # Clients closing their keep-alive connections are not errors
+        if not isinstance(sys.exc_info()[1], socket.error):
+            BaseServer.handle_error(self, request, client_address)
+
+class EapiSimulator(Serving, HTTPServer):
+    """A :class:`SimulatedSwitch` served on a local port.
+    """
+
+    def __init__(self, latency=0, port=0, certfile=None, address='127.0.0.1',
+                 **kwargs):
+        """args:
+            latency (float): Seconds each request takes.
+            certfile (str): PEM file of a certificate and its key to serve
+                HTTPS with. (Default: plain HTTP)
+            address (str): Loopback address to listen on.
+            kwargs: Passed on to :class:`SimulatedSwitch`.
+        """
+
+        HTTPServer.__init__(self, (address, port), EapiHandler)
+        if certfile:
+            context = ssl.SSLContext(ssl.PROTOCOL_SSLv23)
+            context.load_cert_chain(certfile)
+            self.socket = context.wrap_socket(self.socket, server_side=True)
+        self.simulate(latency, **kwargs)
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+class UnixEapiSimulator(Serving, UnixStreamServer):
+    """A :class:`SimulatedSwitch` served on a Unix domain socket.
+    """
+
+    def __init__(self, path, latency=0, **kwargs):
+        """args:
+            path (str): Socket file, removed when stopped.
+            latency (float): Seconds each request takes.
+            kwargs: Passed on to :class:`SimulatedSwitch`.
+        """
+
+        UnixStreamServer.__init__(self, path, EapiHandler)
+        self.simulate(latency, **kwargs)
+
+    def stop(self):
+        Serving.stop(self)
+        os.unlink(self.server_address)
+
+def start_fleet(switches, **kwargs):
+    """Start a number of simulated switches, each with its own seed.
+    returns:
+        list: The running :class:`EapiSimulator` of each switch.
+    """
+
+    return [EapiSimulator(seed=number, **kwargs).start()
+            for number in range(switches)]
+
+def serve_fleet(connection, switches, **kwargs):
+    """Serve a fleet until told to stop: for running it in another process.
+    args:
+        connection (object): A :func:`multiprocessing.Pipe` end, sent the
+            list of ports and then waited on.
+    """
+
+    fleet = start_fleet(switches, **kwargs)
+    connection.send([server.port for server in fleet])
+    connection.recv()
+    for server in fleet:
+        server.stop()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--switches', type=int, default=1)
+    parser.add_argument('--ports', type=int, default=64)
+    parser.add_argument('--lanes', type=int, default=0)
+    parser.add_argument('--latency', type=float, default=0)
+    parser.add_argument('--drift', type=float, default=0.1)
+    parser.add_argument('--jump', type=float, default=0.001)
+    parser.add_argument('--flap', type=float, default=0.001)
+    parser.add_argument('--refresh', type=float, default=0)
+    parser.add_argument('--port', type=int, default=0,
+                        help='port of the first switch (default: any)')
+    args = parser.parse_args()
+
+    fleet = []
+    for number in range(args.switches):
+        fleet.append(EapiSimulator(
+            latency=args.latency, port=args.port and args.port + number,
+            ports=args.ports, lanes=args.lanes, drift=args.drift,
+            jump=args.jump, flap=args.flap, refresh=args.refresh,
+            seed=number).start())
+        print '127.0.0.1:{0}'.format(fleet[-1].port)
+    sys.stdout.flush()
+    try:
+        while True:
+            time.sleep(60)
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == '__main__':
+    main()
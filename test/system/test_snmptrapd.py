@@ -0,0 +1,88 @@
+"""Interop test of native SNMP notifications against net-snmp's snmptrapd,
+using the users in snmpdemo/snmptrapd.conf.
+"""
+
+import sys
+import os
+import time
+import shutil
+import socket
+import tempfile
+import unittest
+import subprocess
+from distutils.spawn import find_executable
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '../lib'))
+sys.path.append(os.path.join(os.path.dirname(__file__), '../..'))
+
+from dom import SnmpNotifier
+
+SNMPTRAPD_CONF = os.path.join(os.path.dirname(__file__),
+                              '../../snmpdemo/snmptrapd.conf')
+
+V3_USERS = [('eosplus', 'MD5', 'DES'),
+            ('eosplussha', 'SHA', 'DES'),
+            ('eosplusmd5', 'MD5', 'AES'),
+            ('eosplusshaaes', 'SHA', 'AES')]
+
+@unittest.skipUnless(find_executable('snmptrapd'), 'snmptrapd not installed')
+class TestSnmptrapd(unittest.TestCase):
+
+    def setUp(self):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.bind(('127.0.0.1', 0))
+        self.port = sock.getsockname()[1]
+        sock.close()
+
+        self.persistent_dir = tempfile.mkdtemp()
+        self.output = tempfile.TemporaryFile()
+        env = dict(os.environ, SNMP_PERSISTENT_DIR=self.persistent_dir)
+        self.snmptrapd = subprocess.Popen(
+            ['snmptrapd', '-f', '-C', '-c', SNMPTRAPD_CONF, '-Lo', '-n',
+             'udp:127.0.0.1:{0}'.format(self.port)],
+            stdout=self.output, stderr=subprocess.STDOUT, env=env)
+        time.sleep(1)
+
+    def tearDown(self):
+        self.snmptrapd.terminate()
+        self.snmptrapd.wait()
+        self.output.close()
+        shutil.rmtree(self.persistent_dir)
+
+    def received(self):
+        time.sleep(0.5)
+        self.output.seek(0)
+        return self.output.read()
+
+    def test_v2c_trap(self):
+        """Verify snmptrapd logs a native v2c trap
+        """
+        notifier = SnmpNotifier({'traphost': '127.0.0.1:{0}'.
+                                             format(self.port),
+                                 'community': 'eosplus',
+                                 'version': '2c'})
+        notifier.send('dom v2c interop', uptime=1449684931)
+        self.assertIn('dom v2c interop', self.received())
+
+    def test_v3_informs(self):
+        """Verify snmptrapd acknowledges native v3 informs for each user
+        """
+        for secname, authprotocol, privprotocol in V3_USERS:
+            notifier = SnmpNotifier({'traphost': '127.0.0.1:{0}'.
+                                                 format(self.port),
+                                     'version': '3',
+                                     'secname': secname,
+                                     'seclevel': 'authPriv',
+                                     'authprotocol': authprotocol,
+                                     'authpassword': 'eosplus123',
+                                     'privprotocol': privprotocol,
+                                     'privpassword': 'eosplus123'})
+            if not notifier.native:
+                self.skipTest('Crypto module not installed')
+            notifier.send('dom v3 interop {0}'.format(secname))
+            self.assertEqual(notifier.sent, 1)
+            self.assertIn('dom v3 interop {0}'.format(secname),
+                          self.received())
+
+if __name__ == '__main__':
+    unittest.main(module=__name__, buffer=True, exit=False)
@@ -0,0 +1,135 @@
+"""Test saving and restoring baselines across restarts
+"""
+
+import sys
+import os
+import json
+import shutil
+import tempfile
+import unittest
+import mock
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '../lib'))
+sys.path.append(os.path.join(os.path.dirname(__file__), '../..'))
+
+import dom
+from dom import Checkpoint, Switch
+
+INTERFACES = {u'Ethernet1': {u'linkStatus': u'connected'},
+              u'Ethernet2': {u'linkStatus': u'connected'}}
+
+def dominfo(rx_power=-2.0, vendor_sn=u'XKE000000001'):
+    return {u'Ethernet1': {u'rxPower': rx_power, u'txPower': -1.0,
+                           u'vendorSn': vendor_sn},
+            u'Ethernet2': {u'rxPower': -3.0, u'txPower': -1.5,
+                           u'vendorSn': u'XKE000000002',
+                           u'parameters':
+                           {u'rxPower': {u'channels': {u'1': -3.0,
+                                                       u'2': -3.1}},
+                            u'txPower': {u'channels': {u'1': -1.5,
+                                                       u'2': -1.6}}}}}
+
+class FakeSwitch(Switch):
+    """Switch answering each poll with the next canned transceiver output
+    """
+
+    def __init__(self, *args, **kwargs):
+        super(FakeSwitch, self).__init__(*args, **kwargs)
+        self.connection = object()
+        self.outputs = []
+
+    def fetch(self, connection, lanes):
+        return INTERFACES, self.outputs.pop(0), 1449684931
+
+class TestCheckpoint(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.filename = os.path.join(self.directory, 'dom-baselines.json')
+        self.engines = [None]
+        if dom.numpy is not None:
+            self.engines.append(dom.VectorEngine)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def restart(self, engine, outputs):
+        """Poll a switch, checkpoint it, then poll a new switch restored
+        from the checkpoint and return the notifications it raised.
+        """
+        switch = FakeSwitch('leaf1', engine=engine and engine())
+        switch.outputs = [dominfo(), dominfo()]
+        switch.poll()
+        switch.poll()
+        Checkpoint(self.filename).save([switch], force=True)
+
+        restarted = FakeSwitch('leaf1', engine=engine and engine())
+        restarted.outputs = outputs
+        self.assertEqual(Checkpoint(self.filename).restore([restarted]), 2)
+        with mock.patch('dom.notify') as mock_notify:
+            for _ in outputs:
+                restarted.poll()
+        return restarted, [call[0][0] for call in mock_notify.call_args_list]
+
+    @mock.patch('dom.log')
+    def test_first_poll_alerts(self, mock_log):
+        """Verify a degraded optic alerts on the first poll after a restart
+        """
+        for engine in self.engines:
+            degraded = dominfo(rx_power=-6.0)
+            degraded[u'Ethernet2'][u'parameters'][u'txPower'][u'channels'][
+                u'2'] = -5.0
+            _, messages = self.restart(engine, [degraded])
+            messages.sort()
+            self.assertEqual(len(messages), 2, engine)
+            self.assertTrue(messages[0].startswith(
+                'TRANSCEIVER_RX_POWER_CHANGE, Ethernet1 (XKE000000001) RX '
+                'power level has changed by -4.0 dBm from baseline -2.0 dBm'))
+            self.assertTrue(messages[1].startswith(
+                'TRANSCEIVER_TX_POWER_CHANGE, Ethernet2 lane 2'))
+
+    @mock.patch('dom.log')
+    def test_replaced_optic_rebased(self, mock_log):
+        """Verify a baseline is not applied to a different optic
+        """
+        for engine in self.engines:
+            replaced = dominfo(rx_power=-6.0, vendor_sn=u'XKE000000009')
+            switch, messages = self.restart(engine, [replaced])
+            self.assertEqual(messages, [], engine)
+            record = switch.checkpoint()['Ethernet1']
+            self.assertEqual(record['rx'], -6.0)
+            self.assertEqual(record['sn'], 'XKE000000009')
+
+    @mock.patch('dom.log')
+    def test_save_interval(self, mock_log):
+        """Verify writes are batched by interval and replace the file whole
+        """
+        switch = FakeSwitch('leaf1')
+        switch.outputs = [dominfo()]
+        switch.poll()
+
+        checkpoint = Checkpoint(self.filename, interval=300)
+        self.assertTrue(checkpoint.save([switch], force=True))
+        self.assertFalse(checkpoint.save([switch]))
+        # Nothing changed
+        self.assertFalse(checkpoint.save([switch], force=True))
+        self.assertEqual(checkpoint.writes, 1)
+        self.assertEqual(os.listdir(self.directory), ['dom-baselines.json'])
+
+        with open(self.filename) as saved:
+            data = json.load(saved)
+        self.assertEqual(sorted(data['switches']['leaf1']),
+                         ['Ethernet1', 'Ethernet2'])
+        self.assertEqual(data['switches']['leaf1']['Ethernet2']['lanes'],
+                         ['1', '2'])
+
+    @mock.patch('dom.log')
+    def test_unreadable(self, mock_log):
+        """Verify a corrupt checkpoint is ignored
+        """
+        with open(self.filename, 'w') as saved:
+            saved.write('{"version": 1, "swi')
+        self.assertEqual(Checkpoint(self.filename).load(), {})
+
+if __name__ == '__main__':
+    unittest.main(module=__name__, buffer=True, exit=False)
@@ -0,0 +1,218 @@
+"""Test the notification dispatch queue
+"""
+
+import sys
+import os
+import threading
+import unittest
+import mock
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '../lib'))
+sys.path.append(os.path.join(os.path.dirname(__file__), '../..'))
+
+from dom import Notification, NotificationDispatcher, notify
+from dom import NotificationCoalescer, TokenBucket, RateLimitedSink
+
+class RecordingSink(object):
+    """Sink that records messages, optionally waiting on an event first
+    """
+    name = 'recording'
+
+    def __init__(self, gate=None):
+        self.messages = []
+        self.gate = gate
+
+    def send(self, notification):
+        if self.gate is not None:
+            self.gate.wait(5)
+        self.messages.append(notification.msg)
+
+class FailingSink(object):
+    name = 'failing'
+
+    def send(self, notification):
+        raise IOError('trap host unreachable')
+
+class TestDispatcher(unittest.TestCase):
+
+    def test_delivers_to_all_sinks(self):
+        """Verify each notification reaches every sink and is counted
+        """
+        first, second = RecordingSink(), RecordingSink()
+        dispatcher = NotificationDispatcher([first, second], workers=2)
+        dispatcher.start()
+        for number in range(10):
+            dispatcher.put(Notification('event {0}'.format(number)))
+        dispatcher.stop()
+
+        self.assertEqual(sorted(first.messages), sorted(second.messages))
+        self.assertEqual(len(first.messages), 10)
+        stats = dispatcher.stats()
+        self.assertEqual(stats['queued'], 10)
+        self.assertEqual(stats['delivered'], 10)
+        self.assertEqual(stats['depth'], 0)
+        self.assertEqual(stats['dropped'], 0)
+
+    def test_drop_oldest(self):
+        """Verify a full queue discards its oldest notifications
+        """
+        sink = RecordingSink()
+        dispatcher = NotificationDispatcher([sink], queue_size=3)
+        for number in range(5):
+            dispatcher.put(Notification('event {0}'.format(number)))
+        self.assertEqual(dispatcher.stats()['max_depth'], 3)
+
+        dispatcher.start()
+        dispatcher.stop()
+        self.assertEqual(sink.messages, ['event 2', 'event 3', 'event 4'])
+        self.assertEqual(dispatcher.stats()['dropped'], 2)
+
+    def test_block(self):
+        """Verify a full queue blocks the caller under the block policy
+        """
+        gate = threading.Event()
+        sink = RecordingSink(gate)
+        dispatcher = NotificationDispatcher([sink], workers=1, queue_size=1,
+                                            overflow='block')
+        dispatcher.start()
+        # One notification held by the worker, one filling the queue
+        dispatcher.put(Notification('event 0'))
+        dispatcher.put(Notification('event 1'))
+
+        producer = threading.Thread(target=dispatcher.put,
+                                    args=(Notification('event 2'),))
+        producer.start()
+        producer.join(0.2)
+        self.assertTrue(producer.is_alive())
+
+        gate.set()
+        producer.join(5)
+        dispatcher.stop()
+        self.assertEqual(sink.messages, ['event 0', 'event 1', 'event 2'])
+        self.assertEqual(dispatcher.stats()['dropped'], 0)
+
+    @mock.patch('dom.log')
+    def test_failing_sink(self, mock_log):
+        """Verify a failing sink does not stop delivery to the others
+        """
+        sink = RecordingSink()
+        dispatcher = NotificationDispatcher([FailingSink(), sink])
+        dispatcher.start()
+        dispatcher.put(Notification('event'))
+        dispatcher.stop()
+
+        self.assertEqual(sink.messages, ['event'])
+        self.assertEqual(dispatcher.stats()['failed'], 1)
+
+    def test_notify_queues(self):
+        """Verify notify() hands off to the dispatcher when one is running
+        """
+        dispatcher = NotificationDispatcher([])
+        with mock.patch('dom.DISPATCHER', dispatcher):
+            notify('queued', level='WARNING', fields={'interface': 'Ethernet1'})
+
+        notification = dispatcher.queue[0]
+        self.assertEqual(notification.msg, 'queued')
+        self.assertEqual(notification.level, 'WARNING')
+        self.assertEqual(notification.fields, {'interface': 'Ethernet1'})
+
+def power_change(interface, direction='rx', delta=-4.0, hostname=None):
+    return Notification('TRANSCEIVER_{0}_POWER_CHANGE, {1}'.format(
+        direction.upper(), interface), level='WARNING',
+                        fields={'hostname': hostname,
+                                'interface': interface,
+                                'direction': direction,
+                                'delta': delta})
+
+class TestCoalescer(unittest.TestCase):
+
+    def test_linecard_summary(self):
+        """Verify a storm on one line card becomes one summary
+        """
+        coalescer = NotificationCoalescer(threshold=3)
+        events = [power_change('Ethernet3/{0}'.format(port)) for port
+                  in range(1, 5)]
+        events.append(power_change('Ethernet3/2', direction='tx', delta=-6.5))
+        events.append(power_change('Ethernet4/1'))
+
+        result = coalescer.summarize(events)
+
+        self.assertEqual(len(result), 2)
+        summary = result[0]
+        self.assertTrue(summary.msg.startswith(
+            'TRANSCEIVER_POWER_CHANGE_SUMMARY, linecard 3: 4 RX and 1 TX'))
+        self.assertIn('largest -6.5 dBm on Ethernet3/2 TX', summary.msg)
+        self.assertEqual(summary.fields['interfaces'],
+                         ['Ethernet3/1', 'Ethernet3/2', 'Ethernet3/3',
+                          'Ethernet3/4'])
+        self.assertIs(result[1], events[-1])
+        self.assertEqual(coalescer.coalesced, 5)
+
+    def test_switch_summary(self):
+        """Verify grouping per switch keeps switches apart
+        """
+        coalescer = NotificationCoalescer(threshold=2, group='switch')
+        events = [power_change('Ethernet1', hostname='leaf1'),
+                  power_change('Ethernet2', hostname='leaf1'),
+                  power_change('Ethernet1', hostname='leaf2')]
+
+        result = coalescer.summarize(events)
+
+        self.assertEqual(len(result), 2)
+        self.assertTrue(result[0].msg.startswith(
+            'TRANSCEIVER_POWER_CHANGE_SUMMARY, leaf1: 2 RX'))
+        self.assertIs(result[1], events[2])
+
+    def test_notify_collects(self):
+        """Verify notify() holds power changes only while collecting
+        """
+        coalescer = NotificationCoalescer(threshold=2)
+        sink = RecordingSink()
+        with mock.patch('dom.COALESCER', coalescer), \
+             mock.patch('dom.SINKS', [sink]):
+            coalescer.begin()
+            notify('held', fields={'interface': 'Ethernet1',
+                                   'direction': 'rx', 'delta': -3.5})
+            notify('not a power change')
+            self.assertEqual(sink.messages, ['not a power change'])
+            result = coalescer.end()
+            notify('after', fields={'interface': 'Ethernet1',
+                                    'direction': 'rx', 'delta': -3.5})
+
+        self.assertEqual([n.msg for n in result], ['held'])
+        self.assertEqual(sink.messages, ['not a power change', 'after'])
+
+class TestRateLimit(unittest.TestCase):
+
+    @mock.patch('dom.time')
+    def test_token_bucket(self, mock_time):
+        """Verify the bucket allows a burst then refills at the rate
+        """
+        mock_time.time.return_value = 100.0
+        bucket = TokenBucket(rate=2, burst=3)
+        self.assertEqual([bucket.take() for _ in range(4)],
+                         [True, True, True, False])
+
+        mock_time.time.return_value = 101.0
+        self.assertEqual([bucket.take() for _ in range(3)],
+                         [True, True, False])
+
+    @mock.patch('dom.log')
+    def test_rate_limited_sink(self, mock_log):
+        """Verify notifications over the limit are dropped and reported
+        """
+        sink = RecordingSink()
+        limited = RateLimitedSink(sink, rate=0.001, burst=2)
+        for number in range(5):
+            limited.send(Notification('event {0}'.format(number)))
+
+        self.assertEqual(sink.messages, ['event 0', 'event 1'])
+        self.assertEqual(limited.total_suppressed, 3)
+
+        limited.bucket.tokens = 1
+        limited.send(Notification('event 5'))
+        self.assertEqual(sink.messages, ['event 0', 'event 1', 'event 5'])
+        self.assertIn('suppressed 3', mock_log.call_args[0][0])
+
+if __name__ == '__main__':
+    unittest.main(module=__name__, buffer=True, exit=False)
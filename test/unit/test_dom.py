@@ -1,5 +1,6 @@
 import sys
 import os
+import syslog
 import unittest
 #import json
 import mock
@@ -12,6 +13,7 @@ sys.path.append(os.path.join(os.path.dirname(__file__), '../..'))
 
 #from testlib import get_fixture, function
 from dom import notify, link_up, check_interfaces, XcvrStatusReactor
+from dom import lane_powers, Notification, SyslogSink
 #from dom import *
 #import dom
 
@@ -66,6 +68,25 @@ class TestDom(unittest.TestCase):
         #print "DEBUG: {0}".format(output)
         assert output.startswith(message)
 
+    @mock.patch('dom.syslog.syslog')
+    def test_syslog_sink(self, mock_syslog):
+        """Verify the syslog sink logs at the notification's level, and
+        messages with braces as they are
+        """
+        sink = SyslogSink()
+        message = "TRANSCEIVER_RX_POWER_CHANGE, Ethernet1 (XKE1) RX power " \
+                  "level has changed by -3.5 dBm"
+        sink.send(Notification(message, level='WARNING'))
+        mock_syslog.assert_called_with(syslog.LOG_WARNING, message)
+
+        sink.send(Notification("Unexpected response {u'rxPower': None}"))
+        mock_syslog.assert_called_with(syslog.LOG_INFO,
+                                       "Unexpected response {u'rxPower': None}")
+
+        with mock.patch('sys.stdout', StringIO()):
+            sink.send(Notification("eAPI failed", error=True))
+        mock_syslog.assert_called_with(syslog.LOG_ERR, "eAPI failed")
+
     #@mock.patch('dom.call')
     @mock.patch('dom.log')
     @mock.patch('dom.send_trap')
@@ -270,6 +291,97 @@ class TestDom(unittest.TestCase):
         args, kwargs = mock_notify.call_args
         assert args[0].startswith("TRANSCEIVER_TX_POWER_CHANGE")
 
+    @mock.patch('dom.log')
+    @mock.patch('dom.notify')
+    def test_unchanged_update_time(self, mock_notify, mock_log):
+        """Verify readings the switch has not refreshed are not checked again
+        """
+        interface = u'Ethernet1'
+        response = dict(self.dominfo[interface])
+        reactor = XcvrStatusReactor(interface)
+        reactor.link_up_now = True
+        reactor.check_dom_info(response)
+
+        response = dict(response, rxPower=response[u'rxPower'] - 4)
+        reactor.check_dom_info(response)
+        reactor.check_dom_info(response)
+        self.assertEqual(reactor.poll_iterations_, 0)
+        self.assertFalse(mock_notify.called)
+
+        response[u'updateTime'] += 5
+        reactor.check_dom_info(response)
+        self.assertEqual(reactor.poll_iterations_, 1)
+        self.assertTrue(mock_notify.called)
+
+    def test_reactor_state_compact(self):
+        """Verify the reactor has no __dict__ and releases each response
+        """
+        interface = u'Ethernet1'
+        status = {}
+        interfaces = dict(self.interfaces)
+        interfaces[interface][u'linkStatus'] = u'connected'
+        check_interfaces(0, str(interface), interfaces[interface],
+                         self.dominfo[interface], status=status)
+
+        reactor = status[interface]
+        self.assertFalse(hasattr(reactor, '__dict__'))
+        self.assertEqual(reactor.response, None)
+        self.assertEqual(reactor.rx_base_, self.dominfo[interface][u'rxPower'])
+        self.assertEqual(reactor.state()['interface'], interface)
+
+    @mock.patch('dom.log')
+    @mock.patch('dom.notify')
+    def test_check_lane_power(self, mock_notify, mock_log):
+        """Verify each lane has its own baseline and alerts name the lane
+        """
+
+        interface = u'Ethernet1'
+        response = dict(self.dominfo[interface])
+        response[u'parameters'] = {
+            u'rxPower': {u'unit': u'dBm',
+                         u'channels': {u'1': -2.0, u'2': -2.5, u'3': -3.0,
+                                       u'4': -3.5}},
+            u'txPower': {u'unit': u'dBm',
+                         u'channels': {u'1': -1.0, u'2': -1.1, u'3': -1.2,
+                                       u'4': -1.3}}}
+
+        reactor = XcvrStatusReactor(interface)
+        reactor.link_up_now = True
+        reactor.check_dom_info(response)
+        self.assertEqual(reactor.lanes_, ('1', '2', '3', '4'))
+        self.assertEqual(list(reactor.lane_base_),
+                         [-2.0, -2.5, -3.0, -3.5, -1.0, -1.1, -1.2, -1.3])
+
+        # A drop on one lane alone, well within the port's average
+        response[u'parameters'][u'rxPower'][u'channels'][u'3'] = -7.0
+        reactor.check_power()
+
+        self.assertEqual(mock_notify.call_count, 1)
+        args, kwargs = mock_notify.call_args
+        self.assertTrue(args[0].startswith(
+            'TRANSCEIVER_RX_POWER_CHANGE, Ethernet1 lane 3 (XKE131102026) RX '
+            'power level has changed by -4.0 dBm from baseline -3.0 dBm'))
+        self.assertEqual(kwargs['fields']['lane'], '3')
+        self.assertEqual(kwargs['fields']['interface'], interface)
+
+    def test_lane_powers_shared(self):
+        """Verify single-lane optics are not per-lane and lane IDs are shared
+        """
+
+        self.assertEqual(lane_powers(self.dominfo[u'Ethernet1']), None)
+
+        first = lane_powers({u'parameters': {u'rxPower': {u'channels':
+                                                          {u'1': -2.0,
+                                                           u'2': -2.1}}}})
+        second = lane_powers({u'parameters': {u'txPower': {u'channels':
+                                                           {u'2': -1.0,
+                                                            u'1': -1.1}}}})
+        self.assertIs(first[0], second[0])
+        self.assertEqual(first[1][:2].tolist(), [-2.0, -2.1])
+        # No TX reading on the lanes
+        self.assertTrue(all(power != power for power in first[1][2:]))
+        self.assertEqual(second[1][2:].tolist(), [-1.1, -1.0])
+
 if __name__ == '__main__':
     #unittest.main()
     unittest.main(module=__name__, buffer=True, exit=False)
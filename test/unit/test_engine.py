@@ -0,0 +1,243 @@
+"""Test the vectorized threshold engine against XcvrStatusReactor
+"""
+
+import sys
+import os
+import random
+import unittest
+import mock
+from array import array
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '../lib'))
+sys.path.append(os.path.join(os.path.dirname(__file__), '../..'))
+
+import dom
+from dom import check_interfaces, VectorEngine
+
+def simulate(ports, polls, seed, lanes=0, stale=0):
+    """Generate (interfaces, dominfo) for each poll of a switch whose ports
+    flap, drift and occasionally jump past the tolerance.  With lanes, some
+    ports are multi-lane optics whose lanes drift independently.  With stale,
+    that fraction of readings repeat the last reading and its updateTime.
+    """
+    rand = random.Random(seed)
+    last = {}
+    kinds = [rand.choice(['full', 'full', 'full', 'tx_only', 'none'] +
+                         ['lanes'] * 3 * bool(lanes))
+             for _ in range(ports)]
+    power = [[rand.uniform(-8, -1), rand.uniform(-6, 0)]
+             for _ in range(ports)]
+    lane_power = [[[rand.uniform(-8, -1), rand.uniform(-6, 0)]
+                   for _ in range(lanes)] for _ in range(ports)]
+    up = [rand.random() < 0.8 for _ in range(ports)]
+
+    for _ in range(polls):
+        interfaces = {}
+        dominfo = {}
+        for port in range(ports):
+            name = u'Ethernet{0}/{1}'.format(port // 8 + 1, port % 8 + 1)
+            if rand.random() < 0.1:
+                up[port] = not up[port]
+            for direction in (0, 1):
+                power[port][direction] += rand.gauss(0, 0.8)
+                if rand.random() < 0.05:
+                    power[port][direction] += rand.choice([-5, 5])
+            interfaces[name] = {u'linkStatus': u'connected' if up[port]
+                                               else u'notconnect'}
+            if kinds[port] == 'none':
+                dominfo[name] = {}
+                continue
+            if name in last and rand.random() < stale:
+                dominfo[name] = last[name]
+                continue
+            dominfo[name] = {u'txPower': power[port][1],
+                             u'vendorSn': u'XKE{0:09d}  '.format(port)}
+            if kinds[port] == 'lanes':
+                channels = [{}, {}]
+                for lane in range(lanes):
+                    for direction in (0, 1):
+                        lane_power[port][lane][direction] += rand.gauss(0, 0.8)
+                        if rand.random() < 0.05:
+                            lane_power[port][lane][direction] += \
+                                rand.choice([-5, 5])
+                        channels[direction][unicode(lane + 1)] = \
+                            lane_power[port][lane][direction]
+                dominfo[name][u'parameters'] = {
+                    u'rxPower': {u'unit': u'dBm', u'channels': channels[0]},
+                    u'txPower': {u'unit': u'dBm', u'channels': channels[1]}}
+            if stale:
+                dominfo[name][u'updateTime'] = 1449776317.0 + \
+                                               rand.random() * 1000
+                last[name] = dominfo[name]
+            if kinds[port] == 'full':
+                dominfo[name][u'rxPower'] = power[port][0]
+        yield interfaces, dominfo
+
+class TestVectorEngine(unittest.TestCase):
+
+    def run_both(self, seed, ports=40, polls=60, lanes=0, stale=0):
+        """Feed the same polls to reactors and to the engine and return the
+        notifications each produced.
+        """
+        results = []
+        for use_engine in (False, True):
+            notifications = []
+
+            def record(msg, level='INFO', error=False, uptime=0,
+                       out=sys.stdout, fields=None):
+                notifications.append((msg, level, uptime, fields))
+
+            status = {}
+            engine = VectorEngine(capacity=4)
+            with mock.patch('dom.notify', side_effect=record), \
+                 mock.patch('dom.log'), \
+                 mock.patch('dom.time') as mock_time:
+                mock_time.time.return_value = 1450000000.0
+                for interfaces, dominfo in simulate(ports, polls, seed, lanes,
+                                                      stale):
+                    mock_time.time.return_value += 10
+                    if use_engine:
+                        engine.update(1449684931, interfaces, dominfo,
+                                      hostname='leaf1')
+                    else:
+                        for interface in interfaces.keys():
+                            check_interfaces(1449684931, str(interface),
+                                             interfaces[interface],
+                                             dominfo[interface],
+                                             status=status, hostname='leaf1')
+            results.append(notifications)
+        return results
+
+    def test_matches_reactor(self):
+        """Verify the engine raises exactly the reactor's notifications
+        """
+        for seed in range(3):
+            reactor, engine = self.run_both(seed)
+            self.assertTrue(reactor)
+            self.assertEqual(reactor, engine)
+
+    def test_matches_reactor_cumulative_average(self):
+        """Verify parity with --cumulative-average and other settings
+        """
+        with mock.patch('dom.USE_CUMULATIVE_AVERAGE', True), \
+             mock.patch('dom.TOLERANCE', 1.5), \
+             mock.patch('dom.REBASE_POLL_LIMIT', 5):
+            for seed in range(3):
+                reactor, engine = self.run_both(seed)
+                self.assertTrue(reactor)
+                self.assertEqual(reactor, engine)
+
+    def test_matches_reactor_lanes(self):
+        """Verify parity on multi-lane optics, alerting per lane
+        """
+        for seed in range(2):
+            reactor, engine = self.run_both(seed, lanes=4)
+            self.assertTrue([fields for _, _, _, fields in reactor
+                             if fields.get('lane')])
+            self.assertEqual(reactor, engine)
+
+    def test_matches_reactor_models(self):
+        """Verify parity with the ewma and rolling baselines, in dBm and in
+        sigmas
+        """
+        for model in [dom.EwmaBaseline(0.2), dom.WindowBaseline(8)]:
+            for sigmas in (0, 2):
+                with mock.patch('dom.BASELINE_MODEL', model), \
+                     mock.patch('dom.SIGMAS', sigmas), \
+                     mock.patch('dom.SIGMA_MIN_READINGS', 4):
+                    reactor, engine = self.run_both(0, lanes=2)
+                    self.assertTrue(reactor)
+                    self.assertEqual(reactor, engine)
+
+    def test_matches_reactor_unchanged(self):
+        """Verify parity when readings are not refreshed between polls
+        """
+        with mock.patch('dom.USE_CUMULATIVE_AVERAGE', True):
+            for seed in range(2):
+                reactor, engine = self.run_both(seed, lanes=2, stale=0.5)
+                self.assertTrue(reactor)
+                self.assertEqual(reactor, engine)
+
+class TestBaselineModels(unittest.TestCase):
+
+    def readings(self, count):
+        rand = random.Random(1)
+        return [rand.gauss(-3, 0.5) for _ in range(count)]
+
+    def test_ewma(self):
+        """Verify the weight of each reading decays geometrically
+        """
+        model = dom.EwmaBaseline(0.25)
+        state = array('d', [0.0] * model.fields)
+        readings = self.readings(50)
+        model.start(state, 0, readings[0])
+        for reading in readings[1:]:
+            model.update(state, 0, reading)
+
+        expected = readings[0] * 0.75 ** 49 + sum(
+            0.25 * 0.75 ** (49 - number) * reading
+            for number, reading in enumerate(readings) if number)
+        self.assertAlmostEqual(state[model.MEAN], expected)
+        self.assertEqual(state[model.READINGS], 50)
+
+    def test_window(self):
+        """Verify the mean and variance are those of the last readings
+        """
+        model = dom.WindowBaseline(10)
+        state = array('d', [0.0] * model.fields)
+        readings = self.readings(35)
+        model.start(state, 0, readings[0])
+        for count, reading in enumerate(readings[1:], 2):
+            model.update(state, 0, reading)
+            window = readings[max(0, count - 10):count]
+            mean = sum(window) / len(window)
+            self.assertAlmostEqual(state[model.MEAN], mean)
+            self.assertAlmostEqual(model.variance(state, 0),
+                                   sum((reading - mean) ** 2
+                                       for reading in window) / len(window))
+
+    def test_limit(self):
+        """Verify sigmas only tighten the tolerance, down to the floor,
+        once enough readings were taken
+        """
+        model = dom.EwmaBaseline()
+        state = array('d', [-3.0, 0.04, 5])
+        with mock.patch('dom.SIGMAS', 3), mock.patch('dom.TOLERANCE', 3), \
+             mock.patch('dom.SIGMA_FLOOR', 0.5), \
+             mock.patch('dom.SIGMA_MIN_READINGS', 10):
+            self.assertEqual(model.limit(state, 0), 3)
+            state[model.READINGS] = 10
+            self.assertAlmostEqual(model.limit(state, 0), 0.6)
+            state[model.SPREAD] = 0.0001
+            self.assertEqual(model.limit(state, 0), 0.5)
+            state[model.SPREAD] = 4
+            self.assertEqual(model.limit(state, 0), 3)
+
+    def test_vectorized(self):
+        """Verify updating many readings at once matches one at a time
+        """
+        readings = numpy.array(self.readings(60)).reshape(20, 3)
+        mask = numpy.random.RandomState(2).rand(20, 3) < 0.8
+        for model in [dom.EwmaBaseline(0.3), dom.WindowBaseline(5)]:
+            state = numpy.zeros((3, model.fields))
+            model.start_many(state, readings[0])
+            scalar = [array('d', [0.0] * model.fields) for _ in range(3)]
+            for column in range(3):
+                model.start(scalar[column], 0, readings[0, column])
+            for row in range(1, 20):
+                model.update_many(state, readings[row], mask[row])
+                for column in range(3):
+                    if mask[row, column]:
+                        model.update(scalar[column], 0, readings[row, column])
+            self.assertEqual(state.tolist(),
+                             [list(values) for values in scalar])
+
+if dom.numpy is None:
+    TestVectorEngine = unittest.skip('NumPy not installed')(TestVectorEngine)
+    TestBaselineModels.test_vectorized = unittest.skip('NumPy not installed')(
+        TestBaselineModels.test_vectorized)
+else:
+    import numpy
+
+if __name__ == '__main__':
+    unittest.main(module=__name__, buffer=True, exit=False)
@@ -0,0 +1,108 @@
+"""Test the transceiver sample ring buffer
+"""
+
+import sys
+import os
+import shutil
+import tempfile
+import unittest
+import mock
+from StringIO import StringIO
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '../lib'))
+sys.path.append(os.path.join(os.path.dirname(__file__), '../..'))
+
+from dom import SampleRing, Switch, show_history
+
+def reading(rx_power, tx_power=-1.0):
+    return {u'rxPower': rx_power, u'txPower': tx_power,
+            u'temperature': 30.5, u'voltage': 3.25, u'txBias': 6.5,
+            u'vendorSn': u'XKE131102026'}
+
+class TestSampleRing(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.filename = os.path.join(self.directory, 'leaf1.ring')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_wraps(self):
+        """Verify the ring keeps only its size in samples, newest last
+        """
+        ring = SampleRing(size=4)
+        for number in range(6):
+            ring.append('Ethernet1', reading(-float(number)), timestamp=number)
+            ring.append('Ethernet2', reading(-10.0), timestamp=number)
+
+        self.assertEqual([sample.rxPower for sample in
+                          ring.last('Ethernet1', 10)], [-4.0, -5.0])
+        self.assertEqual([sample.time for sample in
+                          ring.last('Ethernet2', 1)], [5])
+        self.assertEqual(ring.last('Ethernet3'), [])
+
+    def test_summary(self):
+        """Verify min/max/mean over a window, ignoring missing readings
+        """
+        ring = SampleRing(size=16)
+        for number, power in enumerate([-9.0, -2.0, -3.0, -4.0]):
+            ring.append('Ethernet1', reading(power), timestamp=100 + number)
+        ring.append('Ethernet1', {u'txPower': -1.0}, timestamp=104)
+
+        summary = ring.summary('Ethernet1', 101, 104)
+        self.assertEqual(summary['rxPower'], (-4.0, -2.0, -3.0))
+        self.assertEqual(summary['txPower'], (-1.0, -1.0, -1.0))
+        self.assertEqual([sample.time for sample in
+                          ring.window('Ethernet1', 103)], [103, 104])
+
+    def test_reopen(self):
+        """Verify samples survive closing and reopening the file
+        """
+        ring = SampleRing(self.filename, size=8)
+        ring.append('Ethernet1', reading(-2.5), timestamp=100)
+        ring.close()
+
+        ring = SampleRing(self.filename, size=8)
+        samples = ring.last('Ethernet1')
+        self.assertEqual(len(samples), 1)
+        self.assertEqual(samples[0].rxPower, -2.5)
+        self.assertEqual(samples[0].temperature, 30.5)
+        ring.append('Ethernet2', reading(-3.0), timestamp=101)
+        self.assertEqual(ring.names, ['Ethernet1', 'Ethernet2'])
+        ring.close()
+
+        # A different size starts a new ring
+        ring = SampleRing(self.filename, size=16)
+        self.assertEqual(ring.last('Ethernet1'), [])
+        ring.close()
+
+    def test_name_table_full(self):
+        """Verify interfaces past the name table are dropped
+        """
+        ring = SampleRing(size=8, ports=1)
+        self.assertTrue(ring.append('Ethernet1', reading(-2.0)))
+        self.assertFalse(ring.append('Ethernet2', reading(-2.0)))
+
+    @mock.patch('dom.log')
+    def test_poll_records(self, mock_log):
+        """Verify a poll records each interface with transceiver readings
+        """
+        switch = Switch('leaf1', history=SampleRing(size=8))
+        interfaces = {u'Ethernet1': {u'linkStatus': u'connected'},
+                      u'Ethernet2': {u'linkStatus': u'notconnect'}}
+        dominfo = {u'Ethernet1': reading(-2.0)}
+        switch.fetch = lambda connection, lanes: (interfaces, dominfo,
+                                                  1449684931)
+        switch.connection = object()
+        switch.poll()
+
+        self.assertEqual(switch.history.names, ['Ethernet1'])
+
+        out = StringIO()
+        show_history(switch.history, 'Ethernet1', out=out)
+        self.assertIn('rxPower     -2.0000 / -2.0000 / -2.0000',
+                      out.getvalue())
+
+if __name__ == '__main__':
+    unittest.main(module=__name__, buffer=True, exit=False)
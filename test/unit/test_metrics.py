@@ -0,0 +1,138 @@
+"""Test the Prometheus metrics exporter
+"""
+
+import sys
+import os
+import urllib2
+import collections
+import unittest
+import mock
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '../lib'))
+sys.path.append(os.path.join(os.path.dirname(__file__), '../..'))
+
+from jsonrpclib import ProtocolError
+from dom import Switch, MetricsExporter, MetricsServer, run_commands
+from dom import EapiException, notify
+
+class FakeEapi(object):
+    """Answer a batched poll with one optic whose rx power can be changed
+    """
+
+    def __init__(self):
+        self.requests = 0
+        self.interfaces = [u'Ethernet1', u'Ethernet2']
+        self.rx_power = -2.0
+
+    def runCmds(self, version, commands):
+        self.requests += 1
+        return [{u'interfaceStatuses':
+                 dict((interface, {u'linkStatus': u'connected'})
+                      for interface in self.interfaces)},
+                {u'interfaces':
+                 {u'Ethernet1': {u'rxPower': self.rx_power,
+                                 u'txPower': -1.0,
+                                 u'temperature': 31.5,
+                                 u'voltage': 3.29,
+                                 u'vendorSn': u'XKE000000001'},
+                  u'Ethernet2': {}}},
+                {u'bootupTimestamp': 1449684931.0}]
+
+class TestMetricsExporter(unittest.TestCase):
+
+    def setUp(self):
+        self.exporter = MetricsExporter()
+        self.switch = Switch('leaf1', batched=True, exporter=self.exporter)
+        self.switch.connection = FakeEapi()
+
+    @mock.patch('dom.log')
+    def test_readings(self, mock_log):
+        """Verify the readings, baseline and deviation of each interface
+        """
+        self.switch.poll()
+        self.switch.connection.rx_power = -3.25
+        self.switch.poll()
+
+        body = self.exporter.render()
+        labels = '{switch="leaf1",interface="Ethernet1"}'
+        for line in ['dom_rx_power_dbm{0} -3.25',
+                     'dom_tx_power_dbm{0} -1.0',
+                     'dom_rx_baseline_dbm{0} -2.0',
+                     'dom_rx_deviation_dbm{0} -1.25',
+                     'dom_tx_deviation_dbm{0} 0.0',
+                     'dom_temperature_celsius{0} 31.5',
+                     'dom_voltage_volts{0} 3.29',
+                     'dom_poll_duration_seconds_count{{switch="leaf1"}} 2']:
+            self.assertIn(line.format(labels) + '\n', body)
+        self.assertIn('# TYPE dom_rx_power_dbm gauge\n', body)
+        # No optic, no samples
+        self.assertNotIn('Ethernet2', body)
+
+    @mock.patch('dom.log')
+    def test_cached(self, mock_log):
+        """Verify scrapes reuse the rendered readings until the next poll,
+        and interfaces that vanish are dropped
+        """
+        self.switch.poll()
+        self.exporter.render()
+        body = self.exporter.body
+        self.exporter.render()
+        self.assertIs(self.exporter.body, body)
+        self.assertEqual(self.switch.connection.requests, 1)
+
+        self.switch.connection.interfaces = [u'Ethernet2']
+        self.switch.poll()
+        self.assertIsNone(self.exporter.body)
+        self.assertNotIn('Ethernet1', self.exporter.render())
+
+    @mock.patch('dom.log')
+    def test_health(self, mock_log):
+        """Verify eAPI errors and notifications are counted, in both formats
+        """
+
+        class FailingEapi(object):
+            def runCmds(self, version, commands):
+                raise ProtocolError((1002, 'invalid command'))
+
+        with mock.patch('dom.EAPI_ERRORS', collections.Counter()), \
+             mock.patch('dom.NOTIFICATIONS_SENT', collections.Counter()), \
+             mock.patch('dom.SINKS', []):
+            self.assertRaises(EapiException, run_commands, FailingEapi(),
+                              ['show interfaces bogus transceiver'])
+            notify('TRANSCEIVER_RX_POWER_CHANGE', level='WARNING')
+
+            body = self.exporter.render()
+            self.assertIn('# TYPE dom_eapi_errors_total counter\n', body)
+            self.assertIn('dom_eapi_errors_total{type="invalid_command"} 1\n',
+                          body)
+            self.assertIn('dom_notifications_total{level="WARNING"} 1\n', body)
+
+            body = self.exporter.render(openmetrics=True)
+            self.assertIn('# TYPE dom_eapi_errors counter\n', body)
+            self.assertTrue(body.endswith('# EOF\n'))
+
+    @mock.patch('dom.log')
+    def test_server(self, mock_log):
+        """Verify /metrics is served without polling the switch
+        """
+        self.switch.poll()
+        server = MetricsServer(self.exporter, '127.0.0.1', 0).start()
+        url = 'http://127.0.0.1:{0}'.format(server.server_address[1])
+        try:
+            response = urllib2.urlopen(url + '/metrics')
+            self.assertIn('text/plain', response.info()['Content-Type'])
+            self.assertIn('dom_rx_power_dbm', response.read())
+
+            request = urllib2.Request(url + '/metrics', headers={
+                'Accept': 'application/openmetrics-text; version=1.0.0'})
+            self.assertTrue(urllib2.urlopen(request).read().endswith(
+                '# EOF\n'))
+
+            with self.assertRaises(urllib2.HTTPError):
+                urllib2.urlopen(url + '/')
+        finally:
+            server.stop()
+        self.assertEqual(self.switch.connection.requests, 1)
+
+if __name__ == '__main__':
+    unittest.main(module=__name__, buffer=True, exit=False)
@@ -0,0 +1,453 @@
+"""Test multi-switch polling
+"""
+
+import sys
+import os
+import unittest
+import tempfile
+import threading
+import mock
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '../lib'))
+sys.path.append(os.path.join(os.path.dirname(__file__), '../..'))
+
+import dom
+from dom import Switch, Poller, EapiException, load_inventory
+from dom import PollScheduler, TickScheduler, StaticCache, vendor_serial
+
+class TestPoller(unittest.TestCase):
+
+    def __init__(self, *args, **kwargs):
+        super(TestPoller, self).__init__(*args, **kwargs)
+        self.longMessage = True
+
+    def test_load_inventory(self):
+        """Verify hostnames, ports and comments in an inventory file
+        """
+        inventory = tempfile.NamedTemporaryFile(delete=False)
+        inventory.write("# spine\nspine1\nspine2:8443  # alternate port\n\n")
+        inventory.close()
+
+        switches = load_inventory(inventory.name)
+        os.unlink(inventory.name)
+
+        self.assertEqual([(s.hostname, s.port) for s in switches],
+                         [('spine1', 443), ('spine2', 8443)])
+
+    def test_switch_has_own_status(self):
+        """Verify each switch keeps its own reactor map
+        """
+        first = Switch('leaf1')
+        second = Switch('leaf2')
+        first.status['Ethernet1'] = object()
+        self.assertEqual(second.status, {})
+
+    @mock.patch('dom.log')
+    def test_unreachable_switch_does_not_block(self, mock_log):
+        """Verify a hung switch is skipped while the others keep polling
+        """
+        release = threading.Event()
+        polled = []
+
+        def hang(hostname=None):
+            release.wait(5)
+
+        def fail(hostname=None):
+            raise EapiException("Connection error with eAPI")
+
+        slow = Switch('slow')
+        slow.poll = hang
+        down = Switch('down')
+        down.poll = fail
+        good = Switch('good')
+        good.poll = lambda hostname=None: polled.append(hostname)
+
+        poller = Poller([slow, down, good], workers=3)
+        try:
+            for result in poller.run_cycle()[1:]:
+                result.wait(5)
+            self.assertEqual(polled, ['good'])
+            self.assertEqual(down.errors, 1)
+            self.assertTrue(slow.busy)
+
+            # The hung switch is not resubmitted, the others are
+            results = poller.run_cycle()
+            self.assertEqual(len(results), 2)
+            for result in results:
+                result.wait(5)
+            self.assertEqual(polled, ['good', 'good'])
+            self.assertEqual(down.errors, 2)
+            self.assertEqual(slow.overruns, 1)
+
+            # Only the switches given are polled
+            poller.run_cycle([good])[0].wait(5)
+            self.assertEqual(polled, ['good', 'good', 'good'])
+            self.assertEqual(down.errors, 2)
+        finally:
+            release.set()
+            poller.close()
+
+class FakeClock(object):
+    """A clock advanced by the sleeps of the code under test
+    """
+
+    def __init__(self, now=1000.0):
+        self.now = now
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+class TestTickScheduler(unittest.TestCase):
+
+    @mock.patch('dom.log')
+    def test_fixed_rate(self, mock_log):
+        """Verify the time spent polling does not stretch the period
+        """
+        clock = FakeClock()
+        switches = [Switch('leaf1'), Switch('leaf2')]
+        ticks = TickScheduler(switches, 10, clock=clock)
+        with mock.patch('time.sleep', clock.sleep):
+            for _ in range(4):
+                self.assertEqual(ticks.wait(), switches)
+                clock.now += 3
+        self.assertEqual(clock.sleeps, [0.0, 7.0, 7.0, 7.0])
+
+        # Falling behind to 1058 polls the 1040 tick late, counts the 1050
+        # tick as missed and carries on at 1060
+        clock.now += 25
+        with mock.patch('time.sleep', clock.sleep):
+            self.assertEqual(ticks.wait(), switches)
+            self.assertEqual([switch.overruns for switch in switches],
+                             [1, 1])
+            ticks.wait()
+        self.assertEqual(clock.now, 1060.0)
+
+        # No interval: every switch on every call
+        ticks = TickScheduler(switches, 0, jitter=0.5, clock=clock)
+        with mock.patch('time.sleep', clock.sleep):
+            self.assertEqual(ticks.wait(), switches)
+            self.assertEqual(ticks.wait(), switches)
+
+    @mock.patch('dom.log')
+    def test_jitter(self, mock_log):
+        """Verify switches are spread over the interval, the same on
+        every start
+        """
+        switches = [Switch('leaf{0}'.format(number)) for number in range(20)]
+        offsets = [TickScheduler.offset(switch.hostname, 10, 0.5)
+                   for switch in switches]
+        self.assertTrue(all(0 <= offset < 5 for offset in offsets))
+        self.assertEqual(len(set(offsets)), 20)
+        self.assertEqual(offsets, [TickScheduler.offset(switch.hostname, 10,
+                                                        0.5)
+                                   for switch in switches])
+
+        clock = FakeClock()
+        ticks = TickScheduler(switches, 10, jitter=0.5, clock=clock)
+        polled = []
+        with mock.patch('time.sleep', clock.sleep):
+            while len(polled) < 40:
+                polled.extend((switch.hostname, clock.now)
+                              for switch in ticks.wait())
+        # Each switch twice, 10 seconds apart
+        self.assertEqual(len(polled), 40)
+        for switch, offset in zip(switches, offsets):
+            self.assertEqual([now for hostname, now in polled
+                              if hostname == switch.hostname],
+                             [1000 + offset, 1010 + offset])
+
+class FakeEapi(object):
+    """Answer runCmds with canned 'show' output and record each request
+    """
+
+    def __init__(self):
+        self.requests = []
+        self.outputs = {
+            'show interfaces status':
+                {u'interfaceStatuses':
+                 {u'Ethernet1': {u'linkStatus': u'connected'},
+                  u'Management1': {u'linkStatus': u'connected'}}},
+            'show interfaces transceiver':
+                {u'interfaces':
+                 {u'Ethernet1': {u'rxPower': -2.0, u'txPower': -1.0,
+                                 u'vendorSn': u'XKE000000001'}}},
+            'show interfaces Ethernet1 transceiver':
+                {u'interfaces':
+                 {u'Ethernet1': {u'rxPower': -2.0, u'txPower': -1.0,
+                                 u'vendorSn': u'XKE000000001'}}},
+            'show interfaces Ethernet1 status':
+                {u'interfaceStatuses':
+                 {u'Ethernet1': {u'linkStatus': u'connected'}}},
+            'show version': {u'bootupTimestamp': 1449684931.0},
+            'show interfaces transceiver dom':
+                {u'interfaces':
+                 {u'Ethernet1': {u'parameters':
+                                 {u'rxPower': {u'channels': {u'1': -2.0,
+                                                             u'2': -2.2}},
+                                  u'txPower': {u'channels': {u'1': -1.0,
+                                                             u'2': -1.1}}}}}},
+        }
+
+    def runCmds(self, version, commands):
+        self.requests.append(commands)
+        return [self.outputs[command] for command in commands]
+
+class TestPollScheduler(unittest.TestCase):
+
+    def test_backoff(self):
+        """Verify stable interfaces back off and drifting ones do not
+        """
+        scheduler = PollScheduler(10, 80)
+        self.assertEqual(scheduler.due(0), None)
+
+        scheduler.observe({'Ethernet1': {u'linkStatus': u'connected'},
+                           'Ethernet2': {u'linkStatus': u'connected'},
+                           'Ethernet3': {u'linkStatus': u'notconnect'}}, 0)
+        self.assertEqual(sorted(scheduler.due(0)),
+                         ['Ethernet1', 'Ethernet2', 'Ethernet3'])
+
+        # Every cycle just after the link change, then backing off
+        intervals = []
+        for _ in range(8):
+            scheduler.update('Ethernet1', 0, drift=0.2)
+            intervals.append(scheduler.schedule['Ethernet1'][1])
+        self.assertEqual(intervals, [10, 10, 10, 20, 40, 80, 80, 80])
+
+        # Drifting toward the tolerance (3 dBm): every cycle
+        scheduler.update('Ethernet1', 0, drift=1.6)
+        self.assertEqual(scheduler.schedule['Ethernet1'], (10, 10))
+        scheduler.update('Ethernet2', 0, drift=0.0)
+        self.assertEqual(scheduler.schedule['Ethernet2'], (10, 10))
+
+        # No baseline (link down) or no optic: slowest
+        scheduler.update('Ethernet3', 0, drift=None)
+        self.assertEqual(scheduler.schedule['Ethernet3'], (80, 80))
+        scheduler.update('Ethernet2', 0, optic=False)
+        self.assertEqual(scheduler.due(10), ['Ethernet1'])
+
+    def test_refresh_cadence(self):
+        """Verify polls follow the switch's refresh cadence
+        """
+        scheduler = PollScheduler(10, 300)
+        scheduler.observe({'Ethernet1': {u'linkStatus': u'connected'}}, 0)
+        for now, update_time in [(1, 0.5), (31, 30.5), (41, 30.5),
+                                 (91, 90.5)]:
+            scheduler.update('Ethernet1', now, drift=2.0,
+                             update_time=update_time)
+        self.assertEqual(scheduler.cadence, 30)
+        # Not polled faster than the switch refreshes, and just after it
+        self.assertEqual(scheduler.schedule['Ethernet1'], (121.5, 30))
+
+    def test_link_change_due(self):
+        """Verify a link change makes an interface due and removed ones go
+        """
+        scheduler = PollScheduler(10, 80)
+        scheduler.observe({'Ethernet1': {u'linkStatus': u'notconnect'},
+                           'Ethernet2': {u'linkStatus': u'connected'}}, 0)
+        scheduler.update('Ethernet1', 0, drift=None)
+        scheduler.update('Ethernet2', 0, drift=None)
+        self.assertEqual(scheduler.due(10), [])
+
+        scheduler.observe({'Ethernet1': {u'linkStatus': u'connected'}}, 10)
+        self.assertEqual(scheduler.due(10), ['Ethernet1'])
+        self.assertEqual(scheduler.links.keys(), ['Ethernet1'])
+
+class TestBatchedPoll(unittest.TestCase):
+
+    @mock.patch('dom.log')
+    def test_batched_poll(self, mock_log):
+        """Verify a batched poll makes one eAPI request
+        """
+        switch = Switch('leaf1', batched=True)
+        switch.connection = FakeEapi()
+        switch.poll()
+
+        self.assertEqual(switch.connection.requests,
+                         [['show interfaces status',
+                           'show interfaces transceiver',
+                           'show version']])
+        self.assertEqual(switch.status.keys(), ['Ethernet1'])
+        self.assertEqual(switch.status['Ethernet1'].uptime, 1449684931)
+        self.assertEqual(switch.last_poll_requests, 1)
+        self.assertEqual(switch.polls, 1)
+
+    @mock.patch('dom.log')
+    def test_unbatched_poll(self, mock_log):
+        """Verify the default poll makes two eAPI requests
+        """
+        switch = Switch('leaf1')
+        switch.connection = FakeEapi()
+        switch.poll()
+
+        self.assertEqual(switch.connection.requests,
+                         [['show interfaces status'],
+                          ['show interfaces Ethernet1 transceiver',
+                           'show version']])
+        self.assertEqual(switch.status.keys(), ['Ethernet1'])
+        self.assertEqual(switch.last_poll_requests, 2)
+
+    @mock.patch('dom.log')
+    def test_vanished_interfaces_evicted(self, mock_log):
+        """Verify the state of interfaces no longer on the switch is dropped
+        """
+        engines = [None]
+        if dom.numpy is not None:
+            engines.append(dom.VectorEngine())
+        for engine in engines:
+            switch = Switch('leaf1', batched=True, engine=engine)
+            switch.connection = FakeEapi()
+            statuses = switch.connection.outputs['show interfaces status']
+            statuses[u'interfaceStatuses'][u'Ethernet2'] = \
+                {u'linkStatus': u'connected'}
+            switch.poll()
+            del statuses[u'interfaceStatuses'][u'Ethernet2']
+            switch.poll()
+
+            if engine is None:
+                self.assertEqual(switch.status.keys(), ['Ethernet1'])
+            else:
+                self.assertEqual(engine.keys, [(None, 'Ethernet1', None)])
+                self.assertEqual(engine.index, {(None, 'Ethernet1', None): 0})
+                self.assertEqual(engine.polls[0], 1)
+
+    @mock.patch('dom.log')
+    def test_adaptive_poll(self, mock_log):
+        """Verify only the due interfaces' transceivers are fetched
+        """
+        for batched in (False, True):
+            switch = Switch('leaf1', batched=batched,
+                            scheduler=PollScheduler(10, 80))
+            switch.connection = FakeEapi()
+            statuses = switch.connection.outputs['show interfaces status']
+            statuses[u'interfaceStatuses'][u'Ethernet2'] = \
+                {u'linkStatus': u'notconnect'}
+            for names in ['Ethernet1', 'Ethernet1, Ethernet2',
+                          'Ethernet2, Ethernet1']:
+                switch.connection.outputs[
+                    'show interfaces {0} transceiver'.format(names)] = \
+                    switch.connection.outputs['show interfaces transceiver']
+
+            with mock.patch('dom.time') as mock_time:
+                for now in range(0, 60, 10):
+                    mock_time.time.return_value = now
+                    switch.poll()
+
+            transceivers = [command for request in switch.connection.requests
+                            for command in request if 'transceiver' in command]
+            # Everything on the first poll, then only Ethernet1 while it
+            # settles and when due
+            self.assertIn(transceivers[0],
+                          ['show interfaces transceiver',
+                           'show interfaces Ethernet1, Ethernet2 transceiver',
+                           'show interfaces Ethernet2, Ethernet1 transceiver'])
+            self.assertEqual(set(transceivers[1:]),
+                             set(['show interfaces Ethernet1 transceiver']))
+            self.assertLess(len(transceivers), 6)
+            self.assertEqual(switch.scheduler.schedule['Ethernet2'][1], 80)
+
+    @mock.patch('dom.log')
+    def test_per_lane_poll(self, mock_log):
+        """Verify per-lane DOM is fetched in the same eAPI request
+        """
+        switch = Switch('leaf1', batched=True, lanes=True)
+        switch.connection = FakeEapi()
+        switch.poll()
+
+        self.assertEqual(switch.connection.requests,
+                         [['show interfaces status',
+                           'show interfaces transceiver',
+                           'show version',
+                           'show interfaces transceiver dom']])
+        self.assertEqual(switch.last_poll_requests, 1)
+        self.assertEqual(switch.status['Ethernet1'].lanes_, ('1', '2'))
+
+class TestStaticCache(unittest.TestCase):
+
+    def poll(self, switch, now):
+        with mock.patch('dom.monotonic', return_value=now):
+            switch.poll()
+        return switch.connection.requests.pop()
+
+    @mock.patch('dom.log')
+    def test_cached_poll(self, mock_log):
+        """Verify only the link status and transceivers are fetched between
+        refreshes, and the cache is refreshed on its cadence, after an optic
+        swap and after a failed poll
+        """
+        full = ['show interfaces status', 'show interfaces transceiver',
+                'show version']
+        transceivers = ['show interfaces Ethernet1 status',
+                        'show interfaces Ethernet1 transceiver']
+        switch = Switch('leaf1', batched=True, cache=StaticCache(60))
+        switch.connection = FakeEapi()
+        outputs = switch.connection.outputs
+
+        self.assertEqual(self.poll(switch, 0), full)
+        self.assertEqual(self.poll(switch, 10), transceivers)
+        self.assertEqual(switch.status['Ethernet1'].uptime, 1449684931)
+        self.assertEqual(switch.last_poll_requests, 1)
+        self.assertEqual(switch.cache.names, 'Ethernet1')
+
+        # Swapped: checked now, refreshed on the next poll
+        swapped = {u'interfaces':
+                   {u'Ethernet1': {u'rxPower': -2.0, u'txPower': -1.0,
+                                   u'vendorSn': u'XKE000000002'}}}
+        outputs['show interfaces transceiver'] = swapped
+        outputs['show interfaces Ethernet1 transceiver'] = swapped
+        self.assertEqual(self.poll(switch, 20), transceivers)
+        self.assertEqual(switch.status['Ethernet1'].vendor_sn_,
+                         u'XKE000000002')
+        self.assertEqual(self.poll(switch, 30), full)
+        self.assertEqual(self.poll(switch, 80), transceivers)
+
+        # Rebooted: refreshed on its cadence and logged
+        outputs['show version'] = {u'bootupTimestamp': 1449700000.0}
+        self.assertEqual(self.poll(switch, 90), full)
+        self.assertTrue([call for call in mock_log.call_args_list
+                         if call[0][0].startswith('leaf1: rebooted')])
+        self.assertEqual(switch.cache.uptime, 1449700000)
+
+        del outputs['show interfaces Ethernet1 transceiver']
+        self.assertRaises(EapiException, self.poll, switch, 100)
+        self.assertEqual(self.poll(switch, 110), full)
+
+    @mock.patch('dom.log')
+    @mock.patch('dom.notify_power_change')
+    def test_cached_link_down(self, mock_change, mock_log):
+        """Verify a link that goes down between refreshes is not checked
+        against its baseline
+        """
+        switch = Switch('leaf1', batched=True, cache=StaticCache(60))
+        switch.connection = FakeEapi()
+        outputs = switch.connection.outputs
+        self.poll(switch, 0)
+        self.poll(switch, 10)
+
+        outputs['show interfaces Ethernet1 status'] = {
+            u'interfaceStatuses':
+            {u'Ethernet1': {u'linkStatus': u'notconnect'}}}
+        outputs['show interfaces Ethernet1 transceiver'] = {
+            u'interfaces':
+            {u'Ethernet1': {u'rxPower': -30.0, u'txPower': -1.0,
+                            u'vendorSn': u'XKE000000001'}}}
+        self.poll(switch, 20)
+        self.assertFalse(switch.status['Ethernet1'].link_up_now)
+        self.assertFalse(mock_change.called)
+
+    def test_vendor_serial(self):
+        """Verify serial numbers are stripped once and shared
+        """
+        serial = vendor_serial({u'vendorSn': u'XKE000000001  '})
+        self.assertEqual(serial, u'XKE000000001')
+        self.assertIs(vendor_serial({u'vendorSn': u'XKE000000001  '}),
+                      serial)
+        self.assertIsNone(vendor_serial({u'vendorSn': u'  '}))
+        self.assertIsNone(vendor_serial({}))
+
+if __name__ == '__main__':
+    unittest.main(module=__name__, buffer=True, exit=False)
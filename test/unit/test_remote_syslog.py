@@ -0,0 +1,231 @@
+"""Test sending notifications to a remote syslog collector
+"""
+
+import sys
+import os
+import re
+import ssl
+import time
+import shutil
+import select
+import socket
+import tempfile
+import subprocess
+import unittest
+import mock
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '../lib'))
+sys.path.append(os.path.join(os.path.dirname(__file__), '../..'))
+
+from dom import Notification, RemoteSyslogSink, parse_syslog_url
+
+def power_change(number=1):
+    return Notification(
+        'TRANSCEIVER_RX_POWER_CHANGE, Ethernet{0} (XKE1) RX power level has '
+        'changed by -3.5 dBm'.format(number), level='WARNING',
+        fields={'hostname': 'leaf1', 'interface': 'Ethernet{0}'.format(number),
+                'direction': 'rx', 'delta': -3.5, 'baseline': -2.0,
+                'power': -5.5, 'vendor_sn': u'XKE1', 'lane': None})
+
+def interface(message):
+    return re.search(r'interface="(\w+)"', message).group(1)
+
+def frames(connection, count, timeout=5):
+    """Read count octet-counted messages from a stream
+    """
+    data = ''
+    messages = []
+    deadline = time.time() + timeout
+    while len(messages) < count and time.time() < deadline:
+        if not select.select([connection], [], [], 0.1)[0]:
+            continue
+        chunk = connection.recv(65536)
+        if not chunk:
+            break
+        data += chunk
+        while ' ' in data:
+            length, _, rest = data.partition(' ')
+            if len(rest) < int(length):
+                break
+            messages.append(rest[:int(length)])
+            data = rest[int(length):]
+    return messages
+
+def certificate(directory):
+    """Make a self-signed certificate and key in one PEM file, or return
+    None without openssl
+    """
+    certfile = os.path.join(directory, 'syslog.pem')
+    try:
+        subprocess.check_call(['openssl', 'req', '-x509', '-newkey',
+                               'rsa:2048', '-nodes', '-days', '1',
+                               '-subj', '/CN=localhost',
+                               '-keyout', certfile, '-out', certfile],
+                              stdout=open(os.devnull, 'w'),
+                              stderr=subprocess.STDOUT)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return certfile
+
+class TestFormat(unittest.TestCase):
+
+    def test_parse_url(self):
+        """Verify the protocol and port default, and IPv6 addresses
+        """
+        self.assertEqual(parse_syslog_url('collector'),
+                         ('udp', 'collector', 514))
+        self.assertEqual(parse_syslog_url('tls://collector'),
+                         ('tls', 'collector', 6514))
+        self.assertEqual(parse_syslog_url('tcp://10.0.0.1:1514'),
+                         ('tcp', '10.0.0.1', 1514))
+        self.assertEqual(parse_syslog_url('tcp://[2001:db8::1]:1514'),
+                         ('tcp', '2001:db8::1', 1514))
+        self.assertRaises(ValueError, parse_syslog_url, 'ftp://collector')
+        self.assertRaises(ValueError, parse_syslog_url, 'tcp://')
+
+    def test_format(self):
+        """Verify the RFC 5424 header and structured data of notifications
+        """
+        sink = RemoteSyslogSink('collector', hostname='dom host')
+        notification = power_change()
+        notification.created = 1450000000.25
+        self.assertEqual(
+            sink.format(notification),
+            '<12>1 2015-12-13T09:46:40.250000Z dom_host {0} {1} '
+            'TRANSCEIVER_RX_POWER_CHANGE [dom@30065 baseline="-2.0" '
+            'delta="-3.5" direction="rx" hostname="leaf1" '
+            'interface="Ethernet1" power="-5.5" vendor_sn="XKE1"] '
+            '{2}'.format(sink.app_name, os.getpid(), notification.msg))
+
+        notification = Notification('Lost "leaf1" [eAPI]', error=True)
+        notification.fields = {'interfaces': ['Ethernet1', 'Ethernet2'],
+                               'reason': 'a "quoted] \\ value'}
+        self.assertEqual(
+            sink.format(notification).split(' ', 6)[5:],
+            ['-', '[dom@30065 interfaces="Ethernet1,Ethernet2" '
+                  'reason="a \\"quoted\\] \\\\ value"] Lost "leaf1" [eAPI]'])
+        self.assertTrue(sink.format(notification).startswith('<11>1 '))
+        self.assertEqual(sink.format(Notification('Started')).split(' ')[6],
+                         '-')
+
+@mock.patch('dom.log')
+@mock.patch('dom.RemoteSyslogSink.RECONNECT_DELAY', 0)
+class TestRemoteSyslogSink(unittest.TestCase):
+
+    def test_udp(self, mock_log):
+        """Verify each message is sent as its own datagram
+        """
+        listener = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        listener.bind(('127.0.0.1', 0))
+        listener.settimeout(5)
+        sink = RemoteSyslogSink('127.0.0.1:{0}'.format(
+            listener.getsockname()[1])).start()
+        try:
+            for number in range(3):
+                sink.send(power_change(number))
+            datagrams = [listener.recv(65536) for _ in range(3)]
+        finally:
+            sink.stop()
+            listener.close()
+
+        self.assertEqual([interface(datagram) for datagram in datagrams],
+                         ['Ethernet0', 'Ethernet1', 'Ethernet2'])
+        self.assertEqual(sink.stats()['sent'], 3)
+
+    def test_tcp_reconnect(self, mock_log):
+        """Verify messages are octet-counted, and sent again over a new
+        connection when the collector closes the connection
+        """
+        listener = socket.socket()
+        listener.bind(('127.0.0.1', 0))
+        listener.listen(5)
+        sink = RemoteSyslogSink('tcp://127.0.0.1:{0}'.format(
+            listener.getsockname()[1])).start()
+        try:
+            for number in range(2):
+                sink.send(power_change(number))
+            connection = listener.accept()[0]
+            self.assertEqual(len(frames(connection, 2)), 2)
+            connection.close()
+
+            # Written into the closed connection until the sink notices
+            deadline = time.time() + 5
+            number = 2
+            while not select.select([listener], [], [], 0.05)[0]:
+                self.assertLess(time.time(), deadline)
+                sink.send(power_change(number))
+                number += 1
+            connection = listener.accept()[0]
+            sink.send(power_change(99))
+            received = frames(connection, 1)
+            while interface(received[-1]) != 'Ethernet99':
+                received.extend(frames(connection, 1))
+            connection.close()
+        finally:
+            sink.stop()
+            listener.close()
+
+        self.assertEqual(sink.stats()['connects'], 2)
+        self.assertTrue(mock_log.called)
+
+    def test_bounded_buffer(self, mock_log):
+        """Verify the oldest messages are dropped while the collector is
+        unreachable, and stopping does not wait for it
+        """
+        unused = socket.socket()
+        unused.bind(('127.0.0.1', 0))
+        port = unused.getsockname()[1]
+        unused.close()
+
+        sink = RemoteSyslogSink('tcp://127.0.0.1:{0}'.format(port),
+                                buffer_size=3)
+        sink.RECONNECT_DELAY = 60
+        for number in range(5):
+            sink.send(power_change(number))
+        sink.start()
+        deadline = time.time() + 5
+        while not mock_log.called:
+            self.assertLess(time.time(), deadline)
+            time.sleep(0.01)
+        start = time.time()
+        sink.stop()
+
+        self.assertLess(time.time() - start, 1)
+        self.assertEqual(sink.stats(), {'depth': 3, 'sent': 0, 'dropped': 2,
+                                        'failed': 0, 'connects': 0})
+        self.assertEqual([notification.fields['interface']
+                          for notification in sink.buffer],
+                         ['Ethernet2', 'Ethernet3', 'Ethernet4'])
+        self.assertIn('Connection refused', mock_log.call_args[0][0])
+
+    def test_tls(self, mock_log):
+        """Verify messages are sent over TLS
+        """
+        directory = tempfile.mkdtemp()
+        try:
+            certfile = certificate(directory)
+            if certfile is None:
+                self.skipTest('openssl not found')
+            listener = socket.socket()
+            listener.bind(('127.0.0.1', 0))
+            listener.listen(5)
+            sink = RemoteSyslogSink('tls://127.0.0.1:{0}'.format(
+                listener.getsockname()[1])).start()
+            try:
+                sink.send(power_change())
+                connection = ssl.wrap_socket(listener.accept()[0],
+                                             server_side=True,
+                                             certfile=certfile)
+                received = frames(connection, 1)
+                connection.close()
+            finally:
+                sink.stop()
+                listener.close()
+        finally:
+            shutil.rmtree(directory)
+
+        self.assertEqual(len(received), 1)
+        self.assertIn('[dom@30065 ', received[0])
+
+if __name__ == '__main__':
+    unittest.main(module=__name__, buffer=True, exit=False)
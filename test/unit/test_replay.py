@@ -0,0 +1,137 @@
+"""Test recording polls and replaying them with other settings
+"""
+
+import sys
+import os
+import shutil
+import tempfile
+import StringIO
+import unittest
+import mock
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '../lib'))
+sys.path.append(os.path.join(os.path.dirname(__file__), '../..'))
+
+from dom import Switch, PollRecorder, read_polls, find_changes, sweep
+from dom import show_replay, REPLAY_SETTINGS
+
+BASE = {'tolerance': 3.0, 'rebase-poll-limit': 100, 'baseline': 'fixed',
+        'ewma-alpha': 0.1, 'baseline-window': 60, 'sigmas': 0,
+        'sigma-floor': 0.5}
+
+class FakeEapi(object):
+    """Answer a batched poll with one optic whose rx power and link can be
+    changed
+    """
+
+    def __init__(self):
+        self.rx_power = -2.0
+        self.link = u'connected'
+
+    def runCmds(self, version, commands):
+        return [{u'interfaceStatuses':
+                 {u'Ethernet1': {u'linkStatus': self.link,
+                                 u'bandwidth': 100000000000},
+                  u'Ethernet2': {u'linkStatus': u'notconnect'}}},
+                {u'interfaces':
+                 {u'Ethernet1': {u'rxPower': self.rx_power,
+                                 u'txPower': -1.0,
+                                 u'vendorSn': u'XKE000000001  ',
+                                 u'vendorName': u'Arista Networks',
+                                 u'mediaType': u'100GBASE-LR4'},
+                  u'Ethernet2': {}}},
+                {u'bootupTimestamp': 1449684931.0}]
+
+class TestReplay(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.filename = os.path.join(self.directory, 'leaf1.polls')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def record(self, levels):
+        """Poll a switch every 10 seconds with the given rx power levels
+        (None for the link down) and record the polls.
+        """
+        recorder = PollRecorder(self.filename)
+        switch = Switch('leaf1', batched=True, recorder=recorder)
+        switch.connection = FakeEapi()
+        with mock.patch('dom.time') as mock_time, mock.patch('dom.log'), \
+             mock.patch('dom.SINKS', []):
+            for poll, level in enumerate(levels):
+                mock_time.time.return_value = 1450000000.0 + 10 * poll
+                if level is None:
+                    switch.connection.link = u'notconnect'
+                else:
+                    switch.connection.link = u'connected'
+                    switch.connection.rx_power = level
+                switch.poll()
+        recorder.close()
+
+    def test_recorded(self):
+        """Verify polls are read back with only the fields checked, and a
+        partial last record is skipped
+        """
+        self.record([-2.0, -2.5])
+        with open(self.filename, 'ab') as recording:
+            recording.write('\x40\x00\x00\x00partial')
+
+        polls = list(read_polls(self.filename))
+        self.assertEqual(len(polls), 2)
+        timestamp, uptime, interfaces, dominfo, checked = polls[1]
+        self.assertEqual(timestamp, 1450000010.0)
+        self.assertEqual(uptime, 1449684931)
+        self.assertEqual(interfaces,
+                         {u'Ethernet1': {u'linkStatus': u'connected'},
+                          u'Ethernet2': {u'linkStatus': u'notconnect'}})
+        self.assertEqual(dominfo, {u'Ethernet1': {
+            u'rxPower': -2.5, u'txPower': -1.0,
+            u'vendorSn': u'XKE000000001  '}})
+        self.assertIsNone(checked)
+
+        # Recording again cuts off the partial record and appends
+        self.record([-2.0])
+        self.assertEqual(len(list(read_polls(self.filename))), 3)
+
+    @mock.patch('dom.log')
+    def test_sweep(self, mock_log):
+        """Verify the alerts and time to detect of each tolerance
+        """
+        self.record([-2.0, -2.0, -3.0, -4.5, -6.0, -6.2, None,
+                     -2.0, -2.1])
+        changes = find_changes({'leaf1': list(read_polls(self.filename))})
+        # 3 dBm below the reading after the link came up, until it went down
+        self.assertEqual(changes, [(1450000040.0, 1450000060.0,
+                                    ('leaf1', u'Ethernet1', None, 'rx'))])
+
+        results = sweep([self.filename], BASE,
+                        [('tolerance', [1.5, 4.1, 5.0])], processes=2)
+        self.assertEqual([result['settings']['tolerance']
+                          for result in results], [1.5, 4.1, 5.0])
+        self.assertEqual([result['polls'] for result in results], [9] * 3)
+        # Alerted before, when, after and never
+        self.assertEqual([(result['alerts'], result['detected'],
+                           result['delays']) for result in results],
+                         [(3, 1, [0.0]), (1, 1, [10.0]), (0, 0, [])])
+
+        # With the default rebases, the baseline follows the drop
+        results = sweep([self.filename], BASE,
+                        [('rebase-poll-limit', [3])])
+        self.assertEqual(results[0]['detected'], 0)
+
+        out = StringIO.StringIO()
+        show_replay(results, [('rebase-poll-limit', [3])], out=out)
+        lines = out.getvalue().splitlines()
+        self.assertEqual(lines[0], '9 polls, 1 changes')
+        self.assertEqual(lines[2].split(), ['3', '0', '0/1', '-', '-'])
+
+    def test_settings(self):
+        """Verify every setting swept has a command line value
+        """
+        self.assertEqual(sorted(BASE), sorted(REPLAY_SETTINGS))
+        self.assertRaises(ValueError, REPLAY_SETTINGS['baseline'], 'median')
+
+if __name__ == '__main__':
+    unittest.main(module=__name__, buffer=True, exit=False)
@@ -4,6 +4,9 @@
 import sys
 import os
 import unittest
+import time
+import socket
+import threading
 #import json
 import mock
 
@@ -11,7 +14,12 @@ sys.path.append(os.path.join(os.path.dirname(__file__), '../lib'))
 sys.path.append(os.path.join(os.path.dirname(__file__), '../..'))
 
 #from testlib import get_fixture, function
-from dom import send_trap
+from dom import send_trap, SnmpNotifier, usm_localized_key
+from dom import Notification, NotificationDispatcher, SnmpSink, SyslogSink
+from dom import _ber, _ber_decode, _ber_items, _ber_integer, _ber_sequence
+from dom import _ber_integer_value, _ber_oid, _ber_oid_value
+from dom import PDU_INFORM, PDU_REPORT, PDU_RESPONSE, PDU_TRAP
+from dom import USM_STATS_UNKNOWN_ENGINE_IDS_OID
 
 #from testlib import get_fixture, function
 
@@ -80,6 +88,216 @@ class TestSnmp(unittest.TestCase):
                                       's',
                                       msg])
 
+class FakeReceiver(object):
+    """UDP trap receiver; answers v3 discovery probes and informs
+    """
+
+    engine_id = '\x80\x00\x75\xf1\x03\x00\x1c\x73\x00\x00\x01'
+
+    def __init__(self):
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind(('127.0.0.1', 0))
+        self.sock.settimeout(5)
+        self.port = self.sock.getsockname()[1]
+        self.packets = []
+        self.replier = SnmpNotifier({'traphost': 'localhost',
+                                     'version': '3',
+                                     'seclevel': 'noAuthNoPriv'})
+
+    def reply(self, count, delay=0):
+        """Answer count v3 requests, each after delay seconds
+        """
+        for _ in range(count):
+            data, address = self.sock.recvfrom(65535)
+            time.sleep(delay)
+            self.packets.append(data)
+            msg_id, pdu_type, engine, _ = SnmpNotifier._parse_v3(data)
+            if not engine[0]:
+                pdu = _ber(PDU_REPORT, _ber_integer(msg_id) +
+                           _ber_integer(0) + _ber_integer(0) +
+                           _ber_sequence(_ber_sequence(
+                               _ber_oid(USM_STATS_UNKNOWN_ENGINE_IDS_OID),
+                               _ber_integer(1, 0x41))))
+            else:
+                pdu = _ber(PDU_RESPONSE, _ber_integer(msg_id) +
+                           _ber_integer(0) + _ber_integer(0) +
+                           _ber_sequence())
+            self.sock.sendto(self.replier._v3_packet(
+                msg_id, pdu, [self.engine_id, 7, 1000, 0], secure=False),
+                             address)
+
+class TestNativeSnmp(unittest.TestCase):
+
+    def setUp(self):
+        self.receiver = FakeReceiver()
+        self.traphost = '127.0.0.1:{0}'.format(self.receiver.port)
+
+    def tearDown(self):
+        self.receiver.sock.close()
+
+    def test_localized_key(self):
+        """Verify USM key localization against RFC 3414 A.3
+        """
+        engine_id = '\x00' * 11 + '\x02'
+        self.assertEqual(usm_localized_key('MD5', 'maplesyrup',
+                                           engine_id).encode('hex'),
+                         '526f5eed9fcce26f8964c2930787d82b')
+        self.assertEqual(usm_localized_key('SHA', 'maplesyrup',
+                                           engine_id).encode('hex'),
+                         '6695febc9288e36282235fc7151f128497b38f3f')
+
+    def test_ber_integer(self):
+        """Verify integers are minimally encoded in two's complement
+        """
+        for value, encoded in [(0, '00'), (127, '7f'), (128, '0080'),
+                               (-1, 'ff'), (-129, 'ff7f'),
+                               (1449684931, '56686fc3'),
+                               (0xffffffff, '00ffffffff')]:
+            tag, data, _ = _ber_decode(_ber_integer(value))
+            self.assertEqual(data.encode('hex'), encoded)
+            self.assertEqual(_ber_integer_value(data), value)
+
+    @mock.patch('dom.log')
+    def test_send_v2c_native(self, mock_log):
+        """Verify a v2c trap carries the community, uptime and message
+        """
+        notifier = SnmpNotifier({'traphost': self.traphost,
+                                 'community': 'eosplus',
+                                 'version': '2c'})
+        notifier.send("This is a test message", uptime=1449684931)
+
+        data = self.receiver.sock.recv(65535)
+        version, community, pdu = _ber_items(_ber_decode(data)[1])
+        self.assertEqual(_ber_integer_value(version[1]), 1)
+        self.assertEqual(community[1], 'eosplus')
+        self.assertEqual(pdu[0], PDU_TRAP)
+        varbinds = [_ber_items(varbind[1]) for varbind
+                    in _ber_items(_ber_items(pdu[1])[3][1])]
+        self.assertEqual(_ber_integer_value(varbinds[0][1][1]), 1449684931)
+        self.assertEqual(_ber_oid_value(varbinds[1][1][1]), '1.3.6.1.4.1.30065')
+        self.assertEqual(_ber_oid_value(varbinds[2][0][1]),
+                         '1.3.6.1.4.1.30065.6')
+        self.assertEqual(varbinds[2][1][1], "This is a test message")
+
+    @mock.patch('dom.log')
+    def test_send_v3_inform(self, mock_log):
+        """Verify a v3 inform discovers the engine ID and is acknowledged
+        """
+        notifier = SnmpNotifier({'traphost': self.traphost,
+                                 'version': '3',
+                                 'secname': 'eosplus',
+                                 'seclevel': 'authNoPriv',
+                                 'authprotocol': 'SHA',
+                                 'authpassword': 'eosplus123'})
+        replier = threading.Thread(target=self.receiver.reply, args=(3,))
+        replier.start()
+        notifier.send("first", uptime=0)
+        notifier.send("second", uptime=0)
+        replier.join()
+
+        self.assertEqual(notifier.sent, 2)
+        self.assertEqual(notifier.engine[0], FakeReceiver.engine_id)
+        # One discovery probe, then two informs without rediscovery
+        _, pdu_type, engine, _ = SnmpNotifier._parse_v3(
+            self.receiver.packets[2])
+        self.assertEqual(pdu_type, PDU_INFORM)
+        self.assertEqual(engine[:3], [FakeReceiver.engine_id, 7, 1000])
+
+    @mock.patch('dom.log')
+    def test_send_v3_inform_unacknowledged(self, mock_log):
+        """Verify an unanswered inform is retried then counted as failed
+        """
+        notifier = SnmpNotifier({'traphost': self.traphost,
+                                 'version': '3',
+                                 'secname': 'eosplus',
+                                 'seclevel': 'noAuthNoPriv'},
+                                timeout=0.05, retries=2)
+        notifier.engine = [FakeReceiver.engine_id, 7, 1000, 0]
+        notifier.notify("lost")
+        notifier.stop()
+
+        self.assertEqual(notifier.sent, 0)
+        self.assertEqual(notifier.failed, 1)
+        self.assertEqual(notifier.engine, None)
+
+    @mock.patch('dom.call')
+    @mock.patch('dom.DES', None)
+    def test_send_without_crypto(self, mock_call):
+        """Verify authPriv falls back to snmptrap without the Crypto module
+        """
+        notifier = SnmpNotifier({'traphost': 'localhost',
+                                 'version': '3',
+                                 'secname': 'eosplus',
+                                 'seclevel': 'authPriv',
+                                 'authprotocol': 'MD5',
+                                 'authpassword': 'eosplus123',
+                                 'privprotocol': 'DES',
+                                 'privpassword': 'eosplus123'})
+        notifier.send("This is a test message")
+        self.assertFalse(notifier.native)
+        self.assertEqual(mock_call.call_args[0][0][0], 'snmptrap')
+
+class TestSnmpSink(unittest.TestCase):
+
+    def setUp(self):
+        self.receiver = FakeReceiver()
+        self.notifier = SnmpNotifier(
+            {'traphost': '127.0.0.1:{0}'.format(self.receiver.port),
+             'version': '3',
+             'secname': 'eosplus',
+             'seclevel': 'noAuthNoPriv'},
+            timeout=0.5, retries=0)
+
+    def tearDown(self):
+        self.receiver.sock.close()
+
+    @mock.patch('dom.log')
+    def test_dispatch_workers(self, mock_log):
+        """Verify informs sent by several dispatch workers are each
+        acknowledged by a slow receiver
+        """
+        replier = threading.Thread(target=self.receiver.reply,
+                                   args=(11,), kwargs={'delay': 0.05})
+        replier.start()
+        dispatcher = NotificationDispatcher([SnmpSink()], workers=2)
+        with mock.patch('dom.SNMP_NOTIFIER', self.notifier):
+            dispatcher.start()
+            for number in range(10):
+                dispatcher.put(Notification('event {0}'.format(number)))
+            dispatcher.stop()
+            self.notifier.stop()
+        replier.join()
+
+        self.assertEqual(self.notifier.sent, 10)
+        self.assertEqual(self.notifier.failed, 0)
+
+    @mock.patch('dom.log')
+    def test_unreachable_traphost(self, mock_log):
+        """Verify syslog notifications are delivered while the trap host
+        never answers
+        """
+        messages = ['event {0}'.format(number) for number in range(10)]
+        dispatcher = NotificationDispatcher([SnmpSink(), SyslogSink()],
+                                            workers=2)
+        with mock.patch('dom.SNMP_NOTIFIER', self.notifier):
+            dispatcher.start()
+            start = time.time()
+            for message in messages:
+                dispatcher.put(Notification(message))
+            dispatcher.stop()
+            elapsed = time.time() - start
+
+            # Give up on the informs still queued
+            self.notifier.timeout = 0
+            self.notifier.stop()
+
+        self.assertLess(elapsed, 0.5)
+        logged = [args[0][0] for args in mock_log.call_args_list]
+        self.assertEqual(sorted([message for message in logged
+                                 if message in messages]), messages)
+        self.assertEqual(self.notifier.sent, 0)
+        self.assertEqual(self.notifier.failed, 10)
+
 if __name__ == '__main__':
     #unittest.main()
     unittest.main(module=__name__, buffer=True, exit=False)
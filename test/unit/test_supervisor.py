@@ -0,0 +1,274 @@
+"""Test polling an inventory from several worker processes
+"""
+
+import sys
+import os
+import time
+import signal
+import argparse
+import tempfile
+import collections
+import unittest
+import mock
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '../lib'))
+sys.path.append(os.path.join(os.path.dirname(__file__), '../..'))
+
+import dom
+from dom import Supervisor, Notification, MetricsExporter, shard_of
+from dom import Switch, parse_cmd_line, run_shard, baseline_changes
+from eapisim import EapiSimulator
+
+RECORD = {u'Ethernet1': {u'rx': -2.0, u'tx': -1.0, u'time': 1450000000.0,
+                         u'polls': 3, u'logging': 0, u'sn': u'XKE1'}}
+
+def flaky_shard(args, shard, hosts, connection, records):
+    """Report a baseline for each switch, then die unless resumed
+    """
+    connection.send(('notify', shard, Notification(
+        'started with {0}'.format(sorted(records)),
+        fields={'parent': os.getppid()})))
+    connection.send(('polled', shard, [], {'timeout': 1},
+                     dict((hostname, RECORD) for hostname, _ in hosts)))
+    if not records:
+        os._exit(3)
+    while True:
+        time.sleep(1)
+
+class FakeEapi(object):
+    """Answer a batched poll with one optic whose readings do not change
+    """
+
+    def runCmds(self, version, commands):
+        return [{u'interfaceStatuses':
+                 {u'Ethernet1': {u'linkStatus': u'connected'}}},
+                {u'interfaces':
+                 {u'Ethernet1': {u'rxPower': -2.0, u'txPower': -1.0,
+                                 u'vendorSn': u'XKE1'}}},
+                {u'bootupTimestamp': 1449684931.0}]
+
+class FakeTicks(object):
+    """Stand in for the TickScheduler of run_shard: poll the switches, then
+    report once their polls are over, twice, then stop the worker
+    """
+
+    def __init__(self, switches, *args, **kwargs):
+        self.switches = switches
+        self.calls = 0
+
+    def wait(self):
+        self.calls += 1
+        if self.calls % 2:
+            if self.calls > 4:
+                raise SystemExit(0)
+            return self.switches
+        deadline = time.time() + 5
+        while any(switch.busy or not switch.polls
+                  for switch in self.switches):
+            if time.time() > deadline:
+                raise AssertionError('poll did not finish')
+            time.sleep(0.01)
+        return []
+
+class Messages(object):
+    """The sending end of a worker's pipe, keeping what is sent
+    """
+
+    def __init__(self):
+        self.sent = []
+
+    def send(self, message):
+        self.sent.append(message)
+
+    def close(self):
+        pass
+
+class ListSink(object):
+    name = 'list'
+
+    def __init__(self):
+        self.notifications = []
+
+    def send(self, notification):
+        self.notifications.append(notification)
+
+class TestSupervisor(unittest.TestCase):
+
+    def setUp(self):
+        self.sink = ListSink()
+        self.patches = [mock.patch('dom.SINKS', [self.sink]),
+                        mock.patch('dom.DISPATCHER', None),
+                        mock.patch('dom.EAPI_ERRORS', collections.Counter()),
+                        mock.patch('dom.NOTIFICATIONS_SENT',
+                                   collections.Counter())]
+        for patch in self.patches:
+            patch.start()
+
+    def tearDown(self):
+        for patch in reversed(self.patches):
+            patch.stop()
+
+    def wait(self, supervisor, done, seconds=20):
+        deadline = time.time() + seconds
+        while not done():
+            self.assertLess(time.time(), deadline)
+            supervisor.run_once(timeout=0.1)
+
+    def test_baseline_changes(self):
+        """Verify only the interfaces whose baseline changed are reported,
+        whatever their poll counters
+        """
+        polled = dict(RECORD[u'Ethernet1'], polls=4, logging=1)
+        self.assertEqual(baseline_changes({u'Ethernet1': polled}, RECORD), {})
+        rebased = dict(polled, rx=-3.0)
+        self.assertEqual(baseline_changes({u'Ethernet1': rebased,
+                                           u'Ethernet2': polled}, RECORD),
+                         {u'Ethernet1': rebased, u'Ethernet2': polled})
+        self.assertEqual(baseline_changes({}, RECORD), {u'Ethernet1': None})
+
+    @mock.patch('dom.log')
+    @mock.patch('dom.signal.signal')
+    @mock.patch('dom.set_proc_name')
+    @mock.patch('dom.TickScheduler', FakeTicks)
+    def test_unchanged_not_reported(self, *mocks):
+        """Verify a worker reports the baselines of a switch once, and
+        nothing of them on the next cycle when they have not changed
+        """
+        switch = Switch('leaf1', batched=True)
+        switch.connection = FakeEapi()
+        messages = Messages()
+        args = argparse.Namespace(coalesce_threshold=0, metrics_port=None,
+                                  profile=None, workers=1, poll_interval=10,
+                                  jitter=0)
+        # run_shard replaces the globals of dom as a new process would
+        with mock.patch('dom.make_transport'), \
+             mock.patch('dom.make_switches', return_value=[switch]), \
+             mock.patch('dom.COUNTERS_LOCK', dom.COUNTERS_LOCK), \
+             mock.patch('dom.TIMINGS', dom.TIMINGS), \
+             mock.patch('dom.SNMP_NOTIFIER', None), \
+             mock.patch('dom.REMOTE_SYSLOG_SINK', None), \
+             mock.patch('dom.COALESCER', None):
+            self.assertRaises(SystemExit, run_shard, args, 0,
+                              [('leaf1', 443)], messages, {})
+
+        polled = [message for message in messages.sent
+                  if message[0] == 'polled']
+        self.assertEqual(len(polled), 2)
+        self.assertEqual(polled[0][4].keys(), ['leaf1'])
+        self.assertEqual(polled[0][4]['leaf1'].keys(), [u'Ethernet1'])
+        self.assertEqual([result.polls for result in polled[1][2]], [2])
+        self.assertEqual(polled[1][4], {})
+
+    def test_shard_of(self):
+        """Verify switches always fall in the same shard, spread across all
+        """
+        self.assertEqual(shard_of('leaf1', 4), shard_of('leaf1', 4))
+        self.assertEqual(shard_of('leaf1', 1), 0)
+        counts = collections.Counter(shard_of('leaf{0}'.format(number), 4)
+                                     for number in range(400))
+        self.assertEqual(sorted(counts), [0, 1, 2, 3])
+        self.assertTrue(all(count > 50 for count in counts.values()))
+
+    @mock.patch('dom.log')
+    @mock.patch('dom.WORKER_RESTART_DELAY', 0)
+    def test_restart(self, mock_log):
+        """Verify a worker that dies is restarted with the baselines its
+        shard reported, by the fork server, and what it sent is handled
+        """
+        hosts = [('leaf{0}'.format(number), 443) for number in range(6)]
+        supervisor = Supervisor(argparse.Namespace(processes=2), hosts,
+                                target=flaky_shard)
+        self.assertEqual(sorted(supervisor.shards[0] + supervisor.shards[1]),
+                         hosts)
+        for shard, shard_hosts in enumerate(supervisor.shards):
+            for hostname, _ in shard_hosts:
+                self.assertEqual(shard_of(hostname, 2), shard)
+
+        supervisor.start()
+        forks = supervisor.forks.process.pid
+        try:
+            self.wait(supervisor, lambda: len(self.sink.notifications) == 4
+                      and dom.EAPI_ERRORS['timeout'] == 4)
+        finally:
+            supervisor.stop()
+
+        self.assertEqual(supervisor.deaths, 2)
+        self.assertEqual(set(notification.fields['parent'] for notification
+                             in self.sink.notifications),
+                         set([forks]))
+        messages = collections.Counter(
+            notification.msg for notification in self.sink.notifications)
+        expected = collections.Counter(['started with []'] * 2)
+        expected.update('started with {0}'.format(sorted(
+            hostname for hostname, _ in shard_hosts))
+                        for shard_hosts in supervisor.shards)
+        self.assertEqual(messages, expected)
+        self.assertEqual(supervisor.records,
+                         dict((hostname, RECORD) for hostname, _ in hosts))
+        self.assertEqual(dom.EAPI_ERRORS['timeout'], 4)
+
+    @mock.patch('dom.log')
+    def test_shards(self, mock_log):
+        """Verify workers poll their shards, notifications and results reach
+        the supervisor, and a killed worker resumes its switches
+        """
+        # Three switches, as the shards see them: hostnames on loopback
+        hostnames = ['127.0.0.1', '127.0.0.2', 'localhost']
+        fleet = [EapiSimulator(address=address, seed=number, ports=4,
+                               jump=1.0, flap=0).start()
+                 for number, address
+                 in enumerate(['127.0.0.1', '127.0.0.2', '127.0.0.1'])]
+        inventory = tempfile.NamedTemporaryFile(delete=False)
+        inventory.write(''.join('{0}:{1}\n'.format(hostname, server.port)
+                                for hostname, server
+                                in zip(hostnames, fleet)))
+        inventory.close()
+        try:
+            with mock.patch('sys.argv', [
+                    'dom.py', '--inventory', inventory.name, '--processes',
+                    '2', '--poll-interval', '0', '--no-checkpoint',
+                    '--transport', 'http', '--metrics-port', '9']), \
+                 mock.patch('dom.PROTOCOL', dom.PROTOCOL), \
+                 mock.patch('sys.stdout', sys.__stdout__):
+                # (notify() echoes notifications unless its out is stdout)
+                args = parse_cmd_line()
+                exporter = MetricsExporter()
+                supervisor = Supervisor(args, dom.read_inventory(
+                    inventory.name), exporter=exporter).start()
+                try:
+                    self.wait(supervisor, lambda: len(supervisor.records) == 3
+                              and all(supervisor.records.values())
+                              and self.sink.notifications)
+
+                    shard = shard_of('localhost', 2)
+                    killed = supervisor.workers[shard].pid
+                    os.kill(killed, signal.SIGKILL)
+                    self.wait(supervisor, lambda: supervisor.deaths and
+                              shard in supervisor.workers)
+                    self.assertNotEqual(
+                        supervisor.workers[shard].pid, killed)
+                    polls = len(self.sink.notifications)
+                    self.wait(supervisor,
+                              lambda: len(self.sink.notifications) > polls)
+                finally:
+                    supervisor.stop()
+        finally:
+            os.unlink(inventory.name)
+            for server in fleet:
+                server.stop()
+
+        self.assertEqual([len(hosts) for hosts in supervisor.shards], [2, 1])
+        self.assertEqual(sorted(supervisor.records), sorted(hostnames))
+        # Tagged with the switch, even alone in its shard
+        self.assertTrue([notification for notification
+                         in self.sink.notifications
+                         if 'localhost' in notification.msg])
+        body = exporter.render()
+        for hostname in hostnames:
+            self.assertIn('dom_rx_power_dbm{{switch="{0}",'.format(hostname),
+                          body)
+            self.assertIn('dom_poll_duration_seconds_count{{switch="{0}"}}'.
+                          format(hostname), body)
+
+if __name__ == '__main__':
+    unittest.main(module=__name__, buffer=True, exit=False)
@@ -0,0 +1,117 @@
+"""Test the stage timings and the sampling profiler
+"""
+
+import sys
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+import mock
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '../lib'))
+sys.path.append(os.path.join(os.path.dirname(__file__), '../..'))
+
+from dom import Histogram, StageTimings, SamplingProfiler, MetricsExporter
+from dom import on_usr1
+
+class TestStageTimings(unittest.TestCase):
+
+    def test_histogram(self):
+        """Verify durations land in the bucket of their upper bound
+        """
+        histogram = Histogram()
+        for seconds in [0.00005, 0.0001, 0.0003, 0.0003, 100.0]:
+            histogram.add(seconds)
+
+        self.assertEqual(list(histogram.buckets[:3]), [2, 0, 2])
+        self.assertEqual(histogram.buckets[-1], 1)
+        self.assertEqual(histogram.count, 5)
+        self.assertEqual(histogram.max, 100.0)
+        self.assertEqual(histogram.quantile(0.5), 0.0004)
+        self.assertEqual(histogram.quantile(1.0), 100.0)
+
+    def test_summary(self):
+        """Verify only the stages that were timed are summarized
+        """
+        timings = StageTimings()
+        timings.record('fetch', 0.01)
+        timings.record('fetch', 0.03)
+
+        snapshot = dict(timings.snapshot())
+        timings.record('fetch', 0.05)
+        self.assertEqual(snapshot['fetch'].count, 2)
+
+        lines = timings.summary()
+        self.assertEqual(len(lines), 1)
+        self.assertTrue(lines[0].startswith('fetch: 3 in 30.0 ms mean'))
+
+    def test_exported(self):
+        """Verify the stage histograms are exported with cumulative buckets
+        """
+        timings = StageTimings()
+        timings.record('decode', 0.00015)
+        timings.record('decode', 0.5)
+        with mock.patch('dom.TIMINGS', timings):
+            body = MetricsExporter().render()
+
+        self.assertIn('# TYPE dom_stage_duration_seconds histogram\n', body)
+        for line in ['_bucket{stage="decode",le="0.0001"} 0',
+                     '_bucket{stage="decode",le="0.0002"} 1',
+                     '_bucket{stage="decode",le="0.8192"} 2',
+                     '_bucket{stage="decode",le="+Inf"} 2',
+                     '_count{stage="decode"} 2',
+                     '_count{stage="fetch"} 0']:
+            self.assertIn('dom_stage_duration_seconds' + line + '\n', body)
+
+class TestSamplingProfiler(unittest.TestCase):
+
+    def test_sample(self):
+        """Verify the stacks of other threads are sampled, not its own
+        """
+        stop = threading.Event()
+
+        def busy_loop():
+            while not stop.is_set():
+                sum(range(100))
+
+        thread = threading.Thread(target=busy_loop, name='busy')
+        thread.start()
+        try:
+            stacks = SamplingProfiler(None, interval=0.001).sample(0.1)
+        finally:
+            stop.set()
+            thread.join()
+
+        busy = [stack for stack in stacks if stack.startswith('busy;')]
+        self.assertTrue(busy)
+        self.assertTrue([stack for stack in busy
+                         if 'busy_loop (test_timings.py:' in stack])
+        self.assertFalse([stack for stack in stacks if 'sample (' in stack])
+
+    @mock.patch('dom.log')
+    def test_on_usr1(self, mock_log):
+        """Verify SIGUSR1 logs the timings and writes one profile at a time
+        """
+        directory = tempfile.mkdtemp()
+        try:
+            profiler = SamplingProfiler(directory, seconds=0.05)
+            handler = on_usr1(profiler)
+            with mock.patch('dom.TIMINGS', StageTimings()) as timings:
+                timings.record('poll', 0.2)
+                handler(None, None)
+                handler(None, None)
+            profiler.thread.join()
+
+            messages = [call[0][0].format(*call[0][1:])
+                        for call in mock_log.call_args_list]
+            self.assertTrue(messages[0].startswith('Stage timing: poll: 1 in'))
+            self.assertIn('A profile is already being taken', messages)
+            profiles = os.listdir(directory)
+            self.assertEqual(len(profiles), 1)
+            self.assertTrue(profiles[0].endswith('.folded'))
+        finally:
+            shutil.rmtree(directory)
+
+if __name__ == '__main__':
+    unittest.main(module=__name__, buffer=True, exit=False)